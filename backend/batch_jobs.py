@@ -0,0 +1,870 @@
+"""
+🗃️ Meseeing 批量任务队列（SQLite 持久化 + 租约式多 worker）
+=========================================================
+BatchRunner 一个领域同时只能跑一批，且状态只在内存里。任务队列把"先跑 200 条 HR、再跑 500 条保险"
+这类排队意图存进 SQLite：
+
+- jobs 表：一个批量任务（领域、条数、优先级、分支 / 角色选项、提交 / 开始 / 结束时间）
+- tasks 表：任务里的每一次仿真（状态、租约、耗时、诊断结果、token / 费用及按 Provider 的用量、错误及分类；
+  死信重放的仿真带原秘密任务）
+- workers 表：在线的调度器 / worker（心跳时间、并发数、正在跑的仿真数）
+- JobScheduler：按 优先级 DESC、提交时间 ASC 领取下一条待跑仿真，多个任务并发执行
+
+租约：领取仿真时写入 lease_owner / lease_expires（JOB_LEASE_SECONDS 后过期），执行期间心跳线程定期续约；
+进程崩溃或卡住导致租约过期，任意在线的调度器都会把这条仿真退回待跑（attempts + 1）。心跳发现本进程正在跑
+的仿真已不在自己名下时立即取消它（入库 / 写收件箱之前），结果只在租约仍属于自己时写回，被回收后的迟到结果
+直接丢弃，避免与重跑的 worker 重复入库。
+
+部署范围：SQLite 以 WAL 模式打开，WAL 依赖同一内核的共享内存，不支持 NFS / SMB 等网络文件系统，
+所以任务队列只能单机部署：同一台机器上的多个 worker 进程 / 容器共享同一个本地 SQLite 文件横向扩展。
+
+运行模式（环境变量 JOBS_MODE）：
+- embedded     API 进程内执行仿真（默认，单机开箱即用）
+- coordinator  API 进程只负责提交 / 查询 / 取消，仿真全部交给 worker；/api/batch/* 旧接口也转到队列，
+               worker 的进度由 API 进程轮询 SQLite 后经 /ws/events 推送
+
+启动 worker（在 backend 目录下，可多开）：
+    python -m batch_jobs worker --concurrency 4
+
+API（/api/... 与 /<domain>/api/...）：
+  POST /api/jobs                 - 提交任务 {count, priority, domain, branch_turn, branch_k, roles, deadlines, budget}
+  GET  /api/jobs                 - 任务列表（?state=&limit=）
+  GET  /api/jobs/stats           - 历史吞吐统计
+  GET  /api/jobs/workers         - 在线 worker
+  GET  /api/jobs/{job_id}        - 任务详情
+  POST /api/jobs/{job_id}/cancel - 取消任务（未开始的仿真不再执行，进行中的仿真立即中断，检查点写入死信）
+  POST /api/jobs/{job_id}/pause  - 暂停任务（进行中的仿真在下一次 LLM 调用前停住，让出并发名额）
+  POST /api/jobs/{job_id}/resume - 恢复任务（{budget} 调整预算；因超出预算暂停的任务需提高预算才能恢复）
+
+预算：options.budget = {"max_tokens", "max_cost"}，每条仿真结束后按 SQLite 里的累计用量判断，
+执行中的用量计量器（usage.py）也会在超出时立即暂停任务（pause_reason = budget:tokens / budget:cost）
+
+环境变量：
+- JOBS_DB            SQLite 路径（默认 $STATE_DIR/batch_jobs.sqlite3，STATE_DIR 默认仓库根目录下的 state/）
+- JOBS_MODE          embedded | coordinator
+- JOB_LEASE_SECONDS  租约时长（默认 60 秒，心跳间隔为其 1/3）
+- LLM_CONCURRENCY    每个进程的 LLM 并发预算（默认 BATCH_WORKERS；worker 可用 --concurrency 覆盖）
+"""
+
+import argparse
+import json
+import os
+import signal
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from batch_runner_v3 import BatchRunner, LLM_BUDGET, LLM_CONCURRENCY
+from simulation_engine.cancellation import CancelToken, ConcurrencySlot
+from simulation_engine.failures import CANCELLED as SIMULATION_CANCELLED
+from simulation_engine.usage import UsageMeter, merge_usage, over_budget
+from simulation_engine.domain_registry import STATE_DIR
+from simulation_engine.events import EVENT_BUS, publish
+
+JOBS_DB = Path(os.getenv("JOBS_DB", str(STATE_DIR / "batch_jobs.sqlite3")))
+JOBS_MODE = os.getenv("JOBS_MODE", "embedded")
+LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+POLL_SECONDS = 1.0
+
+# 任务状态
+QUEUED, RUNNING, PAUSED, COMPLETED, CANCELLED = "queued", "running", "paused", "completed", "cancelled"
+CLAIMABLE_STATES = (QUEUED, RUNNING)
+OPEN_STATES = (QUEUED, RUNNING, PAUSED)
+# 单次仿真状态
+PENDING, DONE, FAILED, SKIPPED = "pending", "done", "failed", "skipped"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id           TEXT PRIMARY KEY,
+    domain       TEXT NOT NULL,
+    priority     INTEGER NOT NULL DEFAULT 0,
+    state        TEXT NOT NULL,
+    total        INTEGER NOT NULL,
+    options      TEXT NOT NULL DEFAULT '{}',
+    submitted_at REAL NOT NULL,
+    started_at   REAL,
+    finished_at  REAL
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    job_id      TEXT NOT NULL,
+    idx         INTEGER NOT NULL,
+    state       TEXT NOT NULL DEFAULT 'pending',
+    started_at  REAL,
+    finished_at REAL,
+    duration    REAL,
+    record_id   TEXT,
+    prediction  TEXT,
+    correct     INTEGER,
+    tokens      INTEGER NOT NULL DEFAULT 0,
+    error       TEXT,
+    PRIMARY KEY (job_id, idx)
+);
+CREATE TABLE IF NOT EXISTS workers (
+    id          TEXT PRIMARY KEY,
+    host        TEXT NOT NULL,
+    pid         INTEGER NOT NULL,
+    mode        TEXT NOT NULL,
+    concurrency INTEGER NOT NULL,
+    started_at  REAL NOT NULL,
+    last_seen   REAL NOT NULL,
+    running     INTEGER NOT NULL DEFAULT 0,
+    completed   INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS tasks_by_state ON tasks (state, job_id);
+CREATE INDEX IF NOT EXISTS jobs_by_state ON jobs (state, priority, submitted_at);
+"""
+
+# 旧版数据库补列（表名, 列名, 定义）
+MIGRATIONS = [
+    ("tasks", "lease_owner", "TEXT"),
+    ("tasks", "lease_expires", "REAL"),
+    ("tasks", "attempts", "INTEGER NOT NULL DEFAULT 0"),
+    ("jobs", "updated_at", "REAL"),
+    ("tasks", "payload", "TEXT"),
+    ("tasks", "error_class", "TEXT"),
+    ("tasks", "prompt_tokens", "INTEGER NOT NULL DEFAULT 0"),
+    ("tasks", "completion_tokens", "INTEGER NOT NULL DEFAULT 0"),
+    ("tasks", "cost", "REAL NOT NULL DEFAULT 0"),
+    ("tasks", "usage", "TEXT"),
+    ("jobs", "pause_reason", "TEXT"),
+]
+
+
+# =======================================================
+# 💾 持久化
+# =======================================================
+class JobStore:
+    """jobs / tasks / workers 三张表的读写（线程安全；多进程之间靠 SQLite 事务与租约）"""
+
+    def __init__(self, path: Path = JOBS_DB):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=30000")
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        with self._tx() as conn:
+            for table, column, decl in MIGRATIONS:
+                columns = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+            conn.execute("CREATE INDEX IF NOT EXISTS tasks_by_lease ON tasks (lease_owner, state)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_by_update ON jobs (updated_at)")
+
+    def _tx(self):
+        """BEGIN IMMEDIATE 事务（领取仿真时防止两个调度器拿到同一条）"""
+        store = self
+
+        class _Tx:
+            def __enter__(self):
+                store._lock.acquire()
+                store._conn.execute("BEGIN IMMEDIATE")
+                return store._conn
+
+            def __exit__(self, exc_type, exc, tb):
+                try:
+                    store._conn.execute("ROLLBACK" if exc_type else "COMMIT")
+                finally:
+                    store._lock.release()
+
+        return _Tx()
+
+    def _query(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    # ---------- 提交 / 取消 / 暂停 ----------
+    def submit(self, domain: str, count: int, priority: int = 0, options: Optional[dict] = None,
+               payloads: Optional[List[dict]] = None) -> str:
+        """payloads: 每条仿真的附加参数（如 {"mission": ...}），给出时条数以它为准"""
+        job_id = f"job_{uuid.uuid4().hex[:10]}"
+        now = time.time()
+        if payloads:
+            count = len(payloads)
+        with self._tx() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, domain, priority, state, total, options, submitted_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, domain, priority, QUEUED, count, json.dumps(options or {}, ensure_ascii=False), now, now),
+            )
+            conn.executemany("INSERT INTO tasks (job_id, idx, payload) VALUES (?, ?, ?)", [
+                (job_id, i, json.dumps(payloads[i], ensure_ascii=False) if payloads else None) for i in range(count)
+            ])
+        return job_id
+
+    def cancel(self, job_id: str) -> bool:
+        """取消任务：待跑的仿真标记 skipped，正在跑的跑完后照常记录"""
+        now = time.time()
+        with self._tx() as conn:
+            changed = conn.execute(
+                f"UPDATE jobs SET state = ?, finished_at = ?, updated_at = ? WHERE id = ? AND state IN ({_marks(OPEN_STATES)})",
+                (CANCELLED, now, now, job_id, *OPEN_STATES),
+            ).rowcount
+            if changed:
+                conn.execute("UPDATE tasks SET state = ? WHERE job_id = ? AND state = ?", (SKIPPED, job_id, PENDING))
+        return bool(changed)
+
+    def pause(self, job_id: str, reason: str = "manual") -> bool:
+        """暂停：不再领取新的仿真（进行中的由调度器在下一次 LLM 调用前停住）"""
+        with self._tx() as conn:
+            return bool(conn.execute(
+                f"UPDATE jobs SET state = ?, pause_reason = ?, updated_at = ? "
+                f"WHERE id = ? AND state IN ({_marks(CLAIMABLE_STATES)})",
+                (PAUSED, reason, time.time(), job_id, *CLAIMABLE_STATES),
+            ).rowcount)
+
+    def resume(self, job_id: str, budget: Optional[dict] = None) -> bool:
+        """恢复；budget 不为 None 时同时改写任务的预算（{} 表示不限）"""
+        with self._tx() as conn:
+            if budget is not None:
+                row = conn.execute("SELECT options FROM jobs WHERE id = ? AND state = ?", (job_id, PAUSED)).fetchone()
+                if row:
+                    options = {**json.loads(row["options"] or "{}"), "budget": budget or None}
+                    conn.execute("UPDATE jobs SET options = ? WHERE id = ?",
+                                 (json.dumps(options, ensure_ascii=False), job_id))
+            now = time.time()
+            resumed = conn.execute(
+                "UPDATE jobs SET state = CASE WHEN started_at IS NULL THEN ? ELSE ? END, pause_reason = NULL, "
+                "updated_at = ? WHERE id = ? AND state = ?",
+                (QUEUED, RUNNING, now, job_id, PAUSED),
+            ).rowcount
+            # 已经没有待跑 / 进行中的仿真（旧版本在暂停期间跑完的任务）：直接完成
+            conn.execute(
+                "UPDATE jobs SET state = ?, finished_at = ? WHERE id = ? AND state = ? AND NOT EXISTS "
+                "(SELECT 1 FROM tasks WHERE job_id = ? AND state IN (?, ?))",
+                (COMPLETED, now, job_id, RUNNING, job_id, PENDING, RUNNING),
+            )
+            return bool(resumed)
+
+    # ---------- 租约 ----------
+    def claim_next(self, owner: str, lease_seconds: float = LEASE_SECONDS) -> Optional[dict]:
+        """领取优先级最高的任务的下一条待跑仿真（带租约），返回 {"job_id", "idx", "domain", "options", "payload"}"""
+        now = time.time()
+        with self._tx() as conn:
+            row = conn.execute(
+                f"SELECT t.job_id, t.idx, t.payload, j.domain, j.options FROM tasks t JOIN jobs j ON j.id = t.job_id "
+                f"WHERE t.state = ? AND j.state IN ({_marks(CLAIMABLE_STATES)}) "
+                f"ORDER BY j.priority DESC, j.submitted_at, t.idx LIMIT 1",
+                (PENDING, *CLAIMABLE_STATES),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE tasks SET state = ?, started_at = ?, lease_owner = ?, lease_expires = ?, attempts = attempts + 1 "
+                "WHERE job_id = ? AND idx = ?",
+                (RUNNING, now, owner, now + lease_seconds, row["job_id"], row["idx"]),
+            )
+            conn.execute(
+                "UPDATE jobs SET state = CASE WHEN state = ? THEN ? ELSE state END, "
+                "started_at = COALESCE(started_at, ?), updated_at = ? WHERE id = ?",
+                (QUEUED, RUNNING, now, now, row["job_id"]),
+            )
+            return {"job_id": row["job_id"], "idx": row["idx"], "domain": row["domain"],
+                    "options": json.loads(row["options"] or "{}"), "payload": json.loads(row["payload"] or "{}")}
+
+    def heartbeat(self, owner: str, info: dict, lease_seconds: float = LEASE_SECONDS) -> set:
+        """续约 owner 名下正在跑的仿真，并刷新 workers 表；返回续约成功的 {(job_id, idx), ...}"""
+        now = time.time()
+        with self._tx() as conn:
+            conn.execute(
+                "UPDATE tasks SET lease_expires = ? WHERE lease_owner = ? AND state = ?",
+                (now + lease_seconds, owner, RUNNING),
+            )
+            renewed = {(row["job_id"], row["idx"]) for row in conn.execute(
+                "SELECT job_id, idx FROM tasks WHERE lease_owner = ? AND state = ?", (owner, RUNNING))}
+            conn.execute(
+                "INSERT INTO workers (id, host, pid, mode, concurrency, started_at, last_seen, running, completed) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(id) DO UPDATE SET "
+                "last_seen = excluded.last_seen, running = excluded.running, completed = excluded.completed",
+                (owner, info["host"], info["pid"], info["mode"], info["concurrency"], info["started_at"],
+                 now, info.get("running", 0), info.get("completed", 0)),
+            )
+            # 很久没有心跳的 worker 记录只保留一天
+            conn.execute("DELETE FROM workers WHERE last_seen < ?", (now - 86400,))
+        return renewed
+
+    def reclaim_expired(self) -> int:
+        """回收过期租约：所属任务仍在进行的退回待跑，已取消的标记 skipped；返回回收条数"""
+        now = time.time()
+        with self._tx() as conn:
+            return conn.execute(
+                f"UPDATE tasks SET state = CASE WHEN job_id IN "
+                f"(SELECT id FROM jobs WHERE state IN ({_marks(OPEN_STATES)})) THEN ? ELSE ? END, "
+                f"started_at = NULL, lease_owner = NULL, lease_expires = NULL "
+                f"WHERE state = ? AND (lease_expires IS NULL OR lease_expires < ?)",
+                (*OPEN_STATES, PENDING, SKIPPED, RUNNING, now),
+            ).rowcount
+
+    def release(self, job_id: str, idx: int, owner: str):
+        """调度器停止时被打断（还没开始）的仿真退回待跑"""
+        with self._tx() as conn:
+            conn.execute(
+                "UPDATE tasks SET state = ?, started_at = NULL, lease_owner = NULL, lease_expires = NULL, "
+                "attempts = MAX(attempts - 1, 0) WHERE job_id = ? AND idx = ? AND state = ? AND lease_owner = ?",
+                (PENDING, job_id, idx, RUNNING, owner),
+            )
+
+    def unregister(self, owner: str):
+        with self._tx() as conn:
+            conn.execute("DELETE FROM workers WHERE id = ?", (owner,))
+
+    def finish_task(self, job_id: str, idx: int, owner: str, result: Optional[dict]) -> Optional[bool]:
+        """
+        记录一次仿真的结果（result 为 None 表示被取消）
+
+        返回 None：租约已被回收，结果丢弃；True：任务刚好全部跑完（标记 completed）；False：其他
+        """
+        now = time.time()
+        state = SKIPPED if result is None else DONE if result.get("success") else FAILED
+        result = result or {}
+        usage = result.get("usage") or {}
+        with self._tx() as conn:
+            recorded = conn.execute(
+                "UPDATE tasks SET state = ?, finished_at = ?, duration = COALESCE(?, ? - started_at), record_id = ?, "
+                "prediction = ?, correct = ?, tokens = ?, prompt_tokens = ?, completion_tokens = ?, cost = ?, usage = ?, "
+                "error = ?, error_class = ?, lease_owner = NULL, lease_expires = NULL "
+                "WHERE job_id = ? AND idx = ? AND state = ? AND lease_owner = ?",
+                (state, now, result.get("duration_seconds"), now,
+                 result.get("id") if result.get("success") else None, result.get("prediction"),
+                 None if result.get("correct") is None else int(bool(result.get("correct"))),
+                 int(result.get("tokens_used") or 0), usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0),
+                 usage.get("cost", 0.0), json.dumps(usage, ensure_ascii=False) if usage else None,
+                 result.get("error"), result.get("error_class"), job_id, idx, RUNNING, owner),
+            ).rowcount
+            if not recorded:
+                return None
+            conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (now, job_id))
+            remaining = conn.execute("SELECT COUNT(*) FROM tasks WHERE job_id = ? AND state IN (?, ?)",
+                                     (job_id, PENDING, RUNNING)).fetchone()[0]
+            if remaining == 0:
+                # 暂停期间跑完最后一条也算完成，否则恢复后变成没有仿真可领的 running，永远结束不了
+                return bool(conn.execute(
+                    "UPDATE jobs SET state = ?, finished_at = ?, pause_reason = NULL WHERE id = ? AND state IN (?, ?)",
+                    (COMPLETED, now, job_id, RUNNING, PAUSED)).rowcount)
+        return False
+
+    # ---------- 查询 ----------
+    def get(self, job_id: str) -> Optional[dict]:
+        rows = self._query(_SUMMARY_SQL + " WHERE j.id = ? GROUP BY j.id", (job_id,))
+        return _summary(rows[0]) if rows else None
+
+    def list(self, domain: Optional[str] = None, state: Optional[str] = None, limit: int = 50) -> List[dict]:
+        where, params = [], []
+        if domain:
+            where.append("j.domain = ?")
+            params.append(domain)
+        if state:
+            where.append("j.state = ?")
+            params.append(state)
+        sql = _SUMMARY_SQL + (" WHERE " + " AND ".join(where) if where else "") + \
+            f" GROUP BY j.id ORDER BY (j.state IN ({_marks(OPEN_STATES)})) DESC, j.priority DESC, j.submitted_at DESC LIMIT ?"
+        return [_summary(r) for r in self._query(sql, (*params, *OPEN_STATES, limit))]
+
+    def latest(self, domain: str) -> Optional[dict]:
+        """领域最近提交的任务（旧 /api/batch/* 接口在 coordinator 模式下操作的对象）"""
+        rows = self._query("SELECT id FROM jobs WHERE domain = ? ORDER BY submitted_at DESC LIMIT 1", (domain,))
+        return self.get(rows[0]["id"]) if rows else None
+
+    def usage(self, job_id: str) -> dict:
+        """任务的累计用量（合并每条仿真按 Provider 的用量）"""
+        rows = self._query("SELECT usage FROM tasks WHERE job_id = ? AND usage IS NOT NULL", (job_id,))
+        return merge_usage(json.loads(r["usage"]) for r in rows)
+
+    def job_states(self, job_ids: List[str]) -> Dict[str, str]:
+        if not job_ids:
+            return {}
+        rows = self._query(f"SELECT id, state FROM jobs WHERE id IN ({_marks(tuple(job_ids))})", tuple(job_ids))
+        return {r["id"]: r["state"] for r in rows}
+
+    def changed_since(self, since: float) -> List[dict]:
+        rows = self._query("SELECT id FROM jobs WHERE updated_at > ? ORDER BY updated_at", (since,))
+        return [job for job in (self.get(r["id"]) for r in rows) if job]
+
+    def recent_tasks(self, job_id: str, state: str, limit: int) -> List[dict]:
+        rows = self._query(
+            "SELECT idx, record_id, prediction, correct, duration, tokens, error, error_class FROM tasks "
+            "WHERE job_id = ? AND state = ? ORDER BY finished_at DESC LIMIT ?",
+            (job_id, state, limit),
+        )
+        return [dict(r) for r in reversed(rows)]
+
+    def workers(self) -> List[dict]:
+        now = time.time()
+        rows = self._query("SELECT * FROM workers ORDER BY started_at")
+        return [{**dict(r), "alive": r["last_seen"] >= now - LEASE_SECONDS} for r in rows]
+
+    def stats(self, domain: Optional[str] = None, window_seconds: int = 3600) -> dict:
+        """历史统计：各状态任务数、累计仿真数、最近窗口内吞吐（条 / 分钟）、准确率、token"""
+        clause, params = ("WHERE j.domain = ?", (domain,)) if domain else ("", ())
+        jobs = {r["state"]: r["n"] for r in self._query(
+            f"SELECT j.state, COUNT(*) AS n FROM jobs j {clause} GROUP BY j.state", params)}
+        since = time.time() - window_seconds
+        rows = self._query(
+            f"SELECT j.domain, COUNT(*) AS n, SUM(t.state = 'done') AS ok, SUM(t.correct) AS correct, "
+            f"SUM(t.tokens) AS tokens, AVG(t.duration) AS avg_duration, "
+            f"SUM(t.finished_at >= ?) AS recent, SUM(t.attempts > 1) AS retried "
+            f"FROM tasks t JOIN jobs j ON j.id = t.job_id "
+            f"WHERE t.state IN ('done', 'failed') {'AND j.domain = ?' if domain else ''} GROUP BY j.domain",
+            (since, *params),
+        )
+        domains = {
+            r["domain"]: {
+                "simulations": r["n"],
+                "succeeded": r["ok"] or 0,
+                "accuracy": round((r["correct"] or 0) / r["ok"], 3) if r["ok"] else 0,
+                "tokens": r["tokens"] or 0,
+                "avg_seconds_per_task": round(r["avg_duration"] or 0, 2),
+                "throughput_per_min": round((r["recent"] or 0) / (window_seconds / 60), 2),
+                "reclaimed": r["retried"] or 0,
+            }
+            for r in rows
+        }
+        errors = {r["error_class"] or "unknown": r["n"] for r in self._query(
+            f"SELECT t.error_class, COUNT(*) AS n FROM tasks t JOIN jobs j ON j.id = t.job_id "
+            f"WHERE t.state = 'failed' {'AND j.domain = ?' if domain else ''} GROUP BY t.error_class", params)}
+        alive = [w for w in self.workers() if w["alive"]]
+        return {"jobs": jobs, "domains": domains, "error_classes": errors, "window_seconds": window_seconds,
+                "workers": len(alive), "concurrency": sum(w["concurrency"] for w in alive)}
+
+
+def _marks(values: tuple) -> str:
+    return ", ".join("?" for _ in values)
+
+
+_SUMMARY_SQL = """
+SELECT j.*,
+       SUM(t.state = 'pending') AS pending, SUM(t.state = 'running') AS running,
+       SUM(t.state = 'done') AS succeeded, SUM(t.state = 'failed') AS failed, SUM(t.state = 'skipped') AS skipped,
+       SUM(t.correct) AS correct, SUM(t.tokens) AS tokens, AVG(t.duration) AS avg_duration,
+       SUM(t.prompt_tokens) AS prompt_tokens, SUM(t.completion_tokens) AS completion_tokens, SUM(t.cost) AS cost,
+       MAX(t.finished_at) AS last_finished, COUNT(DISTINCT t.lease_owner) AS workers
+FROM jobs j LEFT JOIN tasks t ON t.job_id = j.id
+"""
+
+
+def _summary(row: sqlite3.Row) -> dict:
+    done = (row["succeeded"] or 0) + (row["failed"] or 0)
+    options = json.loads(row["options"] or "{}")
+    cost = round(row["cost"] or 0, 6)
+    elapsed = ((row["finished_at"] or row["last_finished"] or time.time()) - row["started_at"]) if row["started_at"] else 0
+    return {
+        "id": row["id"],
+        "domain": row["domain"],
+        "priority": row["priority"],
+        "state": row["state"],
+        "total": row["total"],
+        "completed": done,
+        "pending": row["pending"] or 0,
+        "running": row["running"] or 0,
+        "succeeded": row["succeeded"] or 0,
+        "failed": row["failed"] or 0,
+        "skipped": row["skipped"] or 0,
+        "workers": row["workers"] or 0,
+        "progress_percent": int(done / row["total"] * 100) if row["total"] else 0,
+        "accuracy": round((row["correct"] or 0) / row["succeeded"], 3) if row["succeeded"] else 0,
+        "tokens": row["tokens"] or 0,
+        "prompt_tokens": row["prompt_tokens"] or 0,
+        "completion_tokens": row["completion_tokens"] or 0,
+        "cost": cost,
+        "cost_per_record": round(cost / row["succeeded"], 6) if row["succeeded"] else None,
+        "budget": options.get("budget"),
+        "pause_reason": row["pause_reason"],
+        "avg_seconds_per_task": round(row["avg_duration"] or 0, 2),
+        "throughput_per_min": round(done / elapsed * 60, 2) if elapsed > 0 else 0,
+        "options": options,
+        "submitted_at": row["submitted_at"],
+        "started_at": row["started_at"],
+        "finished_at": row["finished_at"],
+    }
+
+
+def legacy_status(store: JobStore, domain: str) -> dict:
+    """领域最近一个任务换算成 BatchRunner.get_status() 的格式（coordinator 模式下的 /api/batch/status）"""
+    job = store.latest(domain)
+    if job is None:
+        return {"domain": domain, "state": "idle", "current_task": 0, "total_tasks": 0, "progress": "0/0",
+                "progress_percent": 0, "elapsed_seconds": 0, "avg_seconds_per_task": 0, "success_count": 0,
+                "error_count": 0, "stop_reasons": {}, "recent_results": [], "recent_errors": []}
+    end = job["finished_at"] or time.time()
+    results = [
+        {"id": t["record_id"], "prediction": t["prediction"], "correct": bool(t["correct"]),
+         "tokens_used": t["tokens"], "duration_seconds": round(t["duration"] or 0, 2), "success": True}
+        for t in store.recent_tasks(job["id"], DONE, 5)
+    ]
+    errors = [{"index": t["idx"], "error": t["error"], "error_class": t["error_class"]}
+              for t in store.recent_tasks(job["id"], FAILED, 3)]
+    return {
+        "domain": domain,
+        "job_id": job["id"],
+        "state": RUNNING if job["state"] == QUEUED else job["state"],
+        "current_task": job["completed"],
+        "total_tasks": job["total"],
+        "progress": f"{job['completed']}/{job['total']}",
+        "progress_percent": job["progress_percent"],
+        "elapsed_seconds": int(end - job["started_at"]) if job["started_at"] else 0,
+        "avg_seconds_per_task": job["avg_seconds_per_task"],
+        "success_count": job["succeeded"],
+        "error_count": job["failed"],
+        "stop_reasons": {},
+        "usage": store.usage(job["id"]),
+        "budget": job["budget"],
+        "pause_reason": job["pause_reason"],
+        "cost_per_record": job["cost_per_record"],
+        "tokens_per_record": round(job["tokens"] / job["succeeded"]) if job["succeeded"] else None,
+        "recent_results": results,
+        "recent_errors": errors,
+    }
+
+
+# =======================================================
+# ⏱️ 调度器 / worker
+# =======================================================
+class JobScheduler:
+    """
+    领取 + 执行 + 续约
+
+    execute=False（coordinator 模式）时不执行仿真，只注册心跳、回收过期租约，
+    并把其他 worker 写入的进度转成 batch.job / batch.status 事件推送
+    """
+
+    def __init__(self, store: JobStore, execute: bool = True, concurrency: Optional[int] = None,
+                 mode: str = "embedded"):
+        self.store = store
+        self.execute = execute
+        self.mode = mode
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.concurrency = (concurrency or LLM_CONCURRENCY) if execute else 0
+        # 内嵌模式与 BatchRunner 共用进程级 LLM 预算；独立 worker 可以单独指定并发
+        self.budget = LLM_BUDGET if concurrency is None else threading.BoundedSemaphore(concurrency)
+        self.pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="job") if execute else None
+        self._runners: Dict[str, BatchRunner] = {}
+        # 本进程正在跑的仿真 (job_id, idx) → 子令牌（租约被回收时单独取消）
+        self._tasks: Dict[tuple, CancelToken] = {}
+        self._runners_lock = threading.Lock()
+        self._running = 0
+        self._completed = 0
+        self._started_at = time.time()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self):
+        if any(t.is_alive() for t in self._threads):
+            return
+        self._stop.clear()
+        self._threads = [threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True)]
+        if self.execute:
+            self._threads.append(threading.Thread(target=self._loop, name="job-scheduler", daemon=True))
+        for thread in self._threads:
+            thread.start()
+        print(f"🗃️ 任务队列 [{self.mode}] {self.owner} 已启动（并发 {self.concurrency}，租约 {LEASE_SECONDS:.0f}s）")
+
+    def stop(self, wait: bool = False):
+        """停止领取新仿真；wait=True 时等正在跑的仿真写回结果（worker 优雅退出）"""
+        self._stop.set()
+        self._wakeup.set()
+        with self._runners_lock:
+            for runner in self._runners.values():
+                runner.cancel_token.cancel("shutdown")  # 进行中的仿真中断后退回队列，由其他 worker 重跑
+        if self.pool:
+            self.pool.shutdown(wait=wait)
+        if wait:
+            for thread in self._threads:
+                thread.join(timeout=POLL_SECONDS * 2)
+        try:
+            self.store.unregister(self.owner)
+        except sqlite3.Error:
+            pass
+
+    def notify(self):
+        """有新任务提交 / 任务恢复时唤醒调度循环"""
+        self._wakeup.set()
+
+    # ---------- 任务操作（API 调用） ----------
+    def submit(self, domain: str, count: int, priority: int = 0, options: Optional[dict] = None,
+               payloads: Optional[List[dict]] = None) -> dict:
+        job_id = self.store.submit(domain, count, priority, options, payloads)
+        job = self.store.get(job_id)
+        publish("batch.job", domain, job)
+        self.notify()
+        return job
+
+    def cancel(self, job_id: str) -> Optional[dict]:
+        if not self.store.cancel(job_id):
+            return None
+        self._drop_runner(job_id)
+        return self._publish_job(job_id)
+
+    def pause(self, job_id: str) -> Optional[dict]:
+        if not self.store.pause(job_id):
+            return None
+        self._sync_runners()
+        return self._publish_job(job_id)
+
+    def resume(self, job_id: str, budget: Optional[dict] = None) -> Optional[dict]:
+        """恢复；仍超出（调整后的）预算时抛 ValueError"""
+        job = self.store.get(job_id)
+        if job and job["state"] == PAUSED:
+            exceeded = over_budget(job["budget"] if budget is None else budget, *self._spent(job))
+            if exceeded:
+                raise ValueError(f"已超出{'token' if exceeded == 'tokens' else '费用'}预算，请提高预算后再恢复")
+        if not self.store.resume(job_id, budget):
+            return None
+        self._sync_runners()
+        self.notify()
+        return self._publish_job(job_id)
+
+    def _publish_job(self, job_id: str) -> Optional[dict]:
+        job = self.store.get(job_id)
+        if job:
+            publish("batch.job", job["domain"], job)
+            if self.mode == "coordinator":
+                publish("batch.status", job["domain"], legacy_status(self.store, job["domain"]))
+        return job
+
+    # ---------- 后台线程 ----------
+    def _loop(self):
+        while not self._stop.is_set():
+            if not self.budget.acquire(timeout=POLL_SECONDS):
+                continue
+            try:
+                task = self.store.claim_next(self.owner)
+            except sqlite3.Error as e:
+                print(f"❌ 任务队列读取失败: {e}")
+                task = None
+            if task is None or self._stop.is_set():
+                if task:
+                    self.store.release(task["job_id"], task["idx"], self.owner)
+                self.budget.release()
+                self._wakeup.wait(POLL_SECONDS)
+                self._wakeup.clear()
+                continue
+            with self._runners_lock:
+                self._running += 1
+            try:
+                self.pool.submit(self._run, task)
+            except RuntimeError:
+                # stop() 已关闭线程池
+                with self._runners_lock:
+                    self._running -= 1
+                self.store.release(task["job_id"], task["idx"], self.owner)
+                self.budget.release()
+
+    def _heartbeat_loop(self):
+        """续约 + 回收过期租约 + 取消已被其他进程取消的任务 +（coordinator）推送进度"""
+        interval = max(LEASE_SECONDS / 3, POLL_SECONDS)
+        last_beat, watermark = 0.0, time.time()
+        while not self._stop.is_set():
+            try:
+                if time.monotonic() - last_beat >= interval:
+                    last_beat = time.monotonic()
+                    with self._runners_lock:
+                        running = dict(self._tasks)  # 先取快照：之后才领取的仿真不在这次续约的结果里
+                    renewed = self.store.heartbeat(self.owner, self._info())
+                    self._cancel_lost(running, renewed)
+                    reclaimed = self.store.reclaim_expired()
+                    if reclaimed:
+                        print(f"♻️ 任务队列: 回收 {reclaimed} 条过期租约的仿真")
+                        self.notify()
+                self._sync_runners()
+                if self.mode == "coordinator" and EVENT_BUS.subscriber_count():
+                    now = time.time()
+                    changed = self.store.changed_since(watermark)
+                    watermark = now
+                    for job in changed:
+                        publish("batch.job", job["domain"], job)
+                    for domain in {job["domain"] for job in changed}:
+                        publish("batch.status", domain, legacy_status(self.store, domain))
+            except sqlite3.Error as e:
+                print(f"❌ 任务队列心跳失败: {e}")
+            self._stop.wait(POLL_SECONDS)
+
+    def _cancel_lost(self, running: Dict[tuple, CancelToken], renewed: set):
+        """租约已被回收（本进程卡住超过租约时长，仿真已退回队列由其他 worker 重跑）：取消本地这份"""
+        for (job_id, idx), token in running.items():
+            if (job_id, idx) not in renewed and not token.cancelled:
+                print(f"⚠️ [{job_id} #{idx + 1}] 租约已被回收，取消本地仿真")
+                token.cancel("lease_lost")
+
+    def _sync_runners(self):
+        """按 SQLite 里的任务状态（可能由其他进程修改）暂停 / 恢复 / 取消本进程里进行中的仿真"""
+        with self._runners_lock:
+            runners = dict(self._runners)
+        if not runners:
+            return
+        states = self.store.job_states(list(runners))
+        for job_id, runner in runners.items():
+            state = states.get(job_id)
+            if state not in OPEN_STATES:
+                self._drop_runner(job_id)
+            elif state == PAUSED:
+                runner.cancel_token.pause()
+            elif runner.cancel_token.paused:
+                self._rebase_usage(job_id, runner)  # 恢复时预算可能已调整
+                runner.cancel_token.resume()
+
+    def _spent(self, job: dict) -> tuple:
+        """任务已用的 (token, 费用)：SQLite 里已记录的 + 本进程进行中仿真已花掉的"""
+        with self._runners_lock:
+            runner = self._runners.get(job["id"])
+        if runner is None:
+            return job["tokens"], job["cost"]
+        return (job["tokens"] + runner.usage.total_tokens - runner.settled["tokens"],
+                job["cost"] + runner.usage.cost - runner.settled["cost"])
+
+    def _rebase_usage(self, job_id: str, runner: BatchRunner):
+        """
+        按 SQLite 里的累计用量和预算校准 runner 的计量器（超出时回调 _budget_exceeded）
+
+        计量器里已有本进程的全部用量，其中 settled 部分已写入 SQLite，baseline 里扣掉避免重复计算
+        """
+        job = self.store.get(job_id)
+        if job is None:
+            return
+        runner.budget = job["budget"]
+        runner.usage.set_budget(job["budget"], baseline={"tokens": job["tokens"] - runner.settled["tokens"],
+                                                         "cost": job["cost"] - runner.settled["cost"]})
+
+    def _budget_exceeded(self, job_id: str, kind: str):
+        """任务超出预算：暂停（其他进程里进行中的仿真在下一次同步时停住）"""
+        if self.store.pause(job_id, reason=f"budget:{kind}"):
+            print(f"💸 任务 {job_id} 超出{'token' if kind == 'tokens' else '费用'}预算，已自动暂停")
+            self._sync_runners()
+            self._publish_job(job_id)
+
+    def _info(self) -> dict:
+        return {"host": socket.gethostname(), "pid": os.getpid(), "mode": self.mode,
+                "concurrency": self.concurrency, "started_at": self._started_at,
+                "running": self._running, "completed": self._completed}
+
+    def _runner_for(self, task: dict) -> BatchRunner:
+        """每个任务一个 BatchRunner 实例承载分支 / 角色配置（不进入 get_batch_runner 的领域单例）"""
+        with self._runners_lock:
+            runner = self._runners.get(task["job_id"])
+            if runner is None:
+                options = task["options"]
+                runner = BatchRunner(task["domain"])
+                branch_turn = options.get("branch_turn")
+                runner.branch_options = {"branch_turn": branch_turn,
+                                         "branch_k": int(options.get("branch_k") or 0) if branch_turn else 0}
+                runner.roles = options.get("roles") or None
+                runner.deadlines = options.get("deadlines") or None
+                runner.usage = UsageMeter(on_exceeded=lambda kind, job_id=task["job_id"]: self._budget_exceeded(job_id, kind))
+                runner.settled = {"tokens": 0, "cost": 0.0}  # 已写入 SQLite 的本进程用量
+                self._rebase_usage(task["job_id"], runner)
+                runner.job_id = task["job_id"]
+                self._runners[task["job_id"]] = runner
+            return runner
+
+    def _drop_runner(self, job_id: str):
+        with self._runners_lock:
+            runner = self._runners.pop(job_id, None)
+        if runner:
+            runner.cancel_token.cancel()
+
+    def _run(self, task: dict):
+        job_id, idx = task["job_id"], task["idx"]
+        result = None
+        runner = token = None
+        try:
+            print(f"⚡️ [{job_id} #{idx + 1}] 正在运行仿真...")
+            # 名额已在 _loop 里领取；暂停 / 重试退避期间让出给其他任务
+            with ConcurrencySlot(self.budget, acquired=True):
+                runner = self._runner_for(task)
+                token = runner.cancel_token.child()
+                with self._runners_lock:
+                    self._tasks[(job_id, idx)] = token
+                result = runner.run_single_simulation(
+                    idx, task["domain"], mission=task["payload"].get("mission"),
+                    checkpoint=task["payload"].get("checkpoint"), cancel_token=token)
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+        finally:
+            self._wakeup.set()
+            with self._runners_lock:
+                self._running -= 1
+                self._tasks.pop((job_id, idx), None)
+            if token is not None:
+                runner.cancel_token.release(token)
+        try:
+            if self._stop.is_set() and (result is None or result.get("error_class") == SIMULATION_CANCELLED):
+                self.store.release(job_id, idx, self.owner)
+                return
+            finished = self.store.finish_task(job_id, idx, self.owner, result)
+        except sqlite3.Error as e:
+            print(f"❌ 任务队列写入失败: {e}")
+            return
+        if finished is None:
+            print(f"⚠️ [{job_id} #{idx + 1}] 租约已被回收，结果丢弃")
+            return
+        if result:
+            runner = self._runners.get(job_id)
+            if runner is not None:
+                runner.settled["tokens"] += (result.get("usage") or {}).get("total_tokens", 0)
+                runner.settled["cost"] += (result.get("usage") or {}).get("cost", 0.0)
+        with self._runners_lock:
+            self._completed += 1
+        if finished:
+            self._drop_runner(job_id)
+            print(f"🎉 任务 {job_id} 完成")
+        else:
+            job = self.store.get(job_id)
+            exceeded = job and job["state"] in CLAIMABLE_STATES and over_budget(job["budget"], *self._spent(job))
+            if exceeded:
+                self._budget_exceeded(job_id, exceeded)
+        self._publish_job(job_id)
+
+
+_scheduler: Optional[JobScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler(start: bool = True) -> JobScheduler:
+    """API 进程内唯一的调度器（JOBS_MODE=coordinator 时不执行仿真）"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            coordinator = JOBS_MODE == "coordinator"
+            _scheduler = JobScheduler(JobStore(), execute=not coordinator,
+                                      mode="coordinator" if coordinator else "embedded")
+        if start:
+            _scheduler.start()
+        return _scheduler
+
+
+# =======================================================
+# 🚀 命令行：python -m batch_jobs worker
+# =======================================================
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m batch_jobs", description="批量任务队列 worker")
+    commands = parser.add_subparsers(dest="command", required=True)
+    worker = commands.add_parser("worker", help="领取并执行队列里的仿真（同一台机器上可多开）")
+    worker.add_argument("--concurrency", type=int, default=LLM_CONCURRENCY, help="本进程同时运行的仿真数")
+    worker.add_argument("--db", default=str(JOBS_DB), help="任务队列 SQLite 路径（本机文件系统；WAL 不支持网络文件系统）")
+    args = parser.parse_args(argv)
+
+    scheduler = JobScheduler(JobStore(Path(args.db)), concurrency=max(1, args.concurrency), mode="worker")
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    scheduler.start()
+    try:
+        while not stop.wait(1):
+            pass
+    except KeyboardInterrupt:
+        pass
+    print("🛑 worker 退出中，等待正在运行的仿真写回结果...")
+    scheduler.stop(wait=True)
+
+
+if __name__ == "__main__":
+    main()
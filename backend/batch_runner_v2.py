@@ -2,12 +2,12 @@ import time
 import json
 import os
 import uuid
-import ast
 from datetime import datetime
 from pathlib import Path
 from langchain_core.messages import HumanMessage, AIMessage
 from simulation_engine.domain_manager import DomainManager
 from simulation_engine.graph import app as graph_app
+from simulation_engine.structured import parse_json_robust
 
 # ==========================================
 # ⚙️ 配置区 (已对齐 V5.1 架构)
@@ -21,17 +21,9 @@ LOG_FILE = BASE_DIR / "etl_factory" / "processing_log.json"
 def clean_content(content):
     """复刻 main.py 的美颜滤镜，确保 JSON 纯净"""
     str_content = str(content)
-    if "{" in str_content and "}" in str_content:
-        try:
-            # 处理 Python 风格的 Dict 字符串
-            fixed = str_content.replace("'", '"').replace("None", "null").replace("False", "false").replace("True", "true")
-            return json.loads(fixed)
-        except:
-            try:
-                return ast.literal_eval(str_content)
-            except:
-                return str_content
-    return str_content
+    # 单次扫描：标准 JSON 优先，Python 风格的 Dict 字符串按字面量解析（不再整体替换引号）
+    data = parse_json_robust(str_content)
+    return data if data is not None else str_content
 
 def save_to_inbox(record):
     """存入待处理池 (Processing Log)"""
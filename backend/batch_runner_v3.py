@@ -3,24 +3,65 @@
 ===================================
 支持 Docker 一键部署，带暂停/取消功能
 
-API 控制端点：
+暂停 / 取消通过协作式令牌（simulation_engine/cancellation.py）传进工作流节点和 LLM 调用：
+取消时正在等待的 LLM 请求立即放弃，仿真在当前节点中断，部分对话随检查点写入死信队列（可重放续跑）；
+暂停时在下一次 LLM 调用前停住，恢复后原地继续
+
+超时：每场仿真在 SIMULATION_TIMEOUT 内完成，节点 / 单次 LLM 请求的超时见 simulation_engine/deadlines.py，
+可按批次用 deadlines={"call", "node", "simulation"} 覆盖
+
+用量 / 费用：每场仿真与整批各一个 UsageMeter（simulation_engine/usage.py），按 Provider 拆分，
+/api/batch/status 返回 usage、budget、cost_per_record；设置 budget={"max_tokens", "max_cost"} 后
+超出即自动暂停（进行中的仿真在下一次 LLM 调用前停住），提高预算后 resume 继续
+
+每个领域一个 BatchRunner（get_batch_runner），所有领域的批量任务共用一个工作线程池
+（BATCH_WORKERS，默认 4），领域工作流 / DomainManager 走 domain_registry 的共享缓存
+
+API 控制端点（/api/... 为默认领域，/<domain>/api/... 为指定领域）：
   POST /api/batch/start   - 启动批量任务
   POST /api/batch/pause   - 暂停当前任务
   POST /api/batch/resume  - 恢复暂停的任务
   POST /api/batch/cancel  - 取消任务
-  GET  /api/batch/status  - 获取当前状态
+  GET  /api/batch/status  - 获取当前状态（含按错误分类的失败计数）
+  WS   /ws/events         - 状态变化 / 任务完成 / 入库事件推送（见 simulation_engine/events.py）
 """
 
 import time
 import json
 import uuid
 import asyncio
+import os
 import threading
+from concurrent.futures import ThreadPoolExecutor, Future
 from datetime import datetime
 from pathlib import Path
 from typing import Optional
 from enum import Enum
 
+from simulation_engine.metrics import (
+    timed, FILE_WRITE_LATENCY, INGEST_LATENCY, SIMULATION_LATENCY, SIMULATION_ERRORS, SIMULATION_RETRIES
+)
+from simulation_engine.failures import CANCELLED, SimulationFailure, classify, retry_delay
+from simulation_engine.cancellation import CancelToken, ConcurrencySlot, SimulationCancelled, current_token
+from simulation_engine.deadlines import expired, simulation_deadline
+from simulation_engine.usage import UsageMeter, metering
+from simulation_engine.dead_letters import get_dead_letters
+from simulation_engine.tracing import start_trace, span, export_otlp_json
+from simulation_engine.inbox_store import get_inbox_store
+from simulation_engine.events import publish
+from simulation_engine.domain_registry import (
+    DEFAULT_DOMAIN, db_path, get_domain_manager, get_graph, write_lock, write_json
+)
+
+# 所有领域共用的批量工作线程池
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "4"))
+WORKER_POOL = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix="batch")
+
+# 全局 LLM 并发预算：同一时刻最多这么多个仿真在调 LLM（BatchRunner 与任务队列 batch_jobs 共用）；
+# 每场仿真一个 ConcurrencySlot，暂停 / 重试退避期间让出名额
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", str(BATCH_WORKERS)))
+LLM_BUDGET = threading.BoundedSemaphore(LLM_CONCURRENCY)
+
 # 全局状态管理
 class BatchState(Enum):
     IDLE = "idle"
@@ -30,22 +71,34 @@ class BatchState(Enum):
     COMPLETED = "completed"
 
 class BatchRunner:
-    def __init__(self):
+    def __init__(self, domain: str = DEFAULT_DOMAIN):
+        self.domain = domain
         self.state = BatchState.IDLE
         self.current_task = 0
         self.total_tasks = 0
         self.results = []
         self.errors = []
         self.start_time = None
-        self.worker_thread: Optional[threading.Thread] = None
-        self._pause_event = threading.Event()
-        self._pause_event.set()  # 默认不暂停
-        self._cancel_flag = False
+        self.worker_future: Optional[Future] = None
+        # 暂停 / 取消令牌：每批次一个，随 current_token 传进工作流节点和 LLM 调用
+        self.cancel_token = CancelToken()
+        # 分支模式：{"branch_turn": 第几轮, "branch_k": 分支数}
+        self.branch_options = {"branch_turn": None, "branch_k": 0}
+        # 按角色覆盖模型配置（见 graph.create_simulation_graph），每批次构建一次工作流
+        self.roles: Optional[dict] = None
+        # 本批次的超时覆盖 {"call", "node", "simulation"}（秒，见 deadlines.py）
+        self.deadlines: Optional[dict] = None
+        # 本批次的用量与预算 {"max_tokens", "max_cost"}；超出预算时 pause_reason = "budget:tokens" / "budget:cost"
+        self.budget: Optional[dict] = None
+        self.usage = UsageMeter()
+        self.pause_reason: Optional[str] = None
+        self._graph = None
+        # 由任务队列执行时所属的任务（写入死信，便于追溯）
+        self.job_id: Optional[str] = None
         
         # 路径配置
         self.BASE_DIR = Path(__file__).resolve().parent.parent
         self.LOG_FILE = self.BASE_DIR / "etl_factory" / "processing_log.json"
-        self.DB_DIR = Path(__file__).resolve().parent / "domain_db"
         
     def reset(self):
         """重置状态"""
@@ -55,8 +108,9 @@ class BatchRunner:
         self.results = []
         self.errors = []
         self.start_time = None
-        self._cancel_flag = False
-        self._pause_event.set()
+        self.cancel_token = CancelToken()
+        self.usage = UsageMeter(self.budget, on_exceeded=self._budget_exceeded)
+        self.pause_reason = None
         
     def get_status(self) -> dict:
         """获取当前状态"""
@@ -64,52 +118,99 @@ class BatchRunner:
         if self.start_time:
             elapsed = int((datetime.now() - self.start_time).total_seconds())
         
+        durations = [r["duration_seconds"] for r in self.results if "duration_seconds" in r]
+        usage = self.usage.snapshot()
+        
         return {
+            "domain": self.domain,
             "state": self.state.value,
             "current_task": self.current_task,
             "total_tasks": self.total_tasks,
             "progress": f"{self.current_task}/{self.total_tasks}",
             "progress_percent": int(self.current_task / self.total_tasks * 100) if self.total_tasks > 0 else 0,
             "elapsed_seconds": elapsed,
+            "avg_seconds_per_task": round(sum(durations) / len(durations), 2) if durations else 0,
             "success_count": len(self.results),
             "error_count": len(self.errors),
+            "error_classes": self._error_class_stats(),
+            "stop_reasons": self._stop_reason_stats(),
+            "usage": usage,
+            "budget": self.budget,
+            "pause_reason": self.pause_reason,
+            # 每条成功入收件箱的记录平均花费（含失败仿真的开销），用于比较不同配置
+            "cost_per_record": round(usage["cost"] / len(self.results), 6) if self.results else None,
+            "tokens_per_record": round(usage["total_tokens"] / len(self.results)) if self.results else None,
             "recent_results": self.results[-5:] if self.results else [],
             "recent_errors": self.errors[-3:] if self.errors else []
         }
     
+    def _budget_exceeded(self, kind: str):
+        """用量计量器超出预算时回调（在 LLM 回调线程里）：自动暂停，进行中的仿真在下一次 LLM 调用前停住"""
+        self.pause_reason = f"budget:{kind}"
+        self.cancel_token.pause()
+        if self.state == BatchState.RUNNING:
+            self.state = BatchState.PAUSED
+        print(f"💸 [{self.domain}] 超出{'token' if kind == 'tokens' else '费用'}预算 {self.budget}，批量任务已自动暂停")
+        self.publish_status()
+    
+    def publish_status(self):
+        """推送状态快照（batch.status），替代前端轮询 /api/batch/status"""
+        publish("batch.status", self.domain, self.get_status())
+    
+    def _error_class_stats(self) -> dict:
+        """按错误分类统计失败次数"""
+        stats = {}
+        for e in self.errors:
+            error_class = e.get("error_class") or "unknown"
+            stats[error_class] = stats.get(error_class, 0) + 1
+        return stats
+    
+    def _stop_reason_stats(self) -> dict:
+        """按停止原因统计：次数、平均轮次、平均 token、准确率"""
+        stats = {}
+        for r in self.results:
+            s = stats.setdefault(r.get("stop_reason") or "unknown",
+                                 {"count": 0, "turns": 0, "tokens": 0, "correct": 0})
+            s["count"] += 1
+            s["turns"] += r.get("turns", 0)
+            s["tokens"] += r.get("tokens_used", 0)
+            s["correct"] += 1 if r.get("correct") else 0
+        return {
+            reason: {
+                "count": s["count"],
+                "avg_turns": round(s["turns"] / s["count"], 2),
+                "avg_tokens": round(s["tokens"] / s["count"]),
+                "accuracy": round(s["correct"] / s["count"], 3),
+            }
+            for reason, s in stats.items()
+        }
+    
     def save_to_inbox(self, record: dict):
-        """保存到 ETL 收件箱"""
-        if not self.LOG_FILE.exists():
-            self.LOG_FILE.parent.mkdir(parents=True, exist_ok=True)
-            with open(self.LOG_FILE, 'w', encoding='utf-8') as f:
-                json.dump([], f)
-        
-        with open(self.LOG_FILE, 'r+', encoding='utf-8') as f:
-            try:
-                data = json.load(f)
-            except:
-                data = []
-            data.insert(0, record)
-            f.seek(0)
-            json.dump(data, f, ensure_ascii=False, indent=2)
-            f.truncate()
+        """保存到 ETL 收件箱（经 InboxStore 写入，收件箱增量同步能看到这条新增）"""
+        get_inbox_store(self.LOG_FILE).insert([record])
     
-    def auto_ingest_to_knowledge_graph(self, record: dict, domain: str = "hr"):
+    def auto_ingest_to_knowledge_graph(self, record: dict, domain: Optional[str] = None):
         """🔧 自动入库：直接将知识点添加到知识星图（带去重机制）"""
-        db_path = self.DB_DIR / f"{domain}.json"
+        domain = domain or self.domain
+        with timed(INGEST_LATENCY, domain=domain, path="auto"), write_lock(domain):
+            return self._auto_ingest(record, domain)
+    
+    def _auto_ingest(self, record: dict, domain: str) -> bool:
+        path = db_path(domain)
         
-        if not db_path.exists():
-            print(f"   ⚠️ 知识库文件不存在: {db_path}")
+        if not path.exists():
+            print(f"   ⚠️ 知识库文件不存在: {path}")
             return False
         
         try:
-            with open(db_path, 'r', encoding='utf-8') as f:
+            with open(path, 'r', encoding='utf-8') as f:
                 db = json.load(f)
             
             ai_pred = record.get("ai_prediction", "")
             record_cat = record.get("category", "")
             query = record.get("query", "")
             matched = False
+            ingested_to = None  # (分类, 服务, 是否新增服务)，入库成功后推送事件用
             
             # 在 taxonomy 中查找匹配的服务
             for category in db.get("taxonomy", []):
@@ -153,6 +254,7 @@ class BatchRunner:
                         }
                         category["trace_records"][service].append(trace_entry)
                         matched = True
+                        ingested_to = (cat_name, service, False)
                         print(f"   📊 自动入库: {ai_pred} → {cat_name}/{service}")
                         break
                 
@@ -167,7 +269,8 @@ class BatchRunner:
                         # 添加新服务
                         if "services" not in category:
                             category["services"] = []
-                        if ai_pred not in category["services"]:
+                        new_service = ai_pred not in category["services"]
+                        if new_service:
                             category["services"].append(ai_pred)
                         
                         # 添加追踪记录
@@ -193,13 +296,18 @@ class BatchRunner:
                         }
                         category["trace_records"][ai_pred].append(trace_entry)
                         matched = True
+                        ingested_to = (cat_name, ai_pred, new_service)
                         print(f"   📊 自动入库 (新增服务): {ai_pred} → {cat_name}")
                         break
             
             if matched:
                 # 保存更新后的知识库
-                with open(db_path, 'w', encoding='utf-8') as f:
-                    json.dump(db, f, ensure_ascii=False, indent=2)
+                with timed(FILE_WRITE_LATENCY, file="domain_db"):
+                    write_json(path, db)
+                cat_name, service, new_service = ingested_to
+                publish("ingest.record", domain, id=record.get("id"), service=service,
+                        category=cat_name, path="auto")
+                publish("coverage.delta", domain, traces=1, new_services=int(new_service))
                 return True
             else:
                 print(f"   ⚠️ 无法匹配: {ai_pred} / {record_cat}")
@@ -209,7 +317,9 @@ class BatchRunner:
             print(f"   ❌ 自动入库失败: {e}")
             return False
     
-    def run_single_simulation(self, index: int, domain: str = "hr") -> Optional[dict]:
+    def run_single_simulation(self, index: int, domain: Optional[str] = None,
+                              mission: Optional[dict] = None, checkpoint: Optional[dict] = None,
+                              cancel_token: Optional[CancelToken] = None) -> Optional[dict]:
         """
         运行单个仿真任务 V6.0
         
@@ -218,19 +328,45 @@ class BatchRunner:
         2. 提取 AI 真正的诊断结果（而非抄答案）
         3. 记录诊断推理链和关键追问
         4. 验证 AI 诊断是否与小白秘密任务匹配
-        """
-        # 检查暂停
-        self._pause_event.wait()
         
-        # 检查取消
-        if self._cancel_flag:
+        mission: 指定秘密任务（死信重放时沿用原任务），默认随机生成
+        checkpoint: 死信里的检查点（graph.export_checkpoint），从中断的节点续跑
+        cancel_token: 本场仿真的令牌（任务队列传入批次令牌的子令牌，租约被回收时单独取消），默认批次令牌
+        失败按错误分类重试（从失败的节点继续），重试耗尽 / 被取消写入死信队列
+        """
+        # 检查暂停 / 取消
+        token = cancel_token or self.cancel_token
+        if not token.wait_while_paused():
             return None
+        domain = domain or self.domain
         
+        # 每次仿真一棵 span 树，结束后导出 OTLP JSON；用量同时计入本场仿真与整批
+        reset = current_token.set(token)
+        meter = UsageMeter()
         try:
-            from simulation_engine.domain_manager import DomainManager
-            
-            dm = DomainManager(domain)
-            secret = dm.generate_secret_mission()
+            with simulation_deadline(self.deadlines), metering(meter, self.usage), \
+                    start_trace("simulation", domain=domain, index=index) as trace:
+                result = self._simulate(index, domain, trace, mission, checkpoint)
+                if not result.get("success"):
+                    trace.root.fail(result.get("error", ""))
+        finally:
+            current_token.reset(reset)
+        export_otlp_json(trace)
+        result["usage"] = meter.snapshot()
+        result["cost"] = result["usage"]["cost"]
+        if result["usage"]["total_tokens"]:
+            result["tokens_used"] = result["usage"]["total_tokens"]
+        return result
+    
+    def _simulate(self, index: int, domain: str, trace, mission: Optional[dict] = None,
+                  checkpoint: Optional[dict] = None) -> dict:
+        """单次仿真主体（在 trace 内执行）"""
+        sim_start = time.perf_counter()
+        secret = mission
+        try:
+            with span("mission.generate"):
+                dm = get_domain_manager(domain)
+                secret = mission or dm.generate_secret_mission()
             thread_id = f"batch_{uuid.uuid4().hex[:8]}"
             
             # 初始化结果变量
@@ -241,10 +377,13 @@ class BatchRunner:
             total_turns = 0
             key_questions = []
             diagnosis_correct = False
+            stop_reason = None
+            tokens_used = 0
+            branch_tree = []
             
             # 尝试使用 LangGraph 多轮工作流
             try:
-                from simulation_engine.graph import app as graph_app
+                graph_app = self._get_graph()
                 expert_ctx = dm.get_expert_context()
                 
                 # 🆕 V6.0 新状态结构
@@ -260,11 +399,17 @@ class BatchRunner:
                     "key_questions": [],
                     "eliminated_categories": [],
                     "confidence_history": [],
-                    "final_diagnosis": None
+                    "final_diagnosis": None,
+                    "stop_reason": None,
+                    "tokens_used": 0,
+                    "cost_used": 0.0,
+                    "branch_tree": [],
+                    "prefetched_expert": None,
+                    **self.branch_options
                 }
                 
-                config = {"recursion_limit": 50}
-                final_state = graph_app.invoke(initial_state, config=config)
+                with span("graph.invoke"):
+                    final_state = self._invoke_graph(graph_app, initial_state, thread_id, checkpoint)
                 
                 # 🆕 提取真正的 AI 诊断结果
                 if final_state.get("final_diagnosis"):
@@ -276,6 +421,9 @@ class BatchRunner:
                 # 提取诊断追踪
                 diagnosis_trace = final_state.get("diagnosis_trace", [])
                 total_turns = final_state.get("turn_count", 0)
+                stop_reason = final_state.get("stop_reason")
+                tokens_used = final_state.get("tokens_used", 0)
+                branch_tree = final_state.get("branch_tree", [])
                 
                 # 🆕 验证诊断是否正确
                 ground_truth = secret['expert_term']
@@ -389,18 +537,30 @@ class BatchRunner:
                 "total_turns": total_turns,
                 "key_questions": key_questions,
                 "diagnosis_trace": diagnosis_trace[:3],  # 只保存前 3 轮追踪
+                "stop_reason": stop_reason,
+                "tokens_used": tokens_used,
+                "branch_tree": branch_tree,  # 分支模式下每个分支都是一条关键追问记录
                 
                 "source": "batch_ai_battle_v6"
             }
             
+            # 入库前最后确认一次：已取消（如租约被回收、另一个 worker 在重跑）的仿真不能写库，否则会重复入库
+            current_token.get().raise_if_cancelled()
+
             # 🔧 自动入库模式：直接入库到知识星图
-            ingested = self.auto_ingest_to_knowledge_graph(record, domain)
+            with span("ingest"):
+                ingested = self.auto_ingest_to_knowledge_graph(record, domain)
             
-            # 同时保存一份到收件箱
-            self.save_to_inbox(record)
+            # 同时保存一份到收件箱（只带 trace_id + 小摘要，完整 span 树见 OTLP 导出）
+            record["trace_id"] = trace.trace_id
+            record["trace"] = trace.summary()
+            with span("inbox.write"):
+                self.save_to_inbox(record)
             
             # 返回结果
             status_icon = "✅" if diagnosis_correct else "⚠️"
+            duration = time.perf_counter() - sim_start
+            SIMULATION_LATENCY.observe(duration, domain=domain, outcome="success")
             return {
                 "id": thread_id,
                 "query": secret['novice_intent'][:50] + "..." if len(secret['novice_intent']) > 50 else secret['novice_intent'],
@@ -408,20 +568,95 @@ class BatchRunner:
                 "ground_truth": secret['expert_term'],
                 "correct": diagnosis_correct,
                 "turns": total_turns,
+                "stop_reason": stop_reason,
+                "tokens_used": tokens_used,
                 "confidence": diagnosis_confidence,
                 "ingested": ingested,
+                "duration_seconds": round(duration, 2),
                 "success": True
             }
             
         except Exception as e:
             import traceback
-            print(f"   ❌ 错误详情: {traceback.format_exc()}")
+            error_class = classify(e)
+            attempts = getattr(e, "attempts", 1)
+            node = getattr(e, "node", None)
+            if error_class == "bug":
+                print(f"   ❌ 错误详情: {traceback.format_exc()}")
+            SIMULATION_LATENCY.observe(time.perf_counter() - sim_start, domain=domain,
+                                       outcome="cancelled" if error_class == CANCELLED else "error")
+            SIMULATION_ERRORS.inc(domain=domain, error_class=error_class)
+            dead_letter_id = None
+            # 进程退出（shutdown）/ 租约被回收（lease_lost）时任务由队列重跑，不必进死信
+            if not (error_class == CANCELLED and current_token.get().reason in ("shutdown", "lease_lost")):
+                try:
+                    dead_letter_id = get_dead_letters().add(
+                        domain, error_class, str(e), attempts=attempts, node=node, mission=secret,
+                        options={**self.branch_options, "roles": self.roles, "deadlines": self.deadlines}, job_id=self.job_id,
+                        task_index=index, checkpoint=getattr(e, "checkpoint", None))
+                except Exception as dl_error:
+                    print(f"   ⚠️ 写入死信队列失败: {dl_error}")
             return {
                 "id": f"error_{index}",
                 "error": str(e),
+                "error_class": error_class,
+                "attempts": attempts,
+                "failed_node": node,
+                "dead_letter_id": dead_letter_id,
                 "success": False
             }
     
+    def _invoke_graph(self, graph_app, initial_state: dict, thread_id: str,
+                      checkpoint: Optional[dict] = None) -> dict:
+        """
+        执行工作流；失败按错误分类退避重试，从失败的节点继续（检查点里保留了之前各节点的结果）
+
+        每个节点之间检查取消令牌；重试耗尽 / 不可重试 / 被取消时抛 SimulationFailure（附带导出的检查点），
+        ImportError 原样抛出（走模拟模式）
+        checkpoint: 死信里导出的检查点，写回后从中断的节点继续
+        """
+        from simulation_engine.graph import export_checkpoint, restore_checkpoint
+
+        config = {"recursion_limit": 50, "configurable": {"thread_id": thread_id}}
+        state_input, attempt = initial_state, 1
+        if checkpoint:
+            state_input = restore_checkpoint(graph_app, config, checkpoint)
+        token = current_token.get() or self.cancel_token
+        try:
+            while True:
+                try:
+                    token.raise_if_cancelled()
+                    final_state = None
+                    for final_state in graph_app.stream(state_input, config=config, stream_mode="values"):
+                        token.checkpoint()
+                    return final_state
+                except ImportError:
+                    raise
+                except Exception as e:
+                    error_class = classify(e)
+                    pending = graph_app.get_state(config).next
+                    node = pending[0] if pending else None
+                    delay = retry_delay(error_class, attempt, e)
+                    if expired("simulation"):
+                        delay = None  # 整场仿真的时间已用完，重试也来不及
+                    if delay is None or token.cancelled:
+                        if token.cancelled and not isinstance(e, SimulationCancelled):
+                            error_class, e = CANCELLED, SimulationCancelled(token.reason)
+                        raise SimulationFailure(error_class, e, attempt, node,
+                                                export_checkpoint(graph_app, config)) from e
+                    SIMULATION_RETRIES.inc(error_class=error_class, node=node or "unknown")
+                    print(f"   🔁 [{error_class}] 节点 {node} 失败，{delay:.1f}s 后第 {attempt + 1} 次尝试: {e}")
+                    token.sleep(delay)  # 等待中被取消会立即醒来，下一轮开头抛出
+                    state_input, attempt = None, attempt + 1  # None：从检查点继续
+        finally:
+            graph_app.checkpointer.delete_thread(thread_id)
+    
+    def _get_graph(self):
+        """按本批次的角色配置构建领域工作流（没有覆盖时复用领域的共享工作流）"""
+        if self._graph is None:
+            self._graph = get_graph(self.domain, roles=self.roles, resumable=True)
+        return self._graph
+    
     def _generate_ambiguous_opening(self, secret: dict) -> str:
         """生成模糊的开场白（不泄露答案）"""
         import random
@@ -442,77 +677,124 @@ class BatchRunner:
         self.state = BatchState.RUNNING
         self.total_tasks = batch_size
         self.start_time = datetime.now()
+        self.publish_status()
         
         for i in range(batch_size):
             # 检查取消
-            if self._cancel_flag:
+            token = self.cancel_token
+            if token.cancelled:
                 self.state = BatchState.CANCELLED
+                self.publish_status()
                 print(f"🛑 批量任务已取消 ({i}/{batch_size})")
                 return
             
             # 检查暂停
-            if not self._pause_event.is_set():
+            if token.paused:
                 self.state = BatchState.PAUSED
+                self.publish_status()
                 print(f"⏸️ 批量任务已暂停 ({i}/{batch_size})")
             
-            self._pause_event.wait()
-            
-            if self._cancel_flag:
+            if not token.wait_while_paused():
                 self.state = BatchState.CANCELLED
+                self.publish_status()
                 return
             
             self.state = BatchState.RUNNING
             self.current_task = i + 1
+            publish("batch.task_started", domain, index=i, current_task=i + 1, total_tasks=batch_size)
+            self.publish_status()
             
             print(f"⚡️ [{i+1}/{batch_size}] 正在运行仿真...")
-            result = self.run_single_simulation(i, domain)
+            with ConcurrencySlot(LLM_BUDGET):
+                result = self.run_single_simulation(i, domain)
             
             if result:
                 if result.get("success"):
                     self.results.append(result)
                     print(f"   ✅ 成功: {result.get('prediction', 'N/A')}")
+                elif result.get("error_class") == CANCELLED:
+                    print(f"   🛑 已中断（检查点已写入死信 {result.get('dead_letter_id')}）")
                 else:
                     self.errors.append(result)
-                    print(f"   ❌ 失败: {result.get('error', 'Unknown')}")
+                    print(f"   ❌ 失败 [{result.get('error_class', 'unknown')}]: {result.get('error', 'Unknown')}")
+                publish("batch.task_finished", domain, index=i, success=bool(result.get("success")),
+                        prediction=result.get("prediction"), correct=result.get("correct"),
+                        duration_seconds=result.get("duration_seconds"), error=result.get("error"),
+                        error_class=result.get("error_class"))
+                self.publish_status()
             
             # 间隔延迟
             time.sleep(1)
         
         self.state = BatchState.COMPLETED
+        self.publish_status()
         print(f"🎉 批量任务完成! 成功: {len(self.results)}, 失败: {len(self.errors)}")
     
-    def start(self, batch_size: int = 5, domain: str = "hr") -> dict:
-        """启动批量任务"""
+    def start(self, batch_size: int = 5, domain: Optional[str] = None,
+              branch_turn: Optional[int] = None, branch_k: int = 0,
+              roles: Optional[dict] = None, deadlines: Optional[dict] = None,
+              budget: Optional[dict] = None) -> dict:
+        """
+        启动批量任务
+        
+        branch_turn / branch_k: 开启分支探索模式
+        roles: 按角色覆盖模型，如 {"novice": {"model": "glm-4-flash", "max_tokens": 300}}
+        deadlines: 超时覆盖（秒），如 {"call": 30, "node": 120, "simulation": 600}
+        budget: 用量预算，如 {"max_tokens": 2000000, "max_cost": 50}，超出自动暂停
+        """
+        if domain and domain != self.domain:
+            # 旧调用方式 batch_runner.start(n, "insurance")：转给对应领域的 runner
+            return get_batch_runner(domain).start(batch_size, branch_turn=branch_turn,
+                                                  branch_k=branch_k, roles=roles, deadlines=deadlines,
+                                                  budget=budget)
         if self.state == BatchState.RUNNING:
             return {"status": "error", "message": "任务已在运行中"}
+        if self.state == BatchState.PAUSED:
+            # 重置会换掉取消令牌，旧的 worker 会永远停在旧令牌上（占着线程池和 LLM 并发额度）
+            return {"status": "error", "message": "任务已暂停，请先恢复或取消"}
+        if self.worker_future is not None and not self.worker_future.done():
+            return {"status": "error", "message": "上一批任务正在收尾，请稍后再试"}
+        domain = self.domain
         
+        self.budget = budget or None
         self.reset()
-        self._cancel_flag = False
-        self._pause_event.set()
+        self.branch_options = {"branch_turn": branch_turn, "branch_k": branch_k if branch_turn else 0}
+        self.roles = roles or None
+        self.deadlines = deadlines or None
+        self._graph = None
         
-        self.worker_thread = threading.Thread(
-            target=self._worker,
-            args=(batch_size, domain),
-            daemon=True
-        )
-        self.worker_thread.start()
+        self.worker_future = WORKER_POOL.submit(self._worker, batch_size, domain)
         
-        return {"status": "started", "batch_size": batch_size, "domain": domain}
+        return {"status": "started", "batch_size": batch_size, "domain": domain,
+                "roles": self.roles, "deadlines": self.deadlines, "budget": self.budget, **self.branch_options}
     
     def pause(self) -> dict:
         """暂停任务"""
         if self.state != BatchState.RUNNING:
             return {"status": "error", "message": "没有正在运行的任务"}
         
-        self._pause_event.clear()
+        self.cancel_token.pause()
+        self.pause_reason = "manual"
+        self.state = BatchState.PAUSED  # 进行中的仿真在下一次 LLM 调用前停住
+        self.publish_status()
         return {"status": "paused", "current_task": self.current_task}
     
-    def resume(self) -> dict:
-        """恢复任务"""
+    def resume(self, budget: Optional[dict] = None) -> dict:
+        """恢复任务；budget 调整预算（因超出预算而暂停时，需提高预算才能恢复）"""
         if self.state != BatchState.PAUSED:
             return {"status": "error", "message": "没有暂停的任务"}
+        if budget is not None:
+            self.budget = budget or None
+            self.usage.set_budget(self.budget)
+        exceeded = self.usage.exceeded()
+        if exceeded:
+            return {"status": "error", "message": f"已超出{'token' if exceeded == 'tokens' else '费用'}预算，请提高预算后再恢复",
+                    "usage": self.usage.snapshot(), "budget": self.budget}
         
-        self._pause_event.set()
+        self.pause_reason = None
+        self.cancel_token.resume()
+        self.state = BatchState.RUNNING
+        self.publish_status()
         return {"status": "resumed", "current_task": self.current_task}
     
     def cancel(self) -> dict:
@@ -520,13 +802,33 @@ class BatchRunner:
         if self.state not in [BatchState.RUNNING, BatchState.PAUSED]:
             return {"status": "error", "message": "没有可取消的任务"}
         
-        self._cancel_flag = True
-        self._pause_event.set()  # 解除暂停以便线程可以退出
+        # 放弃进行中的 LLM 请求，解除暂停以便线程可以退出
+        self.cancel_token.cancel()
+        self.publish_status()
         return {"status": "cancelled", "completed_tasks": self.current_task}
 
 
-# 全局单例
-batch_runner = BatchRunner()
+# 每个领域一个 BatchRunner
+_runners: dict = {}
+_runners_lock = threading.Lock()
+
+
+def get_batch_runner(domain: Optional[str] = None) -> BatchRunner:
+    """取领域的 BatchRunner（不存在则创建），领域需已在 domains.yaml 注册"""
+    domain = domain or DEFAULT_DOMAIN
+    with _runners_lock:
+        if domain not in _runners:
+            _runners[domain] = BatchRunner(domain)
+        return _runners[domain]
+
+
+def all_batch_runners() -> dict:
+    with _runners_lock:
+        return dict(_runners)
+
+
+# 默认领域的单例（兼容旧的 import）
+batch_runner = get_batch_runner()
 
 
 # ==========================================
@@ -550,13 +852,14 @@ if __name__ == "__main__":
 ╚════════════════════════════════════════════════════════╝
     """)
     
-    result = batch_runner.start(args.size, args.domain)
+    runner = get_batch_runner(args.domain)
+    result = runner.start(args.size)
     print(f"启动结果: {result}")
     
     # 等待完成
-    while batch_runner.state in [BatchState.RUNNING, BatchState.PAUSED]:
+    while runner.state in [BatchState.IDLE, BatchState.RUNNING, BatchState.PAUSED]:
         time.sleep(2)
-        status = batch_runner.get_status()
+        status = runner.get_status()
         print(f"进度: {status['progress']} ({status['progress_percent']}%)")
     
-    print(f"\n最终结果: {batch_runner.get_status()}")
+    print(f"\n最终结果: {runner.get_status()}")
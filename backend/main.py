@@ -2,57 +2,86 @@ import json
 import os
 import uuid
 import random
-from fastapi import FastAPI, HTTPException, Request
+from contextlib import ExitStack
+import asyncio
+from fastapi import APIRouter, FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, Response
 from pathlib import Path
 from langchain_core.messages import HumanMessage, AIMessage
+from simulation_engine.metrics import REGISTRY, timed, FILE_WRITE_LATENCY, INGEST_LATENCY
+from simulation_engine.deadlines import simulation_deadline
+from simulation_engine.inbox_store import get_inbox_store
+from simulation_engine.events import EVENT_BUS, publish
+from simulation_engine.http_cache import CachedBody, cached_response
+from simulation_engine.dead_letters import get_dead_letters
+from simulation_engine.domain_registry import (
+    DEFAULT_DOMAIN, get_domain, db_path, write_lock, write_json, domains_summary, load_domains
+)
 
 # 尝试引入仿真引擎，如果失败则打印警告
 try:
-    from simulation_engine.domain_manager import DomainManager
-    from simulation_engine.graph import app as graph_app, SimulationState
+    from simulation_engine.domain_registry import get_domain_manager, get_graph
+    from simulation_engine.graph import SimulationState
+    from simulation_engine.estimator import DEFAULT_MAX_TURNS, estimate_batch
     SIMULATION_AVAILABLE = True
 except ImportError as e:
     print(f"Warning: simulation_engine components not found: {e}")
     SIMULATION_AVAILABLE = False
 
 app = FastAPI()
-app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"],
+                   expose_headers=["ETag"])
+
+# 🌐 多领域：同一组接口挂两次
+#   /api/...           旧路径，领域取请求参数 / body 中的 domain，默认 DEFAULT_DOMAIN
+#   /{domain}/api/...  领域前缀路径，领域由 domains.yaml 注册（前端把 API 地址设为 http://host:8000/<domain> 即可）
+api = APIRouter()
 
 # 🌟 绝对路径锚定：彻底解决“文件找不着”的问题
 BASE_DIR = Path(__file__).resolve().parent
 ROOT_DIR = BASE_DIR.parent
 ETL_LOG = ROOT_DIR / "etl_factory" / "processing_log.json"
-DB_DIR = BASE_DIR / "domain_db"
-
-# 🔧 仿真会话状态存储 (简化版：单会话)
-current_simulation = {
-    "state": None,
-    "step_count": 0,
-    "mission": None,
-    "domain": "hr"
-}
+inbox_store = get_inbox_store(ETL_LOG)
+
+# 🔧 仿真会话状态存储 (简化版：每个领域一个会话)
+simulations: Dict[str, dict] = {}
+last_domain = DEFAULT_DOMAIN  # 旧路径 /api/next 不带领域，沿用最近一次 start 的领域
+
+
+def resolve_domain(domain: Optional[str]) -> str:
+    """校验领域已在 domains.yaml 注册，未指定时用默认领域"""
+    try:
+        return get_domain(domain)["id"]
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
 
 # ==========================================
 # 🎮 逆向工程：接口垫片 (兼容所有前端路径)
 # ==========================================
-@app.post("/api/start")           
-@app.post("/api/simulation/start") 
-async def start_simulation(data: Dict[str, Any] = None):
-    global current_simulation
-    domain = data.get("domain", "hr") if data else "hr"
-    missions = [
-        {"intent": "员工怀孕了，我想让她辞职。", "term": "孕期合规", "cat": "劳动关系"},
-        {"intent": "技术主管带走核心代码去竞对公司。", "term": "竞业限制管理", "cat": "员工关系"}
-    ]
-    selected = random.choice(missions)
-    mission = {"novice_intent": selected["intent"], "expert_term": selected["term"], "category": selected["cat"]}
+@api.post("/api/start")           
+@api.post("/api/simulation/start") 
+async def start_simulation(data: Dict[str, Any] = None, domain: Optional[str] = None):
+    global last_domain
+    domain = last_domain = resolve_domain(domain or (data or {}).get("domain"))
     
     # 初始化仿真状态
-    taxonomy_context = DomainManager(domain).get_expert_context() if SIMULATION_AVAILABLE else ""
-    current_simulation = {
+    if SIMULATION_AVAILABLE:
+        dm = get_domain_manager(domain)
+        mission = dm.generate_secret_mission()
+        taxonomy_context = dm.get_expert_context()
+    else:
+        missions = [
+            {"intent": "员工怀孕了，我想让她辞职。", "term": "孕期合规", "cat": "劳动关系"},
+            {"intent": "技术主管带走核心代码去竞对公司。", "term": "竞业限制管理", "cat": "员工关系"}
+        ]
+        selected = random.choice(missions)
+        mission = {"novice_intent": selected["intent"], "expert_term": selected["term"], "category": selected["cat"]}
+        taxonomy_context = ""
+    simulations[domain] = {
         "state": {
             "messages": [],
             "domain": domain,
@@ -76,12 +105,18 @@ async def start_simulation(data: Dict[str, Any] = None):
 # ==========================================
 # 🚀 仿真引擎：逐步执行 (核心新增)
 # ==========================================
-@app.post("/api/next")
-@app.post("/api/simulation/next")
-async def next_step():
-    global current_simulation
+@api.post("/api/next")
+@api.post("/api/simulation/next")
+def next_step(domain: Optional[str] = None, timeout: Optional[float] = None):
+    """
+    执行一步仿真；timeout：本步的截止时间（秒，默认 SIMULATION_TIMEOUT），超时返回错误而不是一直挂起
+
+    普通 def：工作流调用 LLM、写收件箱（文件锁 + 整文件重写）都是阻塞调用，在线程池里执行
+    """
+    domain = resolve_domain(domain or last_domain)
+    current_simulation = simulations.get(domain)
     
-    if not current_simulation["state"]:
+    if not current_simulation or not current_simulation["state"]:
         raise HTTPException(status_code=400, detail="请先调用 /api/start 开始仿真")
     
     state = current_simulation["state"]
@@ -128,7 +163,8 @@ async def next_step():
     # 真实模式：调用 LangGraph 引擎
     try:
         # 执行一步仿真
-        result = graph_app.invoke(state)
+        with simulation_deadline({"simulation": timeout} if timeout else None):
+            result = get_graph(domain).invoke(state)
         
         # 更新状态
         current_simulation["state"] = result
@@ -192,7 +228,7 @@ def save_simulation_to_etl(simulation_data: dict):
         "id": f"sim_{uuid.uuid4().hex[:8]}",
         "timestamp": datetime.now().isoformat(),
         "status": "pending",
-        "domain": simulation_data.get("domain", "hr"),
+        "domain": simulation_data.get("domain", DEFAULT_DOMAIN),
         "query": mission.get("novice_intent", ""),
         "ai_prediction": mission.get("expert_term", ""),
         "category": mission.get("category", ""),
@@ -204,26 +240,9 @@ def save_simulation_to_etl(simulation_data: dict):
         ]
     }
     
-    # 读取现有数据
-    try:
-        if ETL_LOG.exists():
-            with open(ETL_LOG, 'r', encoding='utf-8') as f:
-                inbox = json.load(f)
-                if not isinstance(inbox, list):
-                    inbox = []
-        else:
-            inbox = []
-    except:
-        inbox = []
-    
-    # 添加新记录
-    inbox.insert(0, etl_record)  # 插入到最前面
-    
-    # 保存
+    # 插入到收件箱最前面
     try:
-        ETL_LOG.parent.mkdir(parents=True, exist_ok=True)
-        with open(ETL_LOG, 'w', encoding='utf-8') as f:
-            json.dump(inbox, f, ensure_ascii=False, indent=2)
+        inbox_store.insert([etl_record])
         print(f"✅ ETL: 已保存仿真记录 {etl_record['id']}")
     except Exception as e:
         print(f"❌ ETL 保存失败: {e}")
@@ -231,21 +250,37 @@ def save_simulation_to_etl(simulation_data: dict):
 # ==========================================
 # 📥 ETL 库：全兼容入库 (支持单选/全选)
 # ==========================================
-@app.get("/api/knowledge/logs")
-@app.get("/api/etl/inbox")
-async def get_etl_inbox():
-    if not ETL_LOG.exists(): return []
-    try:
-        with open(ETL_LOG, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return data if isinstance(data, list) else []
-    except: return []
+@api.get("/api/knowledge/logs")
+@api.get("/api/etl/inbox")
+async def get_etl_inbox(request: Request, domain: Optional[str] = None):
+    """收件箱是所有领域共用的，带领域时只返回该领域的记录（带 ETag，未变化时 304）"""
+    if domain:
+        domain = resolve_domain(domain)
+    return cached_response(request, inbox_store.etag(domain), lambda: inbox_store.rendered(domain))
+
 
+@api.get("/api/etl/inbox/changes")
+async def get_etl_inbox_changes(request: Request, since: int = 0, epoch: Optional[str] = None,
+                                domain: Optional[str] = None):
+    """
+    收件箱增量同步：只返回序列号 since 之后新增 / 修改（upserts）和删除（removed）的记录
 
-@app.post("/api/taxonomy/add")    
-@app.post("/api/knowledge/ingest")
-@app.post("/api/etl/batch_ingest")
-async def universal_ingest(request: Request):
+    客户端保存响应里的 epoch + seq，下次作为 epoch / since 传回；full=True 时用 upserts 替换本地全部数据
+    """
+    if domain:
+        domain = resolve_domain(domain)
+    current_epoch, seq = inbox_store.version()
+    etag = f'"inbox-changes-{domain or "all"}-{current_epoch}-{seq}"'
+    return cached_response(request, etag, lambda: CachedBody(json.dumps(
+        {**inbox_store.changes(since, epoch, domain), "etag": etag}, ensure_ascii=False).encode("utf-8"), etag=etag))
+
+
+@api.post("/api/taxonomy/add")    
+@api.post("/api/knowledge/ingest")
+@api.post("/api/etl/batch_ingest")
+@api.post("/api/ingest")
+@api.post("/api/batch_ingest")
+async def universal_ingest(request: Request, domain: Optional[str] = None):
     if not ETL_LOG.exists(): 
         return {"status": "error", "message": "ETL log file not found"}
     
@@ -255,30 +290,47 @@ async def universal_ingest(request: Request):
     except Exception as e:
         return {"status": "error", "message": f"Invalid JSON: {str(e)}"}
     
-    # 统一解析数据格式
+    # 统一解析数据格式（领域前缀路径下，未写 domain 的条目归属该领域）
+    default_domain = resolve_domain(domain or body.get("domain"))
     items = []
     if "items" in body: 
-        items = body["items"]
+        items = [{**item, "domain": item.get("domain") or default_domain} for item in body["items"]]
     else: 
-        items = [{"id": body.get("id"), "domain": body.get("domain", "hr")}]
+        items = [{"id": body.get("id"), "domain": default_domain}]
     
     print(f"📥 ETL 入库请求: {len(items)} 条记录")
+    # 写锁可能被批量任务线程长时间持有，不能在事件循环里等（会卡住整个服务，包括 /ws/events）
+    return await run_in_threadpool(_locked_ingest, items, default_domain)
+
 
-    with open(ETL_LOG, 'r', encoding='utf-8') as f:
-        inbox = json.load(f)
+def _locked_ingest(items: list, default_domain: str) -> dict:
+    # 收件箱 + 涉及的领域知识库都要读-改-写，按固定顺序加锁
+    with timed(INGEST_LATENCY, domain=default_domain, path="manual"), ExitStack() as locks:
+        for name in sorted({"inbox"} | {item["domain"] for item in items}):
+            locks.enter_context(write_lock(name))
+        return _ingest_items(items)
+
+
+def _ingest_items(items: list) -> dict:
+    inbox = inbox_store.records()
 
     db_cache = {}
     success_ids = []
+    ingested = []  # (领域, id, 分类, 服务, 是否新增服务)
 
     for item in items:
-        rid, dom = item.get("id"), item.get("domain", "hr")
+        rid, dom = item.get("id"), item.get("domain", DEFAULT_DOMAIN)
         record = next((r for r in inbox if r["id"] == rid), None)
         if not record: 
             print(f"⚠️ 未找到记录: {rid}")
             continue
         
         if dom not in db_cache:
-            p = DB_DIR / f"{dom}.json"
+            try:
+                p = db_path(dom)
+            except KeyError:
+                print(f"⚠️ 未注册的领域: {dom}")
+                continue
             if p.exists():
                 with open(p, 'r', encoding='utf-8') as f: 
                     db_cache[dom] = json.load(f)
@@ -314,6 +366,7 @@ async def universal_ingest(request: Request):
                         }
                         category["trace_records"][service].append(trace_entry)
                         success_ids.append(rid)
+                        ingested.append((dom, rid, category.get("name", ""), service, False))
                         matched = True
                         print(f"✅ 入库成功: {ai_pred} → {category['name']}/{service}")
                         break
@@ -330,7 +383,8 @@ async def universal_ingest(request: Request):
                     # 检查类别是否匹配
                     if record_cat and (record_cat in cat_name or cat_name in record_cat):
                         # 动态添加新服务到 services 列表
-                        if ai_pred not in category.get("services", []):
+                        new_service = ai_pred not in category.get("services", [])
+                        if new_service:
                             if "services" not in category:
                                 category["services"] = []
                             category["services"].append(ai_pred)
@@ -351,34 +405,73 @@ async def universal_ingest(request: Request):
                         }
                         category["trace_records"][ai_pred].append(trace_entry)
                         success_ids.append(rid)
+                        ingested.append((dom, rid, cat_name, ai_pred, new_service))
                         print(f"✅ 入库成功 (新增服务): {ai_pred} → {cat_name}")
                         break
     
     # 保存更新后的知识库
     for d, content in db_cache.items():
-        with open(DB_DIR / f"{d}.json", 'w', encoding='utf-8') as f:
-            json.dump(content, f, ensure_ascii=False, indent=2)
+        with timed(FILE_WRITE_LATENCY, file="domain_db"):
+            write_json(db_path(d), content)
 
     # 成功后从收件箱移除
-    new_inbox = [r for r in inbox if r["id"] not in success_ids]
-    with open(ETL_LOG, 'w', encoding='utf-8') as f:
-        json.dump(new_inbox, f, ensure_ascii=False, indent=2)
+    inbox_store.remove(success_ids)
+
+    for dom, rid, cat_name, service, new_service in ingested:
+        publish("ingest.record", dom, id=rid, service=service, category=cat_name, path="manual")
+        publish("coverage.delta", dom, traces=1, new_services=int(new_service))
 
     print(f"📊 ETL 入库完成: 成功 {len(success_ids)} 条")
     return {"status": "success", "count": len(success_ids)}
 
-@app.get("/api/taxonomy")
-async def get_taxonomy(domain: str = "hr"):
-    p = DB_DIR / f"{domain}.json"
-    if not p.exists(): return {"service_nodes": []}
-    with open(p, 'r', encoding='utf-8') as f: return json.load(f)
+# 快照构建 / 压缩是同步的 CPU 与文件操作，用普通 def（在线程池里执行）
+@api.get("/api/taxonomy")
+def get_taxonomy(request: Request, domain: Optional[str] = None, view: str = "slim"):
+    """
+    知识库分类树（强 ETag + gzip / brotli，知识库文件不变时 304）
+
+    view=slim（默认）：分类 / 服务名 + 各服务追踪记录条数（trace_counts），记录正文走 /api/taxonomy/records
+    view=full：原始 domain_db JSON（含全部 trace_records 与对话路径）
+    """
+    from simulation_engine.taxonomy_view import get_taxonomy_snapshot
+
+    snapshot = get_taxonomy_snapshot(resolve_domain(domain))
+    if snapshot is None:
+        return {"service_nodes": []}
+    if view == "full":
+        return cached_response(request, snapshot.etag, lambda: snapshot.full)
+    if view != "slim":
+        raise HTTPException(status_code=400, detail="view 可选: slim, full")
+    return cached_response(request, snapshot.slim_etag, snapshot.slim)
+
+
+@api.get("/api/taxonomy/records")
+def get_taxonomy_records(request: Request, service: str, domain: Optional[str] = None,
+                               category: Optional[str] = None, offset: int = 0, limit: int = 20,
+                               fields: str = "full"):
+    """
+    单个服务的追踪记录（最新的在前，分页）
+
+    service 按 trace_records 的 key 精确匹配，找不到时按包含关系模糊匹配；fields=summary 时不含对话路径
+    """
+    from simulation_engine.taxonomy_view import get_taxonomy_snapshot
+
+    if fields not in ("full", "summary"):
+        raise HTTPException(status_code=400, detail="fields 可选: full, summary")
+    offset, limit = max(offset, 0), min(max(limit, 1), 200)
+    snapshot = get_taxonomy_snapshot(resolve_domain(domain))
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="知识库文件不存在")
+    return cached_response(request, snapshot.page_etag(service, category, offset, limit, fields),
+                           lambda: snapshot.records_page(service, category, offset, limit, fields))
 
 # ==========================================
 # 📊 知识库覆盖率统计 API
 # ==========================================
-@app.get("/api/coverage")
-async def get_coverage(domain: str = "hr"):
+@api.get("/api/coverage")
+async def get_coverage(domain: Optional[str] = None):
     """获取知识库覆盖率统计"""
+    domain = resolve_domain(domain)
     try:
         from simulation_engine.coverage_calculator import get_coverage_stats
         return get_coverage_stats(domain)
@@ -391,18 +484,90 @@ async def get_coverage(domain: str = "hr"):
             "error": "覆盖率计算模块不可用"
         }
 
+# ==========================================
+# 📦 列式导出（Arrow / Parquet）
+# ==========================================
+@api.get("/api/export/traces")
+def export_traces(domain: Optional[str] = None, table: str = "records",
+                  format: str = "parquet", origin: Optional[str] = None):
+    """
+    追踪记录 + 收件箱记录拍平导出，供 DuckDB / pandas 分析（普通 def：拍平 + 压缩编码在线程池里跑，不阻塞事件循环）
+
+    table: records（一条记录一行）| turns（对话轮次子表，按 origin + record_id 关联）
+    format: parquet | arrow（Arrow IPC stream）
+    origin: trace | inbox，默认两者都导出；不带领域时导出全部领域
+    """
+    from simulation_engine import trace_export
+
+    if not trace_export.ARROW_AVAILABLE:
+        raise HTTPException(status_code=501, detail="导出需要 pyarrow：pip install pyarrow")
+    if table not in trace_export.TABLES:
+        raise HTTPException(status_code=400, detail=f"table 可选: {', '.join(trace_export.TABLES)}")
+    if format not in trace_export.MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"format 可选: {', '.join(trace_export.MEDIA_TYPES)}")
+    if origin and origin not in trace_export.ORIGINS:
+        raise HTTPException(status_code=400, detail=f"origin 可选: {', '.join(trace_export.ORIGINS)}")
+
+    domains = [resolve_domain(domain)] if domain else list(load_domains())
+    domain_dbs, inbox = trace_export.load_sources(domains, ETL_LOG)
+    tables = trace_export.build_tables(domain_dbs, inbox, origin=origin, default_domain=DEFAULT_DOMAIN)
+    suffix = "parquet" if format == "parquet" else "arrows"
+    return Response(
+        trace_export.to_bytes(tables[table], format),
+        media_type=trace_export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{domain or "all"}_{table}.{suffix}"'}
+    )
+
 # ==========================================
 # 🤖 批量 AI 互博控制 API
 # ==========================================
 try:
-    from batch_runner_v3 import batch_runner
+    from batch_runner_v3 import get_batch_runner, all_batch_runners, BATCH_WORKERS, LLM_CONCURRENCY
     BATCH_AVAILABLE = True
 except ImportError as e:
     print(f"Warning: batch_runner_v3 not available: {e}")
     BATCH_AVAILABLE = False
 
-@app.post("/api/batch/start")
-async def batch_start(request: Request):
+try:
+    from batch_jobs import JOBS_MODE, OPEN_STATES, get_scheduler, legacy_status
+    JOBS_AVAILABLE = True
+except ImportError as e:
+    print(f"Warning: batch_jobs not available: {e}")
+    JOBS_AVAILABLE = False
+
+def _require_jobs():
+    if not JOBS_AVAILABLE:
+        raise HTTPException(status_code=503, detail="任务队列不可用")
+    return get_scheduler()
+
+def _queue_mode() -> bool:
+    """JOBS_MODE=coordinator：本进程不跑仿真，旧 /api/batch/* 接口转到任务队列，由 worker 执行"""
+    return JOBS_AVAILABLE and JOBS_MODE == "coordinator"
+
+# 旧接口动作 → (调度器方法, 成功状态, 失败提示)
+LEGACY_JOB_ACTIONS = {
+    "pause": ("paused", "没有正在运行的任务"),
+    "resume": ("resumed", "没有暂停的任务"),
+    "cancel": ("cancelled", "没有可取消的任务"),
+}
+
+def _legacy_job_action(domain: str, action: str, **kwargs) -> dict:
+    """coordinator 模式下旧的暂停 / 恢复 / 取消接口：作用于领域最近提交的任务"""
+    scheduler = get_scheduler()
+    status, message = LEGACY_JOB_ACTIONS[action]
+    latest = scheduler.store.latest(domain)
+    try:
+        job = getattr(scheduler, action)(latest["id"], **kwargs) if latest else None
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+    if job is None:
+        return {"status": "error", "message": message}
+    return {"status": status, "job_id": job["id"], "current_task": job["completed"], "completed_tasks": job["completed"]}
+
+# 批量接口在 coordinator 模式下读写 SQLite、内嵌模式下要拿 BatchRunner 的锁，都是阻塞调用：
+# 需要读请求体的两个接口读完后把其余部分交给线程池，其余用普通 def
+@api.post("/api/batch/start")
+async def batch_start(request: Request, domain: Optional[str] = None):
     """启动批量 AI 互博任务"""
     if not BATCH_AVAILABLE:
         return {"status": "error", "message": "批量引擎不可用"}
@@ -411,40 +576,327 @@ async def batch_start(request: Request):
         body = await request.json()
     except:
         body = {}
+    return await run_in_threadpool(_batch_start, body, domain)
+
+def _batch_start(body: dict, domain: Optional[str]) -> dict:
+    # 保险前端沿用 count 字段
+    batch_size = body.get("batch_size", body.get("count", 5))
+    domain = resolve_domain(domain or body.get("domain"))
     
-    batch_size = body.get("batch_size", 5)
-    domain = body.get("domain", "hr")
+    if _queue_mode():
+        scheduler = get_scheduler()
+        latest = scheduler.store.latest(domain)
+        if latest and latest["state"] in OPEN_STATES:
+            return {"status": "error", "message": "任务已在运行中", "job_id": latest["id"]}
+        options = {"branch_turn": body.get("branch_turn"), "branch_k": int(body.get("branch_k", 0) or 0),
+                   "roles": body.get("roles"), "deadlines": body.get("deadlines"), "budget": body.get("budget")}
+        job = scheduler.submit(domain, int(batch_size), 0, options)
+        return {"status": "started", "batch_size": batch_size, "domain": domain, "job_id": job["id"],
+                "roles": options["roles"] or None, "deadlines": options["deadlines"] or None,
+                "budget": options["budget"] or None,
+                "branch_turn": options["branch_turn"],
+                "branch_k": options["branch_k"] if options["branch_turn"] else 0}
     
-    result = batch_runner.start(batch_size, domain)
+    result = get_batch_runner(domain).start(
+        batch_size,
+        branch_turn=body.get("branch_turn"),
+        branch_k=int(body.get("branch_k", 0) or 0),
+        roles=body.get("roles"),
+        deadlines=body.get("deadlines"),
+        budget=body.get("budget")
+    )
     return result
 
-@app.post("/api/batch/pause")
-async def batch_pause():
+@api.post("/api/batch/pause")
+def batch_pause(domain: Optional[str] = None):
     """暂停批量任务"""
     if not BATCH_AVAILABLE:
         return {"status": "error", "message": "批量引擎不可用"}
-    return batch_runner.pause()
+    if _queue_mode():
+        return _legacy_job_action(resolve_domain(domain), "pause")
+    return get_batch_runner(resolve_domain(domain)).pause()
 
-@app.post("/api/batch/resume")
-async def batch_resume():
-    """恢复批量任务"""
+@api.post("/api/batch/resume")
+async def batch_resume(request: Request, domain: Optional[str] = None):
+    """恢复批量任务；body 可带 {budget} 调整预算（因超出预算暂停时需提高预算）"""
     if not BATCH_AVAILABLE:
         return {"status": "error", "message": "批量引擎不可用"}
-    return batch_runner.resume()
+    try:
+        body = await request.json()
+    except:
+        body = {}
+    budget = body.get("budget") if isinstance(body, dict) else None
+    return await run_in_threadpool(_batch_resume, budget, domain)
 
-@app.post("/api/batch/cancel")
-async def batch_cancel():
+def _batch_resume(budget: Optional[dict], domain: Optional[str]) -> dict:
+    if _queue_mode():
+        return _legacy_job_action(resolve_domain(domain), "resume", budget=budget)
+    return get_batch_runner(resolve_domain(domain)).resume(budget=budget)
+
+@api.post("/api/batch/cancel")
+def batch_cancel(domain: Optional[str] = None):
     """取消批量任务"""
     if not BATCH_AVAILABLE:
         return {"status": "error", "message": "批量引擎不可用"}
-    return batch_runner.cancel()
+    if _queue_mode():
+        return _legacy_job_action(resolve_domain(domain), "cancel")
+    return get_batch_runner(resolve_domain(domain)).cancel()
 
-@app.get("/api/batch/status")
-async def batch_status():
+@api.get("/api/batch/status")
+def batch_status(domain: Optional[str] = None):
     """获取批量任务状态"""
     if not BATCH_AVAILABLE:
         return {"status": "error", "message": "批量引擎不可用", "state": "unavailable"}
-    return batch_runner.get_status()
+    if _queue_mode():
+        return legacy_status(get_scheduler().store, resolve_domain(domain))
+    return get_batch_runner(resolve_domain(domain)).get_status()
+
+@api.post("/api/batch/estimate")
+def batch_estimate(body: Dict[str, Any], domain: Optional[str] = None):
+    """
+    开跑前预估：{count, concurrency, max_turns, roles, lengths, samples, budget}
+    → 总 token、费用、墙钟时间（见 simulation_engine/estimator.py）
+    """
+    if not (SIMULATION_AVAILABLE and BATCH_AVAILABLE):
+        raise HTTPException(status_code=503, detail="仿真引擎不可用")
+    domain = resolve_domain(domain or body.get("domain"))
+    try:
+        return estimate_batch(
+            domain,
+            count=int(body.get("count", body.get("batch_size", 5)) or 0),
+            concurrency=int(body.get("concurrency") or min(BATCH_WORKERS, LLM_CONCURRENCY)),
+            max_turns=int(body.get("max_turns") or DEFAULT_MAX_TURNS),
+            roles=body.get("roles"),
+            lengths=body.get("lengths"),
+            samples=int(body.get("samples") or 3),
+            budget=body.get("budget"),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# ==========================================
+# 🗃️ 批量任务队列（持久化、多任务、优先级、多 worker）
+# ==========================================
+# SQLite 读写是阻塞调用，这几个处理函数用普通 def（在线程池里执行）
+@api.post("/api/jobs")
+def jobs_submit(body: Dict[str, Any], domain: Optional[str] = None):
+    """提交批量任务：{count, priority, domain, branch_turn, branch_k, roles, deadlines, budget}"""
+    scheduler = _require_jobs()
+    domain = resolve_domain(domain or body.get("domain"))
+    count = int(body.get("count", body.get("batch_size", 5)) or 0)
+    if count <= 0:
+        raise HTTPException(status_code=400, detail="count 必须大于 0")
+    options = {
+        "branch_turn": body.get("branch_turn"),
+        "branch_k": int(body.get("branch_k", 0) or 0),
+        "roles": body.get("roles"),
+        "deadlines": body.get("deadlines"),
+        "budget": body.get("budget"),
+    }
+    return scheduler.submit(domain, count, int(body.get("priority", 0) or 0), options)
+
+@api.get("/api/jobs")
+def jobs_list(domain: Optional[str] = None, state: Optional[str] = None, limit: int = 50):
+    """任务列表（未结束的在前，按优先级排序）"""
+    scheduler = _require_jobs()
+    domain = resolve_domain(domain) if domain else None
+    return {"jobs": scheduler.store.list(domain, state, max(1, min(limit, 500)))}
+
+@api.get("/api/jobs/stats")
+def jobs_stats(domain: Optional[str] = None, window: int = 3600):
+    """历史吞吐统计（window 秒内的条 / 分钟）"""
+    scheduler = _require_jobs()
+    domain = resolve_domain(domain) if domain else None
+    return scheduler.store.stats(domain, max(60, window))
+
+@api.get("/api/jobs/workers")
+def jobs_workers(domain: Optional[str] = None):
+    """在线 / 最近离线的调度器与 worker（心跳超过一个租约周期视为离线）"""
+    return {"workers": _require_jobs().store.workers()}
+
+@api.get("/api/jobs/{job_id}")
+def jobs_get(job_id: str, domain: Optional[str] = None):
+    """任务详情（含按 Provider 拆分的用量）"""
+    store = _require_jobs().store
+    job = store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"任务不存在: {job_id}")
+    return {**job, "usage": store.usage(job_id)}
+
+@api.post("/api/jobs/{job_id}/cancel")
+def jobs_cancel(job_id: str, domain: Optional[str] = None):
+    return _job_transition(job_id, "cancel", "任务已结束")
+
+@api.post("/api/jobs/{job_id}/pause")
+def jobs_pause(job_id: str, domain: Optional[str] = None):
+    """暂停：不再领取该任务的新仿真，进行中的在下一次 LLM 调用前停住"""
+    return _job_transition(job_id, "pause", "任务不在运行中")
+
+@api.post("/api/jobs/{job_id}/resume")
+def jobs_resume(job_id: str, body: Optional[Dict[str, Any]] = None, domain: Optional[str] = None):
+    """恢复：{budget} 调整预算（因超出预算暂停的任务需提高预算才能恢复）"""
+    return _job_transition(job_id, "resume", "任务未暂停", budget=(body or {}).get("budget"))
+
+def _job_transition(job_id: str, action: str, conflict: str, **kwargs) -> dict:
+    scheduler = _require_jobs()
+    try:
+        job = getattr(scheduler, action)(job_id, **kwargs)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if job is None:
+        if scheduler.store.get(job_id) is None:
+            raise HTTPException(status_code=404, detail=f"任务不存在: {job_id}")
+        raise HTTPException(status_code=409, detail=conflict)
+    return job
+
+# ==========================================
+# 🪦 死信队列（重试耗尽的失败仿真）
+# ==========================================
+@api.get("/api/dead-letters")
+def dead_letters_list(domain: Optional[str] = None, error_class: Optional[str] = None,
+                      state: str = "dead", limit: int = 100):
+    """死信列表 + 按状态 / 错误分类计数"""
+    store = get_dead_letters()
+    domain = resolve_domain(domain) if domain else None
+    return {"items": store.list(domain, error_class, state or None, max(1, min(limit, 1000))),
+            "counts": store.counts(domain)}
+
+@api.post("/api/dead-letters/replay")
+def dead_letters_replay(body: Dict[str, Any], domain: Optional[str] = None):
+    """
+    批量重放：{ids} 或按 {error_class, limit} 筛选，按原秘密任务重新提交到任务队列
+    （带检查点的死信从中断的节点续跑，已完成的对话轮次不重新生成）
+
+    同一领域、同一分支 / 角色选项的死信合并成一个任务
+    """
+    scheduler = _require_jobs()
+    store = get_dead_letters()
+    domain = resolve_domain(domain or body["domain"]) if (domain or body.get("domain")) else None
+    letters = store.list(domain, body.get("error_class"), "dead", max(1, min(int(body.get("limit", 100)), 1000)),
+                         ids=body.get("ids"))
+    groups: Dict[tuple, list] = {}
+    for letter in letters:
+        key = (letter["domain"], json.dumps(letter["options"], sort_keys=True, ensure_ascii=False))
+        groups.setdefault(key, []).append(letter)
+    jobs = []
+    for (letter_domain, _), group in groups.items():
+        job = scheduler.submit(letter_domain, len(group), int(body.get("priority", 0) or 0), group[0]["options"],
+                               payloads=[{"mission": letter["mission"], "checkpoint": letter["checkpoint"],
+                                          "dead_letter_id": letter["id"]}
+                                         for letter in group])
+        store.mark([letter["id"] for letter in group], "replayed", replay_job_id=job["id"])
+        jobs.append(job)
+    return {"replayed": len(letters), "jobs": jobs}
+
+@api.post("/api/dead-letters/discard")
+def dead_letters_discard(body: Dict[str, Any], domain: Optional[str] = None):
+    """人工丢弃：{ids}"""
+    return {"discarded": get_dead_letters().mark(body.get("ids") or [], "discarded")}
+
+
+# ==========================================
+# 📡 实时事件推送（替代轮询）
+# ==========================================
+@api.websocket("/ws/events")
+async def events_ws(websocket: WebSocket, domain: Optional[str] = None,
+                    topics: Optional[str] = None, interval: float = 0):
+    """
+    订阅事件推送：batch.* / ingest.record / inbox.* / coverage.delta（见 simulation_engine/events.py）
+
+    topics: 逗号分隔的主题或前缀，如 "batch,coverage"；默认全部
+    interval: 客户端希望的最小推送间隔（秒），不低于服务端 EVENTS_MIN_INTERVAL
+    连接建立后先推一次所订阅领域的 batch.status 快照
+    """
+    try:
+        domains = [resolve_domain(domain)] if domain else []
+    except HTTPException:
+        await websocket.close(code=4404)
+        return
+    await websocket.accept()
+    subscriber = EVENT_BUS.subscribe(domains, [t.strip() for t in (topics or "").split(",") if t.strip()],
+                                     interval)
+
+    if BATCH_AVAILABLE and subscriber.wants("batch.status", None):
+        for runner_domain in domains or list(load_domains()):
+            if _queue_mode():
+                publish("batch.status", runner_domain, legacy_status(get_scheduler().store, runner_domain))
+            else:
+                get_batch_runner(runner_domain).publish_status()
+
+    # 客户端只发心跳 / 关闭帧：单独读，读到断开就结束推送
+    receiver = asyncio.ensure_future(_drain_websocket(websocket))
+    try:
+        while not receiver.done():
+            sender = asyncio.ensure_future(subscriber.next_batch())
+            await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if not sender.done():
+                sender.cancel()
+                break
+            events = sender.result()
+            if events:
+                await websocket.send_json({"events": events})
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        receiver.cancel()
+        EVENT_BUS.unsubscribe(subscriber)
+
+
+async def _drain_websocket(websocket: WebSocket):
+    try:
+        while True:
+            await websocket.receive_text()
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+
+
+app.include_router(api)
+app.include_router(api, prefix="/{domain}")
+
+# ==========================================
+# 🗂️ 领域注册表 / 健康检查
+# ==========================================
+@app.get("/api/domains")
+async def list_domains():
+    """domains.yaml 中已启用、由本进程提供服务的领域"""
+    return {"default": DEFAULT_DOMAIN, "domains": domains_summary()}
+
+@app.get("/")
+@app.get("/health")
+async def health_check():
+    return {"status": "healthy", "service": "密心 API", "domains": [d["id"] for d in domains_summary()]}
+
+# ==========================================
+# 📈 Prometheus 指标
+# ==========================================
+@app.get("/metrics")
+async def metrics():
+    """Prometheus 文本格式的进程内指标"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.on_event("startup")
+async def start_job_scheduler():
+    """启动任务队列调度器（上次未完成的任务继续执行）"""
+    if JOBS_AVAILABLE:
+        get_scheduler()
+
+@app.on_event("shutdown")
+async def close_llm_http_pool():
+    """取消各领域的批量任务，停止任务队列调度器，关闭共享的 LLM HTTP 连接池"""
+    if BATCH_AVAILABLE:
+        for runner in all_batch_runners().values():
+            if runner.state.value in ("running", "paused"):
+                runner.cancel()
+    if JOBS_AVAILABLE:
+        get_scheduler(start=False).stop()
+    from simulation_engine.http_pool import aclose_clients
+    await aclose_clients()
+
+@app.get("/api/llm/providers")
+async def llm_providers():
+    """各 LLM Provider 的实时路由统计（p50/p95 延迟、错误率、剩余配额、熔断状态）"""
+    from simulation_engine.router import providers_snapshot
+    return {"providers": providers_snapshot()}
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,223 @@
+"""
+🛑 Cancellation - 协作式取消 / 暂停令牌
+=======================================
+核心职责：
+1. CancelToken：一个批量任务（BatchRunner）一个令牌，cancel() / pause() / resume() 可在任意线程调用
+2. current_token：仿真线程里的当前令牌（ContextVar，随 LangGraph 节点、chain.batch、路由线程池一起传递）
+3. checkpoint()：LLM 调用前、工作流节点之间调用：暂停时阻塞到恢复，已取消时抛 SimulationCancelled
+4. watch()：等待 LLM 响应的线程登记一个 Event，取消时立即唤醒它（LLMRouter 放弃这次请求，不再等响应）
+   child()：单条仿真的子令牌，跟随父令牌暂停 / 恢复 / 取消，也可以单独取消（任务队列的租约被回收时）
+5. ConcurrencySlot：一次仿真占用的全局 LLM 并发名额（current_slot），暂停 / 重试退避期间让出，
+   继续之前重新领取，暂停或超预算的任务不会把其他任务饿死
+
+生效时机：
+- 取消：正在等待的 LLM 请求立即放弃，仿真从当前节点中断，部分对话随检查点写入死信队列（可续跑）
+- 暂停：正在进行的 LLM 请求照常完成（最多一个请求超时），下一次 LLM 调用前停住，恢复后原地继续；
+  暂停的时长记在 paused_seconds 里，deadlines.py 的截止时间不计这段时间
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Set
+
+
+class SimulationCancelled(Exception):
+    """仿真被取消（reason: cancelled / shutdown）"""
+
+    def __init__(self, reason: str = "cancelled"):
+        super().__init__(f"仿真已取消 ({reason})")
+        self.reason = reason
+
+
+class CancelToken:
+    def __init__(self):
+        self.reason: Optional[str] = None
+        self._cancelled = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+        self._watchers: Set[threading.Event] = set()
+        self._paused_total = 0.0
+        self._paused_since: Optional[float] = None
+        self._children: Set["CancelToken"] = set()
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    @property
+    def paused(self) -> bool:
+        return not self._running.is_set()
+
+    @property
+    def paused_seconds(self) -> float:
+        """累计暂停时长（含正在进行的这次暂停）"""
+        with self._lock:
+            current = time.monotonic() - self._paused_since if self._paused_since is not None else 0.0
+            return self._paused_total + current
+
+    def _unpause(self):
+        # 调用方持有 self._lock
+        if self._paused_since is not None:
+            self._paused_total += time.monotonic() - self._paused_since
+            self._paused_since = None
+        self._running.set()
+
+    def cancel(self, reason: str = "cancelled"):
+        with self._lock:
+            if self.reason is None:
+                self.reason = reason
+            self._cancelled.set()
+            self._unpause()  # 暂停中的仿真也要醒来退出
+            watchers = list(self._watchers)
+            for child in self._children:
+                child.cancel(reason)
+        for event in watchers:
+            event.set()
+
+    def pause(self):
+        with self._lock:
+            if not self.cancelled and self._paused_since is None:
+                self._paused_since = time.monotonic()
+                self._running.clear()
+            for child in self._children:
+                child.pause()
+
+    def resume(self):
+        with self._lock:
+            self._unpause()
+            for child in self._children:
+                child.resume()
+
+    def child(self) -> "CancelToken":
+        """子令牌：创建时继承当前的暂停 / 取消状态，之后跟随本令牌；用完调用 release(child)"""
+        child = CancelToken()
+        with self._lock:
+            # 持有父令牌的锁操作子令牌（子令牌从不反过来拿父令牌的锁）
+            if self.cancelled:
+                child.cancel(self.reason or "cancelled")
+            elif self._paused_since is not None:
+                child.pause()
+            self._children.add(child)
+        return child
+
+    def release(self, child: "CancelToken"):
+        with self._lock:
+            self._children.discard(child)
+
+    def wait_while_paused(self) -> bool:
+        """暂停时阻塞到恢复（或被取消），期间让出并发名额；返回是否还可以继续"""
+        if not self._running.is_set():
+            with yielding_slot():
+                self._running.wait()
+        return not self.cancelled
+
+    def sleep(self, seconds: float) -> bool:
+        """可被取消打断的 sleep（期间让出并发名额）；返回是否已取消"""
+        with yielding_slot():
+            return self._cancelled.wait(seconds)
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise SimulationCancelled(self.reason or "cancelled")
+
+    def checkpoint(self):
+        """暂停时阻塞到恢复；已取消时抛 SimulationCancelled"""
+        self.wait_while_paused()
+        self.raise_if_cancelled()
+
+    @contextmanager
+    def watch(self, event: threading.Event):
+        """登记一个等待中的 Event：取消时被 set（登记时已取消则立即 set）"""
+        with self._lock:
+            self._watchers.add(event)
+            if self.cancelled:
+                event.set()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._watchers.discard(event)
+
+
+current_token: ContextVar[Optional[CancelToken]] = ContextVar("cancel_token", default=None)
+
+
+# =======================================================
+# 🎟️ 并发名额
+# =======================================================
+class ConcurrencySlot:
+    """
+    一次仿真占用的一个并发名额（semaphore 为全局 LLM_BUDGET 之类的信号量）
+
+    with slot: 领取名额并设为 current_slot，结束时归还；acquired=True 表示调用方已经领过（任务队列先领名额再领任务）。
+    仿真的多个线程（分支、对冲、路由线程池）共用一个 slot：有线程在等待时让出，最后一个等待者醒来后重新领取
+    """
+
+    def __init__(self, semaphore: threading.Semaphore, acquired: bool = False):
+        self._semaphore = semaphore
+        self._held = acquired
+        self._waiters = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        self._reset = None
+
+    def __enter__(self):
+        if not self._held:
+            self._semaphore.acquire()
+            self._held = True
+        self._reset = current_slot.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        current_slot.reset(self._reset)
+        with self._lock:
+            held, self._held, self._closed = self._held, False, True
+        if held:
+            self._semaphore.release()
+
+    @contextmanager
+    def yielded(self):
+        with self._lock:
+            self._waiters += 1
+            release, self._held = self._held, False
+        if release:
+            self._semaphore.release()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._waiters -= 1
+                # 仿真已结束（被放弃的路由线程晚醒）时不再领取，否则名额永远还不回去
+                reacquire = not self._waiters and not self._held and not self._closed
+            if reacquire:
+                self._semaphore.acquire()
+                with self._lock:
+                    # 领取期间别的线程已经领回 / 又开始等待：多出来的名额还回去
+                    extra = self._held or self._waiters > 0 or self._closed
+                    self._held = self._held or not extra
+                if extra:
+                    self._semaphore.release()
+
+
+current_slot: ContextVar[Optional[ConcurrencySlot]] = ContextVar("concurrency_slot", default=None)
+
+
+@contextmanager
+def yielding_slot():
+    """阻塞等待期间让出当前线程所属仿真的并发名额（没有名额时什么都不做）"""
+    slot = current_slot.get()
+    if slot is None:
+        yield
+    else:
+        with slot.yielded():
+            yield
+
+
+def checkpoint():
+    """当前线程的令牌检查点（没有令牌时什么都不做）"""
+    token = current_token.get()
+    if token is not None:
+        token.checkpoint()
@@ -4,115 +4,66 @@
 核心公式: 覆盖率 = 已覆盖知识节点数 / 预估真实世界知识节点总数 × 100%
 
 预估总数计算方式:
-- 角色设定 × 场景类别 × 场景模板 × 情绪修饰 × 紧急程度
-- 各维度数量可动态配置和更新
+- 领域规格（domain_specs/<domain>.yaml）coverage.dimensions 中各维度数量连乘
+- multiply: false 的维度只做展示，不参与连乘
+- 维度数量在规格编译时算好（count / items / from: services 等），可动态更新
 
-维度说明:
-1. 角色设定 (Personas): 创业老板、HR经理、普通员工、部门主管、应届毕业生等
-2. 场景类别 (Categories): 招聘、劳动关系、薪酬福利、组织发展
-3. 场景模板 (Templates): 每个类别下的具体场景描述
-4. 情绪修饰 (Emotions): 头疼、愁死了、急死了、气死了等
-5. 紧急程度 (Urgency): 很急、下周解决、越快越好等
+以 HR 为例: 角色设定 × 场景模板 × 情绪修饰 × 紧急程度（场景类别只展示）
+以保险为例: 服务数 × 行业 × 公司规模 × 角色 × 紧急度
 """
 
-import json
+import copy
+from math import prod
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional
 from datetime import datetime
 
+from .domain_spec import CompiledSpec, short_name
+
 
 class CoverageCalculator:
-    """知识库覆盖率计算器"""
+    """知识库覆盖率计算器（维度来自领域规格）"""
     
-    def __init__(self, domain: str = "hr"):
+    def __init__(self, domain: str = "hr", db_path: Optional[Path] = None,
+                 manager=None):
+        from .domain_manager import DomainManager
+        
         self.domain = domain
-        self.db_path = Path(__file__).resolve().parent.parent / "domain_db" / f"{domain}.json"
+        self.manager = manager or DomainManager(domain, db_path=db_path)
+        self.db_path = self.manager.db_path
+        self.spec: CompiledSpec = self.manager.spec
         
-        # ===========================================
-        # 📊 维度配置（可根据业务需求动态更新）
-        # ===========================================
-        self.dimension_config = {
-            "personas": {
-                "name": "角色设定",
-                "count": 8,
-                "items": ["创业老板", "HR经理", "普通员工", "部门主管", "应届毕业生", "资深员工", "外企高管", "初创团队负责人"],
-                "description": "不同身份背景的用户"
-            },
-            "categories": {
-                "name": "场景类别",
-                "count": 4,
-                "items": ["招聘与人才获取", "劳动关系与合规", "薪酬福利与税务", "组织发展与培训"],
-                "description": "HR服务的四大核心领域"
-            },
-            "templates": {
-                "name": "场景模板",
-                "count_per_category": 8,  # 平均每类 8 个模板
-                "total": 30,  # 总计 30+ 个模板
-                "description": "每类 6-10 个真实场景"
-            },
-            "emotions": {
-                "name": "情绪修饰",
-                "count": 12,
-                "items": ["头疼", "愁死了", "不知道怎么办", "急死了", "气死我了", "拖不得", 
-                        "听说会很麻烦", "害怕出问题", "完全不懂", "之前吃过亏", "朋友被坑过", "无情绪"],
-                "description": "用户的情绪状态"
-            },
-            "urgency": {
-                "name": "紧急程度",
-                "count": 6,
-                "items": ["很急", "下周要解决", "越快越好", "已经拖了很久", "马上要出问题", "不紧急"],
-                "description": "问题的紧迫性"
-            }
-        }
+        # 📊 维度配置：拷贝一份，update_dimension 不影响共享的编译结果
+        self.dimension_config = copy.deepcopy(self.spec.dimension_config)
     
     def get_estimated_total(self) -> int:
         """
         计算预估的真实世界知识节点总数
         
-        公式: 角色 × 类别 × 模板 × 情绪 × 紧急程度
+        公式: 所有参与连乘的维度数量之积
         
         注意: 这个数字代表理论上可能存在的所有场景组合
         """
-        personas = self.dimension_config["personas"]["count"]
-        categories = self.dimension_config["categories"]["count"]
-        templates = self.dimension_config["templates"]["total"]
-        emotions = self.dimension_config["emotions"]["count"]
-        urgency = self.dimension_config["urgency"]["count"]
-        
-        # 计算总组合数
-        total = personas * templates * emotions * urgency
-        
-        return total
+        counts = [d["count"] for d in self.dimension_config.values() if d.get("multiply", True)]
+        return prod(counts) if counts else 0
     
     def get_covered_count(self) -> int:
         """
         计算已覆盖的知识节点数
         
-        统计方式: 遍历知识库中所有 trace_records，计算去重后的记录数
+        统计方式（规格 coverage.covered）:
+        - unique: 遍历所有 trace_records，按 query + ai_prediction 去重
+        - traces: 所有服务的追踪记录条数
         """
-        if not self.db_path.exists():
-            return 0
-        
-        try:
-            with open(self.db_path, 'r', encoding='utf-8') as f:
-                db = json.load(f)
-            
-            # 使用集合去重（基于 query + ai_prediction）
-            unique_records = set()
-            
-            for category in db.get("taxonomy", []):
-                trace_records = category.get("trace_records", {})
-                for service, records in trace_records.items():
-                    for record in records:
-                        # 生成去重键
-                        key = f"{record.get('query', '')}|{record.get('ai_prediction', '')}"
-                        unique_records.add(key)
-            
-            return len(unique_records)
-            
-        except Exception as e:
-            print(f"❌ 读取知识库失败: {e}")
-            return 0
+        if self.spec.covered_mode == "traces":
+            return sum(s["trace_count"] for c in self._category_stats() for s in c["services"])
+        
+        unique_records = set()
+        for category in self.manager.domain_db.get("taxonomy", []):
+            for records in category.get("trace_records", {}).values():
+                for record in records:
+                    unique_records.add(f"{record.get('query', '')}|{record.get('ai_prediction', '')}")
+        return len(unique_records)
     
     def get_coverage_rate(self) -> float:
         """
@@ -120,14 +71,10 @@ class CoverageCalculator:
         
         返回值: 0.0 ~ 100.0 的浮点数
         """
-        covered = self.get_covered_count()
         total = self.get_estimated_total()
-        
         if total == 0:
             return 0.0
-        
-        rate = (covered / total) * 100
-        return round(rate, 2)
+        return round(self.get_covered_count() / total * 100, 2)
     
     def get_full_stats(self) -> Dict:
         """
@@ -139,7 +86,8 @@ class CoverageCalculator:
             "covered_count": 64,
             "estimated_total": 17280,
             "dimensions": {...},
-            "formula_explanation": "...",
+            "formula": {...},
+            "categories": [...],
             "last_updated": "..."
         }
         """
@@ -151,15 +99,22 @@ class CoverageCalculator:
         dimensions = {}
         for key, config in self.dimension_config.items():
             dimensions[key] = {
-                "name": config["name"],
-                "count": config.get("count", config.get("total", 0)),
-                "description": config["description"]
+                "name": config.get("name", key),
+                "count": config["count"],
+                "description": config.get("description", "")
             }
             if "items" in config:
                 dimensions[key]["items"] = config["items"]
         
         # 服务节点统计
-        service_stats = self._get_service_stats()
+        categories = self._category_stats()
+        total_services = sum(len(c["services"]) for c in categories)
+        covered_services = sum(1 for c in categories for s in c["services"] if s["trace_count"])
+        
+        factors = " × ".join(
+            f"{d['count']} ({d.get('label', d.get('name', key))})"
+            for key, d in self.dimension_config.items() if d.get("multiply", True)
+        )
         
         return {
             # 核心指标
@@ -168,9 +123,9 @@ class CoverageCalculator:
             "estimated_total": total,
             
             # 服务节点
-            "service_node_count": service_stats["total_services"],
-            "covered_service_count": service_stats["covered_services"],
-            "service_coverage_rate": service_stats["service_coverage_rate"],
+            "service_node_count": total_services,
+            "covered_service_count": covered_services,
+            "service_coverage_rate": round(covered_services / total_services * 100, 2) if total_services else 0,
             
             # 维度详情
             "dimensions": dimensions,
@@ -178,48 +133,32 @@ class CoverageCalculator:
             # 计算公式说明
             "formula": {
                 "expression": "覆盖率 = 已覆盖知识节点数 ÷ 预估真实世界知识节点总数 × 100%",
-                "estimated_total_formula": f"{self.dimension_config['personas']['count']} (角色) × {self.dimension_config['templates']['total']} (模板) × {self.dimension_config['emotions']['count']} (情绪) × {self.dimension_config['urgency']['count']} (紧急程度) = {total}",
-                "note": "预估总数代表理论上可能存在的所有场景组合"
+                "estimated_total_formula": f"{factors} = {total}",
+                "note": self.spec.coverage_note or "预估总数代表理论上可能存在的所有场景组合"
             },
             
+            # 分类明细
+            "categories": categories,
+            
             # 元信息
             "domain": self.domain,
             "last_updated": datetime.now().isoformat()
         }
     
-    def _get_service_stats(self) -> Dict:
-        """获取服务节点统计"""
-        if not self.db_path.exists():
-            return {"total_services": 0, "covered_services": 0, "service_coverage_rate": 0}
-        
-        try:
-            with open(self.db_path, 'r', encoding='utf-8') as f:
-                db = json.load(f)
-            
-            total_services = 0
-            covered_services = 0
-            
-            for category in db.get("taxonomy", []):
-                services = category.get("services", [])
-                trace_records = category.get("trace_records", {})
-                
-                total_services += len(services)
-                
-                # 统计有记录的服务
-                for service in services:
-                    if service in trace_records and trace_records[service]:
-                        covered_services += 1
-            
-            rate = (covered_services / total_services * 100) if total_services > 0 else 0
-            
-            return {
-                "total_services": total_services,
-                "covered_services": covered_services,
-                "service_coverage_rate": round(rate, 2)
-            }
-            
-        except Exception as e:
-            return {"total_services": 0, "covered_services": 0, "service_coverage_rate": 0}
+    def _category_stats(self) -> List[dict]:
+        """各分类下每个服务的追踪记录数（兼容以服务全名或简称为 key 的 trace_records）"""
+        stats = []
+        for category in self.manager.domain_db.get("taxonomy", []):
+            trace_records = category.get("trace_records", {})
+            stats.append({
+                "name": category.get("name", ""),
+                "services": [
+                    {"name": service,
+                     "trace_count": len(trace_records.get(service) or trace_records.get(short_name(service)) or [])}
+                    for service in category.get("services", [])
+                ]
+            })
+        return stats
     
     def update_dimension(self, dimension: str, count: int = None, items: List[str] = None):
         """
@@ -240,8 +179,10 @@ class CoverageCalculator:
 
 # API 接口函数
 def get_coverage_stats(domain: str = "hr") -> Dict:
-    """获取覆盖率统计（供 API 调用）"""
-    calculator = CoverageCalculator(domain)
+    """获取覆盖率统计（供 API 调用），复用注册表中缓存的 DomainManager（知识库 + 编译好的规格）"""
+    from .domain_registry import get_domain_manager
+    
+    calculator = CoverageCalculator(domain, manager=get_domain_manager(domain))
     return calculator.get_full_stats()
 
 
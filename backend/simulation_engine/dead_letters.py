@@ -0,0 +1,155 @@
+"""
+🪦 Dead Letters - 失败仿真的死信队列（SQLite 持久化）
+=====================================================
+核心职责：
+1. 重试耗尽 / 不可重试 / 被取消的仿真写入死信：错误分类、失败节点、尝试次数、秘密任务、分支 / 角色选项，
+   以及中断时的检查点（已完成的对话轮次）
+2. 按领域、错误分类、状态查询和计数（/api/dead-letters）
+3. 批量重放：把选中的死信按原秘密任务 + 检查点重新提交到任务队列（batch_jobs），从中断的节点续跑，并标记 replayed
+
+死信状态：dead（待处理）→ replayed（已重新提交）/ discarded（人工丢弃）
+
+API（main.py）：
+  GET  /api/dead-letters          - 列表 + 计数（?error_class=&state=&limit=）
+  POST /api/dead-letters/replay   - 批量重放 {ids} 或 {error_class, limit, priority}
+  POST /api/dead-letters/discard  - 丢弃 {ids}
+
+环境变量：
+- DEAD_LETTER_DB  SQLite 路径（默认 STATE_DIR/dead_letters.sqlite3）
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+from .domain_registry import STATE_DIR
+
+DEAD_LETTER_DB = Path(os.getenv("DEAD_LETTER_DB", str(STATE_DIR / "dead_letters.sqlite3")))
+
+DEAD, REPLAYED, DISCARDED = "dead", "replayed", "discarded"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dead_letters (
+    id            TEXT PRIMARY KEY,
+    domain        TEXT NOT NULL,
+    error_class   TEXT NOT NULL,
+    error         TEXT,
+    node          TEXT,
+    attempts      INTEGER NOT NULL DEFAULT 1,
+    mission       TEXT,
+    options       TEXT NOT NULL DEFAULT '{}',
+    job_id        TEXT,
+    task_index    INTEGER,
+    state         TEXT NOT NULL DEFAULT 'dead',
+    created_at    REAL NOT NULL,
+    replayed_at   REAL,
+    replay_job_id TEXT,
+    checkpoint    TEXT
+);
+CREATE INDEX IF NOT EXISTS dead_letters_by_state ON dead_letters (state, domain, error_class);
+"""
+
+# 旧库补列
+MIGRATIONS = {"checkpoint": "ALTER TABLE dead_letters ADD COLUMN checkpoint TEXT"}
+
+
+class DeadLetterStore:
+    """dead_letters 表的读写（线程安全，多进程共享同一文件）"""
+
+    def __init__(self, path: Path = DEAD_LETTER_DB):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=30000")
+        self._conn.executescript(SCHEMA)
+        columns = {r["name"] for r in self._conn.execute("PRAGMA table_info(dead_letters)")}
+        for column, statement in MIGRATIONS.items():
+            if column not in columns:
+                self._conn.execute(statement)
+
+    def add(self, domain: str, error_class: str, error: str, attempts: int = 1, node: Optional[str] = None,
+            mission: Optional[dict] = None, options: Optional[dict] = None, job_id: Optional[str] = None,
+            task_index: Optional[int] = None, checkpoint: Optional[dict] = None) -> str:
+        letter_id = f"dl_{uuid.uuid4().hex[:10]}"
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO dead_letters (id, domain, error_class, error, node, attempts, mission, options, "
+                "job_id, task_index, created_at, checkpoint) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (letter_id, domain, error_class, (error or "")[:2000], node, attempts,
+                 json.dumps(mission, ensure_ascii=False) if mission else None,
+                 json.dumps(options or {}, ensure_ascii=False), job_id, task_index, time.time(),
+                 json.dumps(checkpoint, ensure_ascii=False) if checkpoint else None),
+            )
+        return letter_id
+
+    def _where(self, domain: Optional[str], error_class: Optional[str], state: Optional[str],
+               ids: Optional[Iterable[str]] = None) -> tuple:
+        clauses, params = [], []
+        for column, value in (("domain", domain), ("error_class", error_class), ("state", state)):
+            if value:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if ids is not None:
+            ids = list(ids)
+            clauses.append(f"id IN ({', '.join('?' for _ in ids) or 'NULL'})")
+            params.extend(ids)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def list(self, domain: Optional[str] = None, error_class: Optional[str] = None, state: Optional[str] = DEAD,
+             limit: int = 100, ids: Optional[Iterable[str]] = None) -> List[dict]:
+        where, params = self._where(domain, error_class, state, ids)
+        with self._lock:
+            rows = self._conn.execute(f"SELECT * FROM dead_letters{where} ORDER BY created_at DESC LIMIT ?",
+                                      (*params, limit)).fetchall()
+        return [_letter(r) for r in rows]
+
+    def counts(self, domain: Optional[str] = None) -> dict:
+        """{状态: {错误分类: 条数}}"""
+        where, params = self._where(domain, None, None)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT state, error_class, COUNT(*) AS n FROM dead_letters{where} GROUP BY state, error_class",
+                params).fetchall()
+        counts: dict = {}
+        for r in rows:
+            counts.setdefault(r["state"], {})[r["error_class"]] = r["n"]
+        return counts
+
+    def mark(self, ids: Iterable[str], state: str, replay_job_id: Optional[str] = None) -> int:
+        ids = list(ids)
+        if not ids:
+            return 0
+        with self._lock:
+            return self._conn.execute(
+                f"UPDATE dead_letters SET state = ?, replayed_at = ?, replay_job_id = ? "
+                f"WHERE state = ? AND id IN ({', '.join('?' for _ in ids)})",
+                (state, time.time() if state == REPLAYED else None, replay_job_id, DEAD, *ids),
+            ).rowcount
+
+
+def _letter(row: sqlite3.Row) -> dict:
+    letter = dict(row)
+    letter["mission"] = json.loads(row["mission"]) if row["mission"] else None
+    letter["options"] = json.loads(row["options"] or "{}")
+    letter["checkpoint"] = json.loads(row["checkpoint"]) if row["checkpoint"] else None
+    return letter
+
+
+_store: Optional[DeadLetterStore] = None
+_store_lock = threading.Lock()
+
+
+def get_dead_letters() -> DeadLetterStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = DeadLetterStore()
+        return _store
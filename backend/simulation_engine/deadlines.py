@@ -0,0 +1,167 @@
+"""
+⏱️ Deadlines - LLM 调用 / 图节点 / 整场仿真三级超时
+===================================================
+核心职责：
+1. 三级截止时间随 ContextVar 向下传递（LangGraph 节点、chain.batch、路由线程池都会带上）：
+   - simulation  整场仿真（BatchRunner / 任务队列 / 逐步仿真接口设置）
+   - node        单个图节点（node_deadline 装饰器设置，含节点内的全部 LLM 调用）
+   - call        单次 LLM 请求（按 Provider 配置）
+2. call_timeout()：本次请求可用的秒数 = min(Provider 单次超时, 节点剩余, 仿真剩余)；
+   外层截止时间已过时直接抛 DeadlineExceeded，不再发起请求
+3. 单次请求超时由 LLMRouter 切换到下一个 Provider（现有故障切换链）；节点 / 仿真超时不再切换，
+   交给 BatchRunner 按 timeout 分类处理
+4. 超时计数：meseeing_deadline_exceeded_total{scope, node, provider}
+5. 暂停不计时：线程带取消令牌（cancellation.current_token）时按令牌的"运行时间"计时，
+   手动暂停 / 超出预算暂停的时长不算进任何一级截止时间
+
+配置（环境变量，单位秒，0 表示不限）：
+- LLM_CALL_TIMEOUT           单次 LLM 请求（默认 60）
+- <PROVIDER>_TIMEOUT         按 Provider 覆盖单次请求超时（如 GLM_TIMEOUT=45、LOCAL_TIMEOUT=120）
+- LLM_NODE_TIMEOUT           单个图节点（默认 180）
+- LLM_NODE_TIMEOUT_<NODE>    按节点覆盖（如 LLM_NODE_TIMEOUT_BRANCH=300）
+- SIMULATION_TIMEOUT         整场仿真（默认 900）
+
+API 请求 / 批量任务可以用 {"deadlines": {"call": 30, "node": 120, "simulation": 600}} 逐次覆盖
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Dict, Optional, Tuple, TypedDict
+
+from .cancellation import current_token
+from .metrics import REGISTRY
+
+SCOPES = ("call", "node", "simulation")
+
+DEADLINE_EXCEEDED = REGISTRY.counter(
+    "meseeing_deadline_exceeded_total", "超过截止时间的次数", ["scope", "node", "provider"])
+
+
+class DeadlineOverrides(TypedDict, total=False):
+    """API 请求 / 批量任务传入的超时覆盖（秒）"""
+    call: float
+    node: float
+    simulation: float
+
+
+class DeadlineExceeded(TimeoutError):
+    """超过截止时间（scope: call / node / simulation）；按 TimeoutError 归入 timeout 错误分类"""
+
+    def __init__(self, scope: str, seconds: Optional[float] = None):
+        detail = f" ({seconds:.1f}s)" if seconds else ""
+        super().__init__(f"{scope} deadline exceeded{detail}")
+        self.scope = scope
+        self.seconds = seconds
+
+
+def _seconds(name: str, default: Optional[str] = None) -> Optional[float]:
+    value = os.getenv(name, default)
+    if value is None or value == "":
+        return None
+    value = float(value)
+    return value if value > 0 else None
+
+
+# 当前的截止时间（_clock() 时间点）与覆盖配置
+_deadlines: ContextVar[Dict[str, float]] = ContextVar("deadlines", default={})
+_overrides: ContextVar[DeadlineOverrides] = ContextVar("deadline_overrides", default={})
+
+
+def _clock() -> float:
+    """截止时间用的时钟：monotonic 减去当前令牌的累计暂停时长"""
+    token = current_token.get()
+    return time.monotonic() - (token.paused_seconds if token is not None else 0.0)
+
+
+def provider_timeout(provider: str) -> Optional[float]:
+    """单次 LLM 请求超时：请求覆盖 > <PROVIDER>_TIMEOUT > LLM_CALL_TIMEOUT"""
+    override = _overrides.get().get("call")
+    if override:
+        return float(override)
+    return _seconds(f"{provider.upper()}_TIMEOUT") or _seconds("LLM_CALL_TIMEOUT", "60")
+
+
+def node_timeout(node: str) -> Optional[float]:
+    override = _overrides.get().get("node")
+    if override:
+        return float(override)
+    return _seconds(f"LLM_NODE_TIMEOUT_{node.upper()}") or _seconds("LLM_NODE_TIMEOUT", "180")
+
+
+def simulation_timeout() -> Optional[float]:
+    override = _overrides.get().get("simulation")
+    if override:
+        return float(override)
+    return _seconds("SIMULATION_TIMEOUT", "900")
+
+
+def remaining(scope: str) -> Optional[float]:
+    """某一级截止时间的剩余秒数（未设置返回 None，已过期返回 <= 0）"""
+    deadline = _deadlines.get().get(scope)
+    return None if deadline is None else deadline - _clock()
+
+
+def expired(scope: str) -> bool:
+    left = remaining(scope)
+    return left is not None and left <= 0
+
+
+@contextmanager
+def deadline_scope(scope: str, seconds: Optional[float]):
+    """在 with 块内设置一级截止时间（已有更早的同级截止时间时保留更早的）"""
+    if not seconds:
+        yield
+        return
+    current = _deadlines.get()
+    deadline = _clock() + seconds
+    if current.get(scope) is not None:
+        deadline = min(deadline, current[scope])
+    reset = _deadlines.set({**current, scope: deadline})
+    try:
+        yield
+    finally:
+        _deadlines.reset(reset)
+
+
+@contextmanager
+def simulation_deadline(overrides: Optional[DeadlineOverrides] = None):
+    """整场仿真：应用覆盖配置并设置 simulation 截止时间"""
+    reset = _overrides.set({k: v for k, v in (overrides or {}).items() if k in SCOPES and v})
+    try:
+        with deadline_scope("simulation", simulation_timeout()):
+            yield
+    finally:
+        _overrides.reset(reset)
+
+
+def node_deadline(node: str):
+    """图节点装饰器：节点内全部 LLM 调用共享一个节点截止时间"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with deadline_scope("node", node_timeout(node)):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def call_timeout(provider: str, node: str = "") -> Tuple[Optional[float], str]:
+    """
+    本次请求可等待的秒数，以及约束它的那一级（call / node / simulation）
+
+    外层截止时间已过时计数并抛 DeadlineExceeded
+    """
+    timeout, scope = provider_timeout(provider), "call"
+    for outer in ("node", "simulation"):
+        left = remaining(outer)
+        if left is None:
+            continue
+        if left <= 0:
+            DEADLINE_EXCEEDED.inc(scope=outer, node=node, provider=provider)
+            raise DeadlineExceeded(outer)
+        if timeout is None or left < timeout:
+            timeout, scope = left, outer
+    return timeout, scope
@@ -0,0 +1,293 @@
+"""
+🗂️ Domain Registry - 多领域注册表（domains.yaml 驱动）
+=====================================================
+核心职责：
+1. 读取根目录 domains.yaml，status 为 active 的领域由同一个后端进程提供服务
+2. 每个领域的差异只在配置里：知识库文件、领域规格（场景 / 覆盖率维度，见 domain_spec.py）、Prompt 模块
+3. 进程内共享缓存：DomainManager / Prompt / 编译好的工作流按领域缓存，知识库文件变化时自动重新加载
+4. 每个共享 JSON 文件一把写锁，保证多个领域并发入库不会互相覆盖：进程内是可重入锁，
+   跨进程（API + 多个批量 worker）再叠加一把 fcntl 文件锁（LOCK_DIR 下的 <name>.lock）
+
+新增领域 = 在 domains.yaml 里加一段配置 + 放一个 domain_db/<id>.json（+ 可选的 domain_specs/<id>.yaml），无需新起后端。
+
+domains.yaml 中与后端相关的字段（均可选）：
+    backend:
+      db: "domain_db/legal.json"               # 默认 domain_db/<id>.json（相对 backend 目录）
+      spec: "domain_specs/legal.yaml"          # 默认 domain_specs/<id>.yaml
+      prompts: "simulation_engine.prompts"     # Prompt 模块，默认 HR 通用 Prompt
+
+环境变量：
+- DOMAINS_FILE     注册表路径（默认依次查找 ../domains.yaml、./domains.yaml）
+- DEFAULT_DOMAIN   旧接口（不带领域前缀）使用的领域，默认 hr
+- STATE_DIR        运行时状态目录（默认仓库根目录下的 state/，已加入 .gitignore，docker-compose 挂载为卷）
+- LOCK_DIR         跨进程写锁文件目录（默认 $STATE_DIR/locks；API 与 worker 必须指向同一个本地目录，
+                   fcntl 文件锁不适用于网络文件系统）
+"""
+
+import importlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, TypedDict
+
+try:
+    import fcntl
+    FILE_LOCKS_AVAILABLE = True
+except ImportError:  # Windows：只有进程内锁
+    fcntl = None
+    FILE_LOCKS_AVAILABLE = False
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+# 运行时状态（任务队列 / 死信队列的 SQLite、写锁文件、trace 导出），不放在源码目录里（已加入 .gitignore）
+STATE_DIR = Path(os.getenv("STATE_DIR", str(BACKEND_DIR.parent / "state")))
+LOCK_DIR = Path(os.getenv("LOCK_DIR", str(STATE_DIR / "locks")))
+DEFAULT_DOMAIN = os.getenv("DEFAULT_DOMAIN", "hr")
+DEFAULT_PROMPTS = "simulation_engine.prompts"
+# 工作流中的 Prompt 名 → Prompt 模块里的变量名
+PROMPT_ATTRS = {
+    "opening": "opening_prompt",
+    "expert": "expert_prompt",
+    "novice": "novice_prompt",
+    "branch": "branch_questions_prompt",
+}
+
+
+class DomainConfig(TypedDict, total=False):
+    """单个领域的配置"""
+    id: str
+    name: str
+    name_en: str
+    description: str
+    status: str
+    db: str
+    spec: str
+    prompts: str
+
+
+# 找不到 domains.yaml（或未安装 PyYAML）时的兜底注册表
+FALLBACK_DOMAINS: List[dict] = [
+    {"id": "hr", "name": "密心 (HR)", "status": "active"},
+    {"id": "insurance", "name": "保险密心", "status": "active",
+     "backend": {"prompts": "simulation_engine.prompts_insurance"}},
+]
+
+_lock = threading.Lock()
+_domains: Optional[Dict[str, DomainConfig]] = None
+_managers: Dict[str, tuple] = {}
+_prompts: Dict[str, dict] = {}
+_graphs: Dict[str, object] = {}
+_write_locks: Dict[str, "FileWriteLock"] = {}
+
+
+# =======================================================
+# 📋 注册表加载
+# =======================================================
+def _registry_path() -> Optional[Path]:
+    if os.getenv("DOMAINS_FILE"):
+        return Path(os.getenv("DOMAINS_FILE"))
+    for candidate in (BACKEND_DIR.parent / "domains.yaml", BACKEND_DIR / "domains.yaml"):
+        if candidate.exists():
+            return candidate
+    return None
+
+
+def _read_entries() -> List[dict]:
+    path = _registry_path()
+    if path is None or not path.exists():
+        print("⚠️ 未找到 domains.yaml，使用内置领域注册表")
+        return FALLBACK_DOMAINS
+    try:
+        import yaml
+    except ImportError:
+        print("⚠️ 未安装 PyYAML，使用内置领域注册表")
+        return FALLBACK_DOMAINS
+    with open(path, "r", encoding="utf-8") as f:
+        data = yaml.safe_load(f) or {}
+    return data.get("domains") or []
+
+
+def _to_config(entry: dict) -> DomainConfig:
+    backend = entry.get("backend") or {}
+    domain_id = entry["id"]
+    return DomainConfig(
+        id=domain_id,
+        name=entry.get("name", domain_id),
+        name_en=entry.get("name_en", ""),
+        description=entry.get("description", ""),
+        status=entry.get("status", "active"),
+        db=backend.get("db", f"domain_db/{domain_id}.json"),
+        spec=backend.get("spec", f"domain_specs/{domain_id}.yaml"),
+        prompts=backend.get("prompts", DEFAULT_PROMPTS),
+    )
+
+
+def load_domains(reload: bool = False) -> Dict[str, DomainConfig]:
+    """加载所有 active 领域（结果缓存，reload=True 重新读取 domains.yaml）"""
+    global _domains
+    with _lock:
+        if _domains is None or reload:
+            _domains = {
+                entry["id"]: _to_config(entry)
+                for entry in _read_entries()
+                if entry.get("id") and entry.get("status", "active") == "active"
+            }
+            if reload:
+                _managers.clear()
+                _prompts.clear()
+                _graphs.clear()
+        return _domains
+
+
+def get_domain(domain: Optional[str] = None) -> DomainConfig:
+    """按 id 取领域配置，未注册或未启用时抛 KeyError"""
+    domain = domain or DEFAULT_DOMAIN
+    domains = load_domains()
+    if domain not in domains:
+        raise KeyError(f"未注册的领域: {domain}（可用: {', '.join(domains)}）")
+    return domains[domain]
+
+
+def _backend_path(value: str) -> Path:
+    path = Path(value)
+    return path if path.is_absolute() else BACKEND_DIR / path
+
+
+def db_path(domain: str) -> Path:
+    """领域知识库 JSON 路径"""
+    return _backend_path(get_domain(domain)["db"])
+
+
+def spec_path(domain: str) -> Path:
+    """领域规格路径（文件不存在时从知识库 JSON 中的旧字段生成规格）"""
+    return _backend_path(get_domain(domain)["spec"])
+
+
+class FileWriteLock:
+    """进程内可重入锁 + 跨进程文件锁（最外层 acquire 时加 flock，最外层 release 时释放）"""
+
+    def __init__(self, name: str):
+        self.path = LOCK_DIR / f"{name}.lock"
+        self._rlock = threading.RLock()
+        self._depth = 0
+        self._fd: Optional[int] = None
+
+    def acquire(self):
+        self._rlock.acquire()
+        if self._depth == 0 and FILE_LOCKS_AVAILABLE:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._fd = os.open(str(self.path), os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            except BaseException:
+                if self._fd is not None:
+                    os.close(self._fd)
+                    self._fd = None
+                self._rlock.release()
+                raise
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        self._rlock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+def write_lock(name: str) -> FileWriteLock:
+    """
+    共享 JSON 文件的写锁（读-改-写整个文件时持有）
+
+    领域知识库用领域 id，ETL 收件箱用 "inbox"；可重入，已持锁的入库流程可以直接调用 InboxStore 的写方法。
+    持锁后再读文件：其他进程可能刚写过（InboxStore 按 mtime 重新加载，自动入库每次都重读知识库）
+    """
+    with _lock:
+        if name not in _write_locks:
+            _write_locks[name] = FileWriteLock(name)
+        return _write_locks[name]
+
+
+def write_json(path: Path, data) -> None:
+    """整文件写回 JSON：先写临时文件再原子替换，其他进程不加锁读也不会读到写了一半的文件"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+# =======================================================
+# ♻️ 共享缓存
+# =======================================================
+def get_domain_manager(domain: str):
+    """
+    按领域复用 DomainManager：知识库或规格文件 mtime 变化（入库后）才重新加载并编译
+
+    场景去重集合本来就是类级共享的，复用实例省掉每次仿真都读一遍几百 KB 的 JSON、重新编译规格
+    """
+    from .domain_manager import DomainManager
+
+    path, spec = db_path(domain), spec_path(domain)
+    mtime = tuple(p.stat().st_mtime if p.exists() else 0.0 for p in (path, spec))
+    with _lock:
+        cached = _managers.get(domain)
+        if cached and cached[0] == mtime:
+            return cached[1]
+    manager = DomainManager(domain, db_path=path, spec_path=spec)
+    with _lock:
+        _managers[domain] = (mtime, manager)
+    return manager
+
+
+def get_prompts(domain: str) -> dict:
+    """领域 Prompt：{"opening", "expert", "novice", "branch"}，模块缺少的项回落到通用 Prompt"""
+    with _lock:
+        if domain in _prompts:
+            return _prompts[domain]
+    module = importlib.import_module(get_domain(domain)["prompts"])
+    default = importlib.import_module(DEFAULT_PROMPTS)
+    prompts = {
+        name: getattr(module, attr, None) or getattr(default, attr)
+        for name, attr in PROMPT_ATTRS.items()
+    }
+    with _lock:
+        _prompts[domain] = prompts
+    return prompts
+
+
+def get_graph(domain: str, roles: Optional[dict] = None, resumable: bool = False):
+    """
+    领域工作流：默认角色配置的按领域缓存，带 roles 覆盖的每次新建
+
+    resumable=True 时带检查点（graph.CHECKPOINTER），失败后可以从失败的节点继续（批量仿真用）
+    """
+    from .graph import CHECKPOINTER, create_simulation_graph
+
+    checkpointer = CHECKPOINTER if resumable else None
+    if roles:
+        return create_simulation_graph(roles=roles, prompts=get_prompts(domain), checkpointer=checkpointer)
+    key = f"{domain}#resumable" if resumable else domain
+    with _lock:
+        if key in _graphs:
+            return _graphs[key]
+    graph = create_simulation_graph(prompts=get_prompts(domain), checkpointer=checkpointer)
+    with _lock:
+        return _graphs.setdefault(key, graph)
+
+
+def domains_summary() -> List[dict]:
+    """/api/domains 返回的领域列表"""
+    return [
+        {"id": d["id"], "name": d["name"], "name_en": d["name_en"],
+         "description": d["description"], "db_exists": db_path(d["id"]).exists()}
+        for d in load_domains().values()
+    ]
@@ -0,0 +1,327 @@
+"""
+📐 Domain Spec - 声明式领域规格
+==============================
+核心职责：
+1. 每个领域一份 YAML（domain_specs/<id>.yaml）：角色、修饰语、场景模板、混淆对、覆盖率维度
+2. 加载时一次性编译成查找表（CompiledSpec）：服务索引、按分类的模板元组、混淆追问表、维度乘积
+   之后每次生成场景 / 计算覆盖率只做查表和随机选取，不再逐次遍历 taxonomy
+3. 场景生成器可插拔：@register_generator("name") 注册，或在规格里写 generator: "package.module:function"
+
+新增领域只需写一份规格（或在 domain_db/<id>.json 里放 personas / scenario_templates /
+emotional_modifiers / urgency_levels，会自动转换），不用再复制 DomainManager / 覆盖率计算代码。
+
+规格格式：
+    personas:            # 角色（prefix 缺省为 "我是{role}，"）
+      - {role: 创业老板, tone: 急躁, prefix: "我是个小老板，"}
+    modifiers:           # 依次以 probability 的概率拼在角色前缀之后
+      - {name: emotions, probability: 0.5, items: ["真的很头疼，", ...]}
+    scenarios:           # key 为分类名或服务名（在 taxonomy 中解析）
+      招聘与人才获取:
+        - {intent: "想找个厉害的人", term: "高端猎头服务", vars: {days: [3, 5]}, confusion_with: [...]}
+      团体医疗险:
+        - "员工老抱怨医疗报销额度低"    # 纯字符串：术语取 key
+    confusion_pairs:
+      - [裁员/辞退合规咨询, 孕期合规, "关键追问：员工是否在孕期/产期？"]
+    generator: templates # 可选
+    coverage:
+      covered: unique    # unique: 按 query+prediction 去重计数；traces: 全部追踪记录
+      dimensions:        # 预估总数 = multiply 不为 false 的维度 count 连乘
+        personas: {name: 角色设定, label: 角色, items: [...], description: ...}
+        services: {name: 服务数, from: services}   # from: services / scenarios / personas / <modifier name>
+"""
+
+import importlib
+import json
+import random
+from math import prod
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+# 修饰语末尾没有标点时补一个逗号，方便直接拼接
+_PUNCTUATION = "，。！？,.!?、"
+
+# =======================================================
+# 🔌 场景生成器插件
+# =======================================================
+GENERATORS: Dict[str, Callable] = {}
+
+
+def register_generator(name: str):
+    """
+    注册场景生成器：fn(spec: CompiledSpec, rng) -> dict
+
+    返回的场景至少包含 novice_intent / expert_term / category / persona / tone
+    """
+    def decorator(fn: Callable) -> Callable:
+        GENERATORS[name] = fn
+        return fn
+    return decorator
+
+
+def resolve_generator(name: Optional[str]) -> Callable:
+    """按注册名或 "module:function" 取生成器"""
+    name = name or "templates"
+    if name in GENERATORS:
+        return GENERATORS[name]
+    if ":" in name:
+        module, attr = name.split(":", 1)
+        return getattr(importlib.import_module(module), attr)
+    raise KeyError(f"未知的场景生成器: {name}")
+
+
+# =======================================================
+# 📦 编译结果
+# =======================================================
+def short_name(service: str) -> str:
+    """"背景调查 (Background Check)" → "背景调查"（中英文名之间以空格分隔）"""
+    return service.split(" (")[0].split(" ")[0] if " " in service else service
+
+
+class CompiledSpec:
+    """编译后的领域规格（只读查找表）"""
+
+    def __init__(self, domain: str):
+        self.domain = domain
+        self.personas: Tuple[dict, ...] = ()
+        self.modifiers: Tuple[Tuple[str, float, Tuple[str, ...]], ...] = ()
+        self.categories: Tuple[str, ...] = ()
+        self.templates: Dict[str, Tuple[dict, ...]] = {}
+        self.services_by_category: Dict[str, Tuple[str, ...]] = {}
+        self.category_alias: Dict[str, str] = {}
+        self.service_index: Dict[str, Tuple[str, str]] = {}
+        self.confusions: Dict[str, Tuple[Tuple[str, str], ...]] = {}
+        self.confusion_pairs: Tuple[Tuple[str, str, str], ...] = ()
+        self.dimension_config: Dict[str, dict] = {}
+        self.estimated_total = 0
+        self.covered_mode = "unique"
+        self.coverage_note = ""
+        self.generator: Callable = resolve_generator(None)
+
+    @property
+    def template_count(self) -> int:
+        return sum(len(t) for t in self.templates.values())
+
+    def category_services(self, name: str) -> Tuple[str, ...]:
+        """分类名（全名 / 简称）→ 该分类下的服务"""
+        return self.services_by_category.get(self.category_alias.get(name, name), ())
+
+    def lookup_service(self, name: str) -> Optional[Tuple[str, str]]:
+        """服务名（全名 / 简称）→ (taxonomy 分类, 服务全名)"""
+        return self.service_index.get(name) or self.service_index.get(short_name(name))
+
+    def confusions_for(self, term: str) -> Tuple[Tuple[str, str], ...]:
+        """与 term 容易混淆的服务及区分它们的关键追问"""
+        return self.confusions.get(term) or self.confusions.get(short_name(term), ())
+
+    def generate(self, rng=random) -> dict:
+        return self.generator(self, rng)
+
+    def stats(self) -> dict:
+        modifier_counts = [len(items) + 1 for _, _, items in self.modifiers]  # +1: 不加修饰
+        return {
+            "domain": self.domain,
+            "categories": len(self.categories),
+            "total_templates": self.template_count,
+            "personas": len(self.personas),
+            "modifiers": {name: len(items) for name, _, items in self.modifiers},
+            "confusion_pairs": len(self.confusion_pairs),
+            "estimated_unique_combinations": self.template_count * len(self.personas) * prod(modifier_counts),
+        }
+
+
+# =======================================================
+# 🛠️ 编译
+# =======================================================
+def _normalize_modifier(text: str) -> str:
+    text = str(text)
+    return text if not text or text[-1] in _PUNCTUATION else text + "，"
+
+
+def _compile_template(raw, key: str, spec: CompiledSpec) -> dict:
+    """单条模板：预先拆好变量表、解析术语和分类"""
+    if isinstance(raw, str):
+        raw = {"intent": raw}
+    services = spec.category_services(key)
+    service = None if services else spec.lookup_service(key)
+    term = raw.get("term") or (key if service else "")
+    category = raw.get("category") or (service[0] if service else key)
+    variables = raw.get("vars") or {}
+    return {
+        "intent": raw["intent"],
+        "term": term,
+        "category": category,
+        # 没有写术语、key 又是分类名时，生成时从该分类的服务中随机选
+        "services": () if term else services,
+        "dict_vars": tuple((f"{{{k}}}", tuple(v)) for k, v in variables.items() if v)
+        if isinstance(variables, dict) else (),
+        "list_vars": tuple(variables) if isinstance(variables, list) else (),
+        "ambiguity": raw.get("ambiguity", 0),
+        "confusion_with": tuple(raw.get("confusion_with", ())),
+        "hidden_signal": raw.get("hidden_signal", ""),
+    }
+
+
+def _dimension_count(config: dict, spec: CompiledSpec) -> int:
+    source = config.get("from")
+    if source == "services":
+        return sum(len(services) for services in spec.services_by_category.values())
+    if source == "scenarios":
+        return spec.template_count
+    if source == "personas":
+        return len(spec.personas)
+    if source:
+        return next((len(items) for name, _, items in spec.modifiers if name == source), 0)
+    if "count" in config:
+        return int(config["count"])
+    return len(config.get("items", []))
+
+
+def compile_spec(domain: str, raw: dict, taxonomy: List[dict]) -> CompiledSpec:
+    """把规格 + 知识库 taxonomy 编译成查找表"""
+    spec = CompiledSpec(domain)
+
+    # 1. 服务索引（全名 + 简称 → 分类）
+    for category in taxonomy:
+        services = tuple(category.get("services", []))
+        spec.services_by_category[category.get("name", "")] = services
+        for service in services:
+            spec.service_index.setdefault(service, (category.get("name", ""), service))
+            spec.service_index.setdefault(short_name(service), (category.get("name", ""), service))
+        # 分类简称也能直接命中（"招聘与人才获取" ↔ "招聘与人才获取 (Talent Acquisition)"）
+        spec.category_alias.setdefault(short_name(category.get("name", "")), category.get("name", ""))
+
+    # 2. 角色与修饰语
+    spec.personas = tuple(
+        {"role": p["role"], "tone": p.get("tone", "焦虑"), "prefix": p.get("prefix") or f"我是{p['role']}，"}
+        for p in raw.get("personas", [])
+    ) or ({"role": "普通人", "tone": "焦虑", "prefix": ""},)
+    spec.modifiers = tuple(
+        (m.get("name", f"modifier_{i}"), float(m.get("probability", 0.5)),
+         tuple(_normalize_modifier(x) for x in m.get("items", [])))
+        for i, m in enumerate(raw.get("modifiers", []))
+        if m.get("items")
+    )
+
+    # 3. 场景模板（按分类分组）
+    for key, templates in (raw.get("scenarios") or {}).items():
+        compiled = tuple(_compile_template(t, key, spec) for t in templates)
+        if compiled:
+            spec.templates[key] = compiled
+    spec.categories = tuple(spec.templates)
+
+    # 4. 混淆对 → 双向查找表
+    confusions: Dict[str, list] = {}
+    pairs = []
+    for pair in raw.get("confusion_pairs", []):
+        a, b, question = (list(pair) + [""])[:3]
+        pairs.append((a, b, question))
+        confusions.setdefault(a, []).append((b, question))
+        confusions.setdefault(b, []).append((a, question))
+    for templates in spec.templates.values():
+        for t in templates:
+            for other in t["confusion_with"]:
+                known = confusions.setdefault(t["term"], [])
+                if all(o != other for o, _ in known):
+                    known.append((other, ""))
+    spec.confusion_pairs = tuple(pairs)
+    spec.confusions = {term: tuple(v) for term, v in confusions.items()}
+
+    # 5. 覆盖率维度（count 在编译时算好）
+    coverage = raw.get("coverage") or {}
+    spec.covered_mode = coverage.get("covered", "unique")
+    spec.coverage_note = coverage.get("note", "")
+    for key, config in (coverage.get("dimensions") or {}).items():
+        spec.dimension_config[key] = {**config, "count": _dimension_count(config, spec)}
+    spec.estimated_total = prod(
+        d["count"] for d in spec.dimension_config.values() if d.get("multiply", True)
+    ) if spec.dimension_config else 0
+
+    spec.generator = resolve_generator(raw.get("generator"))
+    return spec
+
+
+# =======================================================
+# 📂 规格加载
+# =======================================================
+def spec_from_domain_db(domain_db: dict) -> dict:
+    """旧格式：规格字段直接写在 domain_db/<id>.json 里（personas / scenario_templates / ...）"""
+    modifiers = []
+    if domain_db.get("emotional_modifiers"):
+        modifiers.append({"name": "emotions", "probability": 0.5, "items": domain_db["emotional_modifiers"]})
+    if domain_db.get("urgency_levels"):
+        modifiers.append({"name": "urgency", "probability": 0.4, "items": domain_db["urgency_levels"]})
+    return {
+        "personas": domain_db.get("personas", []),
+        "modifiers": modifiers,
+        "scenarios": domain_db.get("scenario_templates", {}),
+        "coverage": {"dimensions": {
+            "services": {"name": "服务数", "label": "服务", "from": "services", "description": "知识库中的服务节点"},
+            "personas": {"name": "角色", "label": "角色", "from": "personas", "description": "提问者身份"},
+        }},
+    }
+
+
+def load_spec(path: Optional[Path], domain_db: dict) -> dict:
+    """读取 YAML / JSON 规格文件，不存在时从知识库 JSON 中的旧字段转换"""
+    if path is not None and path.exists():
+        with open(path, "r", encoding="utf-8") as f:
+            if path.suffix == ".json":
+                return json.load(f)
+            import yaml
+            return yaml.safe_load(f) or {}
+    return spec_from_domain_db(domain_db)
+
+
+# =======================================================
+# 🎲 内置生成器
+# =======================================================
+def _fill(template: dict, rng) -> str:
+    intent = template["intent"]
+    if template["list_vars"]:
+        intent = intent.replace("{var}", str(rng.choice(template["list_vars"])))
+    for placeholder, values in template["dict_vars"]:
+        intent = intent.replace(placeholder, str(rng.choice(values)))
+    return intent
+
+
+def _decorate(spec: CompiledSpec, persona: dict, intent: str, rng) -> str:
+    parts = [persona["prefix"]]
+    for _, probability, items in spec.modifiers:
+        if rng.random() < probability:
+            parts.append(rng.choice(items))
+    return "".join(parts) + intent
+
+
+@register_generator("templates")
+def template_generator(spec: CompiledSpec, rng=random) -> dict:
+    """分类均衡：先随机分类，再随机模板；没有模板时按 taxonomy 服务兜底"""
+    persona = rng.choice(spec.personas)
+    if not spec.categories:
+        return taxonomy_generator(spec, rng)
+    category = rng.choice(spec.categories)
+    template = rng.choice(spec.templates[category])
+    term = template["term"] or (rng.choice(template["services"]) if template["services"] else "未知服务")
+    return {
+        "novice_intent": _decorate(spec, persona, _fill(template, rng), rng),
+        "expert_term": term,
+        "category": template["category"],
+        "persona": persona["role"],
+        "tone": persona["tone"],
+    }
+
+
+@register_generator("taxonomy")
+def taxonomy_generator(spec: CompiledSpec, rng=random) -> dict:
+    """只有 taxonomy 的新领域：随机服务 + 通用的模糊开场"""
+    persona = rng.choice(spec.personas)
+    categories = [c for c, s in spec.services_by_category.items() if s]
+    category = rng.choice(categories) if categories else ""
+    service = rng.choice(spec.services_by_category[category]) if category else "未知服务"
+    intent = f"最近遇到点{short_name(category)}方面的事情，不知道该怎么处理。"
+    return {
+        "novice_intent": _decorate(spec, persona, intent, rng),
+        "expert_term": short_name(service),
+        "category": category,
+        "persona": persona["role"],
+        "tone": persona["tone"],
+    }
@@ -0,0 +1,260 @@
+"""
+🧮 Estimator - 批量仿真开跑前的 token / 费用 / 耗时预估
+=======================================================
+核心职责：
+1. 本地分词计数：tiktoken（ESTIMATE_TOKENIZER 编码），不可用时按字符启发式（中文 1 字 ≈ 1 token，其余 4 字符 ≈ 1 token）
+2. 渲染真实 Prompt：领域 Prompt + get_expert_context() + 抽样的秘密任务，按 max_turns 模拟对话增长
+   （专家 / 小白每轮都带上全部历史消息，Prompt 里的 {messages} 按消息列表原样渲染，所以越往后越贵）
+3. 单次调用耗时 = 输出 token 数 × 观测到的每输出 token 耗时
+   （按模型汇总 meseeing_llm_request_seconds / meseeing_llm_tokens_total，含首 token 延迟摊销；没有样本时用默认速度）
+4. 按价格表（usage.py）折算费用；按并发数和 Provider 配额（<NAME>_RPM）估算整批墙钟时间
+
+按最坏情况估算：每场都跑满 max_turns（MaxTurns 规则在倒数第二轮收尾），不含分支模式、JSON 修复和失败重试。
+每轮输出 / 进入历史的长度取 EXPECTED_LENGTHS，可按请求覆盖。
+
+环境变量：
+- ESTIMATE_TOKENIZER          tiktoken 编码名（默认 cl100k_base；GLM / Gemini 的分词器不同，只作近似）
+- ESTIMATE_TOKENS_PER_SECOND  没有观测数据时假设的输出速度（默认 30）
+"""
+
+import math
+import os
+import re
+import threading
+from typing import Dict, List, Optional, TypedDict
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+
+from .domain_registry import get_domain_manager, get_prompts
+from .graph import ROLES, resolve_role_configs, _expert_inputs, _novice_inputs
+from .metrics import LLM_LATENCY, LLM_TOKENS
+from .router import get_providers, parse_model_spec, route_models
+from .usage import CURRENCY, cost_of, over_budget
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    tiktoken = None
+    TIKTOKEN_AVAILABLE = False
+
+TOKENIZER = os.getenv("ESTIMATE_TOKENIZER", "cl100k_base")
+DEFAULT_TOKENS_PER_SECOND = float(os.getenv("ESTIMATE_TOKENS_PER_SECOND", "30"))
+DEFAULT_MAX_TURNS = 8   # 与 batch_runner_v3 的 max_turns 一致
+MESSAGE_OVERHEAD = 4    # 每条消息的角色 / 分隔符开销
+REPLY_OVERHEAD = 3      # 回复起始标记
+
+
+class TurnLengths(TypedDict, total=False):
+    """每次调用的输出 token 数，以及其中进入对话历史的部分"""
+    opening: int          # 开场白（纯文本，整段进入历史）
+    expert_output: int    # 专家每轮输出（完整 JSON：诊断推理 + 回复）
+    expert_reply: int     # 其中进入历史的 reply_to_user
+    novice_output: int    # 小白每轮输出（JSON：回复 + 透露 / 隐藏的信息）
+    novice_reply: int     # 其中进入历史的 response
+
+
+EXPECTED_LENGTHS: TurnLengths = {
+    "opening": 60,
+    "expert_output": 350,
+    "expert_reply": 80,
+    "novice_output": 150,
+    "novice_reply": 60,
+}
+
+# =======================================================
+# 🔤 本地分词
+# =======================================================
+_encoding = None  # 首次使用时加载；加载失败（未安装 / 离线下载不到编码文件）记为 False
+_encoding_lock = threading.Lock()
+_CJK = re.compile(r"[\u3000-\u303f\u3400-\u9fff\uf900-\ufaff\uff00-\uffef]")
+
+
+def _get_encoding():
+    global _encoding
+    with _encoding_lock:
+        if _encoding is None:
+            _encoding = False
+            if TIKTOKEN_AVAILABLE:
+                try:
+                    _encoding = tiktoken.get_encoding(TOKENIZER)
+                except Exception as e:
+                    print(f"⚠️ tiktoken 编码 {TOKENIZER} 加载失败，改用启发式计数: {e}")
+        return _encoding or None
+
+
+def tokenizer_name() -> str:
+    return f"tiktoken:{TOKENIZER}" if _get_encoding() else "heuristic"
+
+
+def count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding:
+        return len(encoding.encode(text, disallowed_special=()))
+    cjk = len(_CJK.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def count_prompt_tokens(prompt, inputs: dict) -> int:
+    """按实际渲染结果计数（ChatPromptTemplate → 消息列表）"""
+    messages = prompt.format_messages(**inputs)
+    return sum(count_tokens(str(m.content)) + MESSAGE_OVERHEAD for m in messages) + REPLY_OVERHEAD
+
+
+# 历史消息的占位文本（口语化中文，接近真实对话的 token 密度）
+_FILLER = "我们公司最近员工流失比较严重，老板想调整一下薪酬结构，但是不知道从哪里入手，您看这种情况应该怎么办？"
+
+
+def _filler(tokens: int) -> str:
+    """大约 tokens 个 token 的占位文本"""
+    per_char = count_tokens(_FILLER) / len(_FILLER)
+    chars = max(1, round(tokens / per_char))
+    return (_FILLER * (chars // len(_FILLER) + 1))[:chars]
+
+
+# =======================================================
+# ⏱️ 观测到的延迟
+# =======================================================
+def observed_latency() -> Dict[str, dict]:
+    """按模型汇总本进程的 LLM 调用：{model: {calls, seconds, completion_tokens, seconds_per_token}}"""
+    stats: Dict[str, dict] = {}
+    for (_provider, model, _node), state in LLM_LATENCY.samples():
+        entry = stats.setdefault(model, {"calls": 0, "seconds": 0.0, "completion_tokens": 0})
+        entry["calls"] += state[-1]
+        entry["seconds"] += state[-2]
+    for (_provider, model, kind), value in LLM_TOKENS.samples():
+        if kind == "completion" and model in stats:
+            stats[model]["completion_tokens"] += int(value)
+    for entry in stats.values():
+        tokens = entry["completion_tokens"]
+        entry["seconds_per_token"] = round(entry["seconds"] / tokens, 5) if tokens else None
+        entry["seconds"] = round(entry["seconds"], 3)
+    return stats
+
+
+# =======================================================
+# 🧮 预估
+# =======================================================
+def role_models(roles: Optional[dict] = None) -> Dict[str, tuple]:
+    """各角色首选的 (Provider, 模型)（按角色覆盖与 LLM_ROUTE_<NODE> 解析，与 build_role_llms 一致）"""
+    configs = resolve_role_configs(roles)
+    models = {}
+    for role in ROLES:
+        route = route_models(role, parse_model_spec(configs[role].get("model")))
+        if not route:
+            raise ValueError("❌ 错误：未配置任何有效的 LLM API Key！")
+        models[role] = route[0]
+    return models
+
+
+def simulate_calls(domain: str, mission: dict, taxonomy_context: str, max_turns: int,
+                   lengths: TurnLengths) -> List[dict]:
+    """按工作流顺序（开场 → 专家 ↔ 小白）渲染每次调用的 Prompt，返回 [{turn, role, prompt_tokens, completion_tokens}]"""
+    prompts = get_prompts(domain)
+    state = {"domain": domain, "taxonomy_context": taxonomy_context, "secret_mission": mission}
+    opening_inputs = {k: v for k, v in _novice_inputs(state, []).items() if k != "messages"}
+    calls = [{"turn": 0, "role": "opening", "completion_tokens": lengths["opening"],
+              "prompt_tokens": count_prompt_tokens(prompts["opening"], opening_inputs)}]
+    history: List[BaseMessage] = [HumanMessage(content=_filler(lengths["opening"]))]
+    turn = 1
+    while True:
+        calls.append({"turn": turn, "role": "expert", "completion_tokens": lengths["expert_output"],
+                      "prompt_tokens": count_prompt_tokens(prompts["expert"], _expert_inputs(state, history))})
+        history.append(AIMessage(content=_filler(lengths["expert_reply"])))
+        # MaxTurns：turn_count + 1 >= max_turns 时专家本轮收尾
+        if turn + 1 >= max_turns:
+            return calls
+        calls.append({"turn": turn, "role": "novice", "completion_tokens": lengths["novice_output"],
+                      "prompt_tokens": count_prompt_tokens(prompts["novice"], _novice_inputs(state, history))})
+        history.append(HumanMessage(content=_filler(lengths["novice_reply"])))
+        turn += 1
+
+
+def estimate_batch(domain: str, count: int, concurrency: int, max_turns: int = DEFAULT_MAX_TURNS,
+                   roles: Optional[dict] = None, lengths: Optional[TurnLengths] = None,
+                   samples: int = 3, budget: Optional[dict] = None) -> dict:
+    """
+    预估一批仿真的 token、费用和墙钟时间
+
+    samples: 抽几个秘密任务取平均（小白 / 开场白的 Prompt 随任务变化）
+    budget:  给出时顺带判断是否会超出预算（{max_tokens, max_cost}，见 usage.py）
+    """
+    if count <= 0 or concurrency <= 0 or max_turns <= 0:
+        raise ValueError("count / concurrency / max_turns 必须大于 0")
+    lengths = {**EXPECTED_LENGTHS, **(lengths or {})}
+    models = role_models(roles)
+    latency = observed_latency()
+
+    dm = get_domain_manager(domain)
+    taxonomy_context = dm.get_expert_context()
+    # 直接用场景生成器抽样，不占用 generate_secret_mission 的全局去重
+    runs = [simulate_calls(domain, dm.spec.generate(), taxonomy_context, max_turns, lengths)
+            for _ in range(max(1, samples))]
+
+    by_role: Dict[str, dict] = {}
+    for role in ROLES:
+        provider, model = models[role]
+        observed = latency.get(model, {})
+        seconds_per_token = observed.get("seconds_per_token")
+        calls = [c for run in runs for c in run if c["role"] == role]
+        prompt_tokens = sum(c["prompt_tokens"] for c in calls) / len(runs)
+        completion_tokens = sum(c["completion_tokens"] for c in calls) / len(runs)
+        cost, priced = cost_of(model, prompt_tokens, completion_tokens)
+        by_role[role] = {
+            "provider": provider,
+            "model": model,
+            "calls": len(calls) // len(runs),
+            "prompt_tokens": round(prompt_tokens),
+            "completion_tokens": round(completion_tokens),
+            "cost": round(cost, 6),
+            "priced": priced,
+            "seconds": round(completion_tokens * (seconds_per_token or 1 / DEFAULT_TOKENS_PER_SECOND), 2),
+            "seconds_per_token": seconds_per_token or round(1 / DEFAULT_TOKENS_PER_SECOND, 5),
+            "latency_source": "observed" if seconds_per_token else "default",
+        }
+
+    per_sim = {key: sum(r[key] for r in by_role.values())
+               for key in ("calls", "prompt_tokens", "completion_tokens", "cost", "seconds")}
+    per_sim["total_tokens"] = per_sim["prompt_tokens"] + per_sim["completion_tokens"]
+
+    # 墙钟时间：并发波次 × 单场耗时；Provider 有 RPM 配额时不会快于 调用数 / RPM
+    waves = math.ceil(count / concurrency)
+    wall_clock, bottleneck = waves * per_sim["seconds"], "concurrency"
+    providers = get_providers()
+    calls_per_provider: Dict[str, int] = {}
+    for r in by_role.values():
+        calls_per_provider[r["provider"]] = calls_per_provider.get(r["provider"], 0) + r["calls"] * count
+    for name, calls in calls_per_provider.items():
+        rpm = providers[name].rpm if name in providers else None
+        if rpm and calls / rpm * 60 > wall_clock:
+            wall_clock, bottleneck = calls / rpm * 60, f"rpm:{name}"
+
+    total_tokens = per_sim["total_tokens"] * count
+    total_cost = per_sim["cost"] * count
+    unpriced = sorted({r["model"] for r in by_role.values() if not r["priced"]})
+    return {
+        "domain": domain,
+        "count": count,
+        "concurrency": concurrency,
+        "max_turns": max_turns,
+        "tokenizer": tokenizer_name(),
+        "samples": len(runs),
+        "lengths": lengths,
+        "per_simulation": {**per_sim, "cost": round(per_sim["cost"], 6), "seconds": round(per_sim["seconds"], 2),
+                           "by_role": by_role},
+        # 第一个样本逐次调用的输入 token，可以看出历史增长
+        "prompt_growth": runs[0],
+        "total": {
+            "calls": per_sim["calls"] * count,
+            "prompt_tokens": per_sim["prompt_tokens"] * count,
+            "completion_tokens": per_sim["completion_tokens"] * count,
+            "total_tokens": total_tokens,
+            "cost": round(total_cost, 6),
+            "currency": CURRENCY,
+        },
+        "wall_clock_seconds": round(wall_clock, 1),
+        "bottleneck": bottleneck,
+        "observed_latency": latency,
+        **({"unpriced_models": unpriced} if unpriced else {}),
+        **({"budget": budget, "exceeds_budget": over_budget(budget, total_tokens, total_cost)} if budget else {}),
+    }
@@ -0,0 +1,148 @@
+"""
+📡 Events - 进程内事件总线（/ws/events 推送）
+============================================
+核心职责：
+1. BatchRunner、入库流程、收件箱、覆盖率计数通过 publish() 发布事件（任意线程可调用，无订阅者时几乎零开销）
+2. 每个 WebSocket 客户端一个 Subscriber：按领域 / 主题过滤，事件先在本地合并再推送
+3. 合并 + 限速：同一客户端两次推送至少间隔 min_interval 秒，间隔内到达的事件按主题合并成一帧
+
+合并方式（COALESCE）：
+- latest  同一 (主题, 领域) 只保留最新一条（batch.status 等快照）
+- append  同一 (主题, 领域) 的 data 追加到 items 列表，最多 MAX_ITEMS 条，超出计入 dropped
+- sum     同一 (主题, 领域) 的数值字段累加（coverage.delta）
+
+推送帧格式：
+    {"events": [{"topic": "batch.status", "domain": "hr", "ts": 1700000000.0, "data": {...}}, ...]}
+
+主题：
+    batch.status        批量任务状态快照（开始 / 暂停 / 恢复 / 取消 / 完成 / 每个任务前后）
+    batch.task_started  {index, current_task, total_tasks}
+    batch.task_finished {index, success, prediction, correct, duration_seconds, error, error_class}
+    batch.job           任务队列中某个任务的摘要（提交 / 每条仿真结束 / 取消 / 完成）
+    ingest.record       {id, service, category, path: auto | manual}
+    inbox.added         {id, query, seq}
+    inbox.removed       {id, seq}
+    coverage.delta      {traces, new_services}
+"""
+
+import asyncio
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set
+
+MIN_INTERVAL = float(os.getenv("EVENTS_MIN_INTERVAL", "0.5"))
+MAX_ITEMS = 50
+
+COALESCE = {
+    "batch.status": "latest",
+    "batch.task_started": "latest",
+    "batch.task_finished": "append",
+    "batch.job": "append",
+    "ingest.record": "append",
+    "inbox.added": "append",
+    "inbox.removed": "append",
+    "coverage.delta": "sum",
+}
+
+
+class Subscriber:
+    """单个客户端的待推送事件缓冲区"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, domains: Optional[Set[str]] = None,
+                 topics: Optional[Set[str]] = None, min_interval: float = MIN_INTERVAL):
+        self.loop = loop
+        self.domains = domains
+        self.topics = topics
+        self.min_interval = max(min_interval, MIN_INTERVAL)
+        self._pending: Dict[tuple, dict] = {}
+        self._lock = threading.Lock()
+        self._wakeup = asyncio.Event()
+        self._last_sent = 0.0
+
+    def wants(self, topic: str, domain: Optional[str]) -> bool:
+        if self.domains and domain and domain not in self.domains:
+            return False
+        # topics 支持前缀：batch 匹配 batch.status / batch.task_finished
+        return not self.topics or any(topic == t or topic.startswith(t + ".") for t in self.topics)
+
+    def offer(self, event: dict):
+        """合并进待推送缓冲区（任意线程调用）"""
+        key = (event["topic"], event["domain"])
+        mode = COALESCE.get(event["topic"], "latest")
+        with self._lock:
+            current = self._pending.get(key)
+            if mode == "append":
+                if current is None:
+                    current = self._pending[key] = {**event, "data": {"items": [], "dropped": 0}}
+                items = current["data"]["items"]
+                if len(items) < MAX_ITEMS:
+                    items.append(event["data"])
+                else:
+                    current["data"]["dropped"] += 1
+                current["ts"] = event["ts"]
+            elif mode == "sum" and current is not None:
+                for name, value in event["data"].items():
+                    current["data"][name] = current["data"].get(name, 0) + value
+                current["ts"] = event["ts"]
+            else:
+                self._pending[key] = {**event, "data": dict(event["data"])}
+        self.loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def next_batch(self) -> List[dict]:
+        """等到有事件且距上次推送满 min_interval，取出合并后的全部事件"""
+        await self._wakeup.wait()
+        delay = self._last_sent + self.min_interval - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)  # 这段时间里到达的事件一起合并
+        self._wakeup.clear()
+        with self._lock:
+            events, self._pending = list(self._pending.values()), {}
+        self._last_sent = time.monotonic()
+        return events
+
+
+class EventBus:
+    """发布 / 订阅：publish 扇出到所有感兴趣的订阅者"""
+
+    def __init__(self):
+        self._subscribers: List[Subscriber] = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, domains: Optional[Iterable[str]] = None, topics: Optional[Iterable[str]] = None,
+                  min_interval: float = MIN_INTERVAL) -> Subscriber:
+        """在事件循环内调用（WebSocket 处理函数里）"""
+        subscriber = Subscriber(asyncio.get_running_loop(), set(domains or ()) or None,
+                                set(topics or ()) or None, min_interval)
+        with self._lock:
+            self._subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, topic: str, domain: Optional[str] = None, data: Optional[dict] = None, **fields):
+        if not self._subscribers:
+            return
+        event = {"topic": topic, "domain": domain, "ts": time.time(), "data": {**(data or {}), **fields}}
+        with self._lock:
+            subscribers = [s for s in self._subscribers if s.wants(topic, domain)]
+        for subscriber in subscribers:
+            try:
+                subscriber.offer(event)
+            except RuntimeError:
+                # 订阅者的事件循环已关闭（进程退出中）
+                self.unsubscribe(subscriber)
+
+
+EVENT_BUS = EventBus()
+
+
+def publish(topic: str, domain: Optional[str] = None, data: Optional[dict] = None, **fields):
+    """发布事件到全局总线：data 为现成的 dict（如状态快照），fields 为零散字段，二者合并"""
+    EVENT_BUS.publish(topic, domain, data, **fields)
@@ -0,0 +1,120 @@
+"""
+🩺 Failures - 仿真错误分类 + 分类重试策略
+=========================================
+核心职责：
+1. classify()：把异常归为 rate_limit / timeout / parse / provider_outage / bug 五类
+   （429 → rate_limit，5xx / 连接失败 → provider_outage，其余 4xx 与未知异常 → bug）
+2. RETRY_POLICY：每类的最大尝试次数与指数退避参数（bug 不重试：重跑只会得到同样的错误）
+3. retry_delay()：第 n 次失败后的等待秒数（带抖动；限流优先用服务端给的 Retry-After），不再重试返回 None
+4. SimulationFailure：重试耗尽 / 被取消后抛出，携带分类、尝试次数、失败的节点、检查点，供死信队列记录
+
+BatchRunner 用 LangGraph 检查点（MemorySaver）从失败的节点继续，而不是整场仿真重来，
+已生成的开场白和前几轮对话不会浪费。
+
+环境变量：
+- RETRY_BACKOFF_SCALE  退避时间倍率（默认 1；调试时设 0 可跳过等待）
+"""
+
+import os
+import random
+from typing import Dict, Optional, TypedDict
+
+from .cancellation import SimulationCancelled
+
+RATE_LIMIT, TIMEOUT, PARSE, PROVIDER_OUTAGE, BUG = "rate_limit", "timeout", "parse", "provider_outage", "bug"
+ERROR_CLASSES = (RATE_LIMIT, TIMEOUT, PARSE, PROVIDER_OUTAGE, BUG)
+# 不是错误：仿真被取消（cancellation.SimulationCancelled），不重试，部分对话随检查点进死信队列
+CANCELLED = "cancelled"
+
+BACKOFF_SCALE = float(os.getenv("RETRY_BACKOFF_SCALE", "1"))
+
+
+class RetryPolicy(TypedDict):
+    max_attempts: int     # 含第一次
+    base_delay: float     # 第一次重试前等待的秒数，之后每次翻倍
+    max_delay: float
+
+
+RETRY_POLICY: Dict[str, RetryPolicy] = {
+    RATE_LIMIT: {"max_attempts": 5, "base_delay": 5.0, "max_delay": 120.0},
+    TIMEOUT: {"max_attempts": 3, "base_delay": 2.0, "max_delay": 30.0},
+    PROVIDER_OUTAGE: {"max_attempts": 4, "base_delay": 10.0, "max_delay": 120.0},
+    PARSE: {"max_attempts": 2, "base_delay": 0.5, "max_delay": 2.0},
+    BUG: {"max_attempts": 1, "base_delay": 0.0, "max_delay": 0.0},
+    CANCELLED: {"max_attempts": 1, "base_delay": 0.0, "max_delay": 0.0},
+}
+
+# 按异常类名（含父类）匹配，匹配不上再看错误信息
+_TYPE_NAMES = {
+    RATE_LIMIT: ("RateLimitError", "ResourceExhausted", "TooManyRequests"),
+    TIMEOUT: ("TimeoutError", "APITimeoutError", "TimeoutException", "ReadTimeout", "ConnectTimeout",
+              "DeadlineExceeded"),
+    PARSE: ("JSONDecodeError", "ValidationError", "OutputParserException"),
+    PROVIDER_OUTAGE: ("APIConnectionError", "ConnectError", "RemoteProtocolError", "InternalServerError",
+                      "ServiceUnavailable", "ServiceUnavailableError", "BadGateway", "ConnectionError"),
+}
+_MESSAGE_HINTS = {
+    RATE_LIMIT: ("rate limit", "ratelimit", "429", "quota", "too many requests"),
+    TIMEOUT: ("timed out", "timeout", "deadline"),
+    PROVIDER_OUTAGE: ("connection error", "service unavailable", "bad gateway", "502", "503", "504",
+                      "overloaded", "未配置任何有效的 llm"),
+    PARSE: ("json", "parse", "解析"),
+}
+
+
+class SimulationFailure(Exception):
+    """重试耗尽（或不可重试）的仿真失败"""
+
+    def __init__(self, error_class: str, error: BaseException, attempts: int, node: Optional[str] = None,
+                 checkpoint: Optional[dict] = None):
+        super().__init__(str(error))
+        self.error_class = error_class
+        self.error = error
+        self.attempts = attempts
+        self.node = node
+        self.checkpoint = checkpoint  # graph.export_checkpoint 的结果，续跑用
+
+
+def classify(error: BaseException) -> str:
+    """异常 → 错误分类（未知异常按代码 bug 处理，不重试）"""
+    if isinstance(error, SimulationFailure):
+        return error.error_class
+    if isinstance(error, SimulationCancelled):
+        return CANCELLED
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if status == 429:
+        return RATE_LIMIT
+    if isinstance(status, int) and status >= 500:
+        return PROVIDER_OUTAGE
+    if isinstance(status, int) and status >= 400:
+        return BUG  # 其余 4xx（鉴权、参数错误）重试也不会好
+    names = {cls.__name__ for cls in type(error).__mro__}
+    for error_class, type_names in _TYPE_NAMES.items():
+        if names.intersection(type_names):
+            return error_class
+    text = f"{type(error).__name__} {error}".lower()
+    for error_class, hints in _MESSAGE_HINTS.items():
+        if any(hint in text for hint in hints):
+            return error_class
+    return BUG
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    """服务端给的 Retry-After（秒），没有则 None"""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    try:
+        return float(headers.get("retry-after")) if headers and headers.get("retry-after") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_delay(error_class: str, attempt: int, error: Optional[BaseException] = None) -> Optional[float]:
+    """第 attempt 次尝试失败后，下一次尝试前等待的秒数；已到上限返回 None"""
+    policy = RETRY_POLICY.get(error_class, RETRY_POLICY[BUG])
+    if attempt >= policy["max_attempts"]:
+        return None
+    delay = min(policy["max_delay"], policy["base_delay"] * 2 ** (attempt - 1))
+    delay *= random.uniform(0.5, 1.0)  # 抖动：避免多个仿真同时撞上限流窗口
+    if error_class == RATE_LIMIT and error is not None:
+        delay = max(delay, _retry_after(error) or 0)
+    return delay * BACKOFF_SCALE
@@ -12,85 +12,88 @@ import json
 import re
 import operator
 import os
-from typing import TypedDict, Annotated, List, Optional
+from functools import partial
+from typing import TypedDict, Annotated, Dict, List, Optional
 from langgraph.graph import StateGraph, END
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, AIMessage, BaseMessage
-from .prompts import expert_prompt, novice_prompt, opening_prompt
+from langgraph.checkpoint.memory import MemorySaver
+from langchain_core.messages import HumanMessage, AIMessage, BaseMessage, messages_from_dict, messages_to_dict
+from .prompts import expert_prompt, novice_prompt, opening_prompt, branch_questions_prompt
+from .metrics import timed_node, extract_token_usage
+from .usage import cost_of
+from .deadlines import node_deadline
+from .tracing import traced, span
+from .structured import ExpertReply, NoviceReply, BranchQuestions, parse_structured
+from .router import get_providers, build_router, parse_model_spec
+from .stopping import StopPolicy, default_stop_policy
 from dotenv import load_dotenv
 
 # 加载环境变量
 load_dotenv()
 
 # =======================================================
-# 🛡️ 配置 LLM
+# 🛡️ 配置 LLM (多 Provider 路由，见 router.py)
 # =======================================================
-# =======================================================
-# 🛡️ 配置 LLM (支持自动故障切换)
-# =======================================================
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_openai import ChatOpenAI
-
-# 1. 初始化 Google LLM (首选)
-google_llm = None
-google_api_key = os.getenv("GOOGLE_API_KEY")
-if google_api_key:
-    try:
-        google_llm = ChatGoogleGenerativeAI(
-            model="gemini-flash-latest",
-            temperature=0.3,
-            google_api_key=google_api_key,
-            convert_system_message_to_human=True,
-            transport="rest"
-        )
-        print("   ✅ Google Gemini 配置成功 (首选)")
-    except Exception as e:
-        print(f"   ⚠️ Google Gemini 初始化失败: {e}")
-
-# 2. 初始化 OpenAI/Zhipu LLM (备选)
-openai_llm = None
-openai_api_key = os.getenv("OPENAI_API_KEY")
-openai_api_base = os.getenv("OPENAI_API_BASE", "https://open.bigmodel.cn/api/paas/v4/")
-
-if openai_api_key:
-    try:
-        openai_llm = ChatOpenAI(
-            model="glm-4",
-            temperature=0.3,
-            openai_api_key=openai_api_key,
-            openai_api_base=openai_api_base
+# 专家 / 小白节点使用原生 JSON 输出（LLM_JSON_MODE=0 可关闭），开场白为纯文本
+JSON_MODE = os.getenv("LLM_JSON_MODE", "1") != "0"
+ROLES = ("opening", "expert", "novice")
+
+
+class RoleConfig(TypedDict, total=False):
+    """单个角色的模型配置"""
+    model: str  # "glm-4-flash"（只用于同系列 Provider）或 "glm:glm-4-flash,gemini:gemini-1.5-flash-8b"
+    temperature: float
+    max_tokens: int
+
+
+def default_role_configs() -> Dict[str, RoleConfig]:
+    """
+    各角色默认配置，可用环境变量覆盖：
+    LLM_<ROLE>_MODEL / LLM_<ROLE>_TEMPERATURE / LLM_<ROLE>_MAX_TOKENS（ROLE = OPENING / EXPERT / NOVICE）
+    """
+    configs = {}
+    for role in ROLES:
+        prefix = f"LLM_{role.upper()}_"
+        config: RoleConfig = {"temperature": float(os.getenv(prefix + "TEMPERATURE", "0.3"))}
+        if os.getenv(prefix + "MODEL"):
+            config["model"] = os.getenv(prefix + "MODEL")
+        if os.getenv(prefix + "MAX_TOKENS"):
+            config["max_tokens"] = int(os.getenv(prefix + "MAX_TOKENS"))
+        configs[role] = config
+    return configs
+
+
+def resolve_role_configs(roles: Optional[Dict[str, RoleConfig]] = None) -> Dict[str, RoleConfig]:
+    """默认配置 + roles 覆盖（字段级合并）"""
+    configs = default_role_configs()
+    for role, override in (roles or {}).items():
+        configs[role] = {**configs.get(role, {}), **override}
+    return configs
+
+
+def build_role_llms(roles: Optional[Dict[str, RoleConfig]] = None) -> Dict[str, object]:
+    """按角色构建 LLM（每个角色一个路由器），roles 中的字段覆盖默认配置"""
+    configs = resolve_role_configs(roles)
+    return {
+        role: build_router(
+            role,
+            json_mode=JSON_MODE and role != "opening",
+            models=parse_model_spec(configs[role].get("model")),
+            temperature=configs[role].get("temperature"),
+            max_tokens=configs[role].get("max_tokens")
         )
-        print("   ✅ OpenAI/GLM-4 配置成功 (备选)")
-    except Exception as e:
-        print(f"   ⚠️ OpenAI/GLM-4 初始化失败: {e}")
-
-# 3. 配置最终 LLM 与故障切换策略
-llm = None
-llm_provider = os.getenv("LLM_PROVIDER", "openai").lower()
-
-if llm_provider == "google":
-    if google_llm:
-        if openai_llm:
-            # 启用自动故障切换: Google -> OpenAI
-            llm = google_llm.with_fallbacks([openai_llm])
-            print("   🚀 策略: 优先使用 Google Gemini，失败自动切换至 OpenAI/GLM-4")
-        else:
-            llm = google_llm
-            print("   👉 策略: 仅使用 Google Gemini")
-    else:
-        # 如果指定 Google 但没配置好，回退到 OpenAI
-        if openai_llm:
-            print("   ⚠️ 警告: Google 未配置，降级使用 OpenAI/GLM-4")
-            llm = openai_llm
-        else:
-            raise ValueError("❌ 错误：未配置任何有效的 LLM API Key！")
-else:
-    # 默认 OpenAI
-    if openai_llm:
-        llm = openai_llm
-        print("   👉 策略: 仅使用 OpenAI/GLM-4")
-    else:
-         raise ValueError("❌ 错误：未找到 OPENAI_API_KEY！")
+        for role in ROLES
+    }
+
+
+ROLE_LLMS = build_role_llms()
+# 默认（HR）Prompt；其它领域的 Prompt 见 domain_registry.get_prompts
+DEFAULT_PROMPTS = {
+    "opening": opening_prompt,
+    "expert": expert_prompt,
+    "novice": novice_prompt,
+    "branch": branch_questions_prompt
+}
+print(f"   🧭 LLM 路由: {', '.join(get_providers())} (JSON 模式: {'开' if JSON_MODE else '关'})")
 
 # =======================================================
 # 📊 状态定义 (增强版)
@@ -111,16 +114,69 @@ class SimulationState(TypedDict):
     eliminated_categories: List[str]  # 已排除的分类
     confidence_history: List[float]  # 置信度变化曲线
     final_diagnosis: Optional[dict]  # 最终诊断结果
+    
+    # 🆕 提前结束控制
+    stop_reason: Optional[str]  # 停止原因（见 stopping.py）
+    tokens_used: int  # 本次仿真累计 token
+    cost_used: float  # 本次仿真累计费用（按 usage.py 的模型价格表，未定价模型不计）
+    
+    # 🆕 分支模式（可选）：在 branch_turn 轮同时探索 branch_k 个追问
+    branch_turn: Optional[int]
+    branch_k: int
+    branch_tree: List[dict]
+    # 分支节点已经为下一轮专家算好的回复（分支 0 的评估，输入与主线完全相同）：{"turn", "content"}，expert_node 直接复用
+    prefetched_expert: Optional[dict]
+
+
+DEFAULT_STOP_POLICY = default_stop_policy()
+
+
+def _usage_after(state: SimulationState, *responses) -> dict:
+    """累加本次 LLM 调用的 token 用量与费用（费用按响应里的模型名查价格表）"""
+    tokens = state.get("tokens_used", 0)
+    cost = state.get("cost_used", 0.0)
+    for response in responses:
+        prompt_tokens, completion_tokens = extract_token_usage(response)
+        tokens += prompt_tokens + completion_tokens
+        metadata = getattr(response, "response_metadata", None) or {}
+        cost += cost_of(metadata.get("model_name") or metadata.get("model") or "",
+                        prompt_tokens, completion_tokens)[0]
+    return {"tokens_used": tokens, "cost_used": cost}
+
+
+def _expert_inputs(state: SimulationState, messages: List[BaseMessage]) -> dict:
+    return {
+        "domain": state["domain"],
+        "taxonomy_context": state["taxonomy_context"],
+        "messages": messages
+    }
+
+
+def _novice_inputs(state: SimulationState, messages: List[BaseMessage]) -> dict:
+    mission = state["secret_mission"]
+    return {
+        "secret_user_intent": mission.get("novice_intent", ""),
+        "secret_category": mission.get("category", ""),
+        "persona_role": mission.get("persona", "普通人"),
+        "persona_tone": mission.get("tone", "焦虑"),
+        "messages": messages
+    }
 
 
 # =======================================================
 # 🎭 生成开场白节点
 # =======================================================
-def generate_opening_node(state: SimulationState) -> dict:
+@timed_node("opening")
+@node_deadline("opening")
+@traced("graph.opening")
+def generate_opening_node(state: SimulationState, llms: Optional[dict] = None,
+                          prompts: Optional[dict] = None) -> dict:
     """生成小白的开场白（确保不泄露答案）"""
+    llms = llms or ROLE_LLMS
+    prompts = prompts or DEFAULT_PROMPTS
     mission = state["secret_mission"]
     
-    chain = opening_prompt | llm
+    chain = prompts["opening"] | llms["opening"]
     response = chain.invoke({
         "secret_user_intent": mission.get("novice_intent", ""),
         "secret_category": mission.get("category", ""),
@@ -136,30 +192,44 @@ def generate_opening_node(state: SimulationState) -> dict:
     
     return {
         "messages": [HumanMessage(content=opening)],
-        "turn_count": 1
+        "turn_count": 1,
+        **_usage_after(state, response)
     }
 
 
 # =======================================================
 # 🤖 专家诊断节点
 # =======================================================
-def expert_node(state: SimulationState) -> dict:
-    """专家进行诊断追问"""
-    chain = expert_prompt | llm
+@timed_node("expert")
+@node_deadline("expert")
+@traced("graph.expert")
+def expert_node(state: SimulationState, stop_policy: Optional[StopPolicy] = None,
+                llms: Optional[dict] = None, prompts: Optional[dict] = None) -> dict:
+    """专家进行诊断追问，发言后由 stop_policy 决定是否结束"""
+    llms = llms or ROLE_LLMS
+    prompts = prompts or DEFAULT_PROMPTS
     
-    response = chain.invoke({
-        "domain": state["domain"],
-        "taxonomy_context": state["taxonomy_context"],
-        "messages": state["messages"]
-    })
+    prefetched = state.get("prefetched_expert")
+    if prefetched and prefetched.get("turn") == state["turn_count"]:
+        # 分支节点已经用同样的对话历史评估过分支 0（用量也已在分支节点计入），不再重复调用
+        content = prefetched["content"]
+        usage = {"tokens_used": state.get("tokens_used", 0), "cost_used": state.get("cost_used", 0.0)}
+    else:
+        chain = prompts["expert"] | llms["expert"]
+        response = chain.invoke(_expert_inputs(state, state["messages"]))
+        content = response.content
+        usage = _usage_after(state, response)
     
-    data = parse_json_robust(response.content)
+    with span("json.parse", node="expert") as parse_span:
+        data = parse_structured(content, ExpertReply, "expert", repair_llm=llms["expert"])
+        if parse_span is not None:
+            parse_span.set(ok=bool(data))
     
     # 提取诊断数据
     diagnosis_trace_entry = {}
     reply = ""
-    is_done = False
     confidence = 0.0
+    reasoning, analysis = {}, {}
     
     if data:
         # 提取诊断推理
@@ -180,12 +250,8 @@ def expert_node(state: SimulationState) -> dict:
         
         confidence = reasoning.get("confidence", 0.5)
         
-        # 判断是否结束
-        status = analysis.get("status", "active")
-        is_done = (status == "concluded" and state["turn_count"] >= 3)  # 至少 3 轮
-        
     else:
-        reply = response.content
+        reply = content
         diagnosis_trace_entry = {
             "turn": state["turn_count"],
             "raw_response": reply[:200]
@@ -198,47 +264,62 @@ def expert_node(state: SimulationState) -> dict:
     new_confidence = state.get("confidence_history", []) + [confidence]
     new_eliminated = state.get("eliminated_categories", []) + diagnosis_trace_entry.get("eliminated", [])
     
-    # 如果结束，记录最终诊断
+    # 判断是否结束（置信度平台 / 单一假设 / 预算 / 轮次等，见 stopping.py）
+    policy = stop_policy or DEFAULT_STOP_POLICY
+    stop_reason = policy.evaluate(
+        {**state, "confidence_history": new_confidence, **usage},
+        reasoning, analysis
+    )
+    
+    # 如果结束，记录最终诊断（本轮没解析出服务时取最近一次有效的判断）
     final_diagnosis = None
-    if is_done and data:
+    if stop_reason:
+        latest = next((t for t in reversed(new_trace) if t.get("matched_service")), {})
         final_diagnosis = {
-            "service": data.get("analysis_data", {}).get("matched_service", ""),
-            "diagnosis": data.get("analysis_data", {}).get("diagnosis", ""),
-            "confidence": confidence,
+            "service": analysis.get("matched_service") or latest.get("matched_service", ""),
+            "diagnosis": analysis.get("diagnosis") or latest.get("diagnosis", ""),
+            "confidence": confidence or latest.get("confidence", 0.0),
             "total_turns": state["turn_count"],
+            "stop_reason": stop_reason,
             "key_questions": [t.get("question_purpose", "") for t in new_trace if t.get("question_purpose")]
         }
+        print(f"   🛑 结束对话: {stop_reason}")
     
     return {
         "messages": [AIMessage(content=reply)],
-        "is_concluded": is_done,
+        "is_concluded": bool(stop_reason),
+        "stop_reason": stop_reason,
+        **usage,
         "diagnosis_trace": new_trace,
         "confidence_history": new_confidence,
         "eliminated_categories": list(set(new_eliminated)),
-        "final_diagnosis": final_diagnosis
+        "final_diagnosis": final_diagnosis,
+        "prefetched_expert": None
     }
 
 
 # =======================================================
 # 👤 小白回复节点
 # =======================================================
-def novice_node(state: SimulationState) -> dict:
+@timed_node("novice")
+@node_deadline("novice")
+@traced("graph.novice")
+def novice_node(state: SimulationState, llms: Optional[dict] = None,
+                prompts: Optional[dict] = None) -> dict:
     """小白根据专家追问进行回复"""
+    llms = llms or ROLE_LLMS
+    prompts = prompts or DEFAULT_PROMPTS
     if state["is_concluded"]:
         return {"messages": []}
     
-    mission = state["secret_mission"]
-    chain = novice_prompt | llm
+    chain = prompts["novice"] | llms["novice"]
     
-    response = chain.invoke({
-        "secret_user_intent": mission.get("novice_intent", ""),
-        "secret_category": mission.get("category", ""),
-        "persona_role": mission.get("persona", "普通人"),
-        "persona_tone": mission.get("tone", "焦虑"),
-        "messages": state["messages"]
-    })
+    response = chain.invoke(_novice_inputs(state, state["messages"]))
     
-    data = parse_json_robust(response.content)
+    with span("json.parse", node="novice") as parse_span:
+        data = parse_structured(response.content, NoviceReply, "novice", repair_llm=llms["novice"])
+        if parse_span is not None:
+            parse_span.set(ok=bool(data))
     
     if data:
         reply = data.get("response", str(data))
@@ -252,7 +333,95 @@ def novice_node(state: SimulationState) -> dict:
     
     return {
         "messages": [HumanMessage(content=reply)],
-        "turn_count": state["turn_count"] + 1
+        "turn_count": state["turn_count"] + 1,
+        **_usage_after(state, response)
+    }
+
+
+# =======================================================
+# 🌿 分支节点：同一轮并行探索 K 个追问
+# =======================================================
+@timed_node("branch")
+@node_deadline("branch")
+@traced("graph.branch")
+def branch_node(state: SimulationState, llms: Optional[dict] = None,
+                prompts: Optional[dict] = None) -> dict:
+    """
+    在 branch_turn 轮代替 novice_node 执行：
+    1. 专家针对当前局面再给出 K-1 个备选追问（分支 0 为专家实际问出的问题）
+    2. K 个小白回复并发生成（chain.batch）
+    3. K 个分支各自让专家再评估一次，记录置信度增益
+    主线沿分支 0 继续，其余分支只写入 branch_tree；分支 0 的专家评估就是主线下一轮的专家发言，
+    放进 prefetched_expert 由 expert_node 直接复用
+    """
+    llms = llms or ROLE_LLMS
+    prompts = prompts or DEFAULT_PROMPTS
+    k = max(state.get("branch_k", 0), 2)
+    history, current = state["messages"][:-1], state["messages"][-1]
+    before = (state.get("confidence_history") or [0.0])[-1]
+    responses = []
+    
+    # 1. 备选追问
+    questions = [{"question": current.content, "purpose": "expert_choice"}]
+    response = (prompts["branch"] | llms["expert"]).invoke({
+        "taxonomy_context": state["taxonomy_context"],
+        "messages": history,
+        "current_question": current.content,
+        "k": k - 1
+    })
+    responses.append(response)
+    data = parse_structured(response.content, BranchQuestions, "branch")
+    if data:
+        questions += data["questions"][:k - 1]
+    
+    # 2. 各分支的小白回复（并发）
+    branch_messages = [history + [AIMessage(content=q["question"])] for q in questions]
+    novice_replies = (prompts["novice"] | llms["novice"]).batch(
+        [_novice_inputs(state, msgs) for msgs in branch_messages],
+        config={"max_concurrency": len(questions)}
+    )
+    responses += novice_replies
+    replies = []
+    for r in novice_replies:
+        parsed = parse_structured(r.content, NoviceReply, "novice")
+        replies.append(parsed["response"] if parsed else r.content)
+    
+    # 3. 每个分支让专家评估一次，计算置信度增益（并发）
+    expert_evals = (prompts["expert"] | llms["expert"]).batch(
+        [_expert_inputs(state, msgs + [HumanMessage(content=reply)])
+         for msgs, reply in zip(branch_messages, replies)],
+        config={"max_concurrency": len(questions)}
+    )
+    responses += expert_evals
+    
+    branches = []
+    for q, reply, r in zip(questions, replies, expert_evals):
+        parsed = parse_structured(r.content, ExpertReply, "expert") or {}
+        reasoning = parsed.get("diagnosis_reasoning", {})
+        after = reasoning.get("confidence", before)
+        branches.append({
+            "question": q["question"],
+            "purpose": q.get("purpose", ""),
+            "novice_reply": reply,
+            "confidence_after": after,
+            "gain": round(after - before, 4),
+            "hypotheses": reasoning.get("current_hypotheses", []),
+            "matched_service": parsed.get("analysis_data", {}).get("matched_service", "")
+        })
+    best = max(range(len(branches)), key=lambda i: branches[i]["gain"])
+    print(f"   🌿 分支探索 (T{state['turn_count']}): {len(branches)} 个追问，最佳增益 {branches[best]['gain']:+.2f}")
+    
+    return {
+        "messages": [HumanMessage(content=replies[0])],
+        "turn_count": state["turn_count"] + 1,
+        **_usage_after(state, *responses),
+        "prefetched_expert": {"turn": state["turn_count"] + 1, "content": expert_evals[0].content},
+        "branch_tree": state.get("branch_tree", []) + [{
+            "turn": state["turn_count"],
+            "confidence_before": before,
+            "best_branch": best,
+            "branches": branches
+        }]
     }
 
 
@@ -263,7 +432,7 @@ def should_continue(state: SimulationState) -> str:
     """判断是否继续对话"""
     # 如果已经结束
     if state.get("is_concluded", False):
-        print(f"   ✅ 诊断完成! 总轮次: {state['turn_count']}")
+        print(f"   ✅ 诊断完成! 总轮次: {state['turn_count']} ({state.get('stop_reason') or 'concluded'})")
         return "end"
     
     # 如果超过最大轮次
@@ -276,37 +445,111 @@ def should_continue(state: SimulationState) -> str:
     return "continue"
 
 
+def route_after_expert(state: SimulationState) -> str:
+    """专家发言后：结束 / 分支探索 / 正常小白回复"""
+    if should_continue(state) == "end":
+        return "end"
+    if state.get("branch_k", 0) > 1 and state.get("branch_turn") == state["turn_count"]:
+        return "branch"
+    return "continue"
+
+
 # =======================================================
 # 🔄 组装工作流 (多轮循环版)
 # =======================================================
-workflow = StateGraph(SimulationState)
+# 批量仿真的检查点：每个节点结束后保存状态，失败重试时从失败的节点继续（仿真结束后按 thread_id 清理）
+CHECKPOINTER = MemorySaver()
 
-# 添加节点
-workflow.add_node("opening", generate_opening_node)
-workflow.add_node("expert", expert_node)
-workflow.add_node("novice", novice_node)
+# 续跑时以哪个节点的名义写回状态，使下一步恰好是中断的节点（opening 没有前驱，直接从头跑）
+RESUME_AS_NODE = {"expert": "opening", "novice": "expert", "branch": "expert"}
 
-# 设置入口：先生成开场白
-workflow.set_entry_point("opening")
 
-# 开场白后进入专家诊断
-workflow.add_edge("opening", "expert")
+def export_checkpoint(graph_app, config: dict) -> Optional[dict]:
+    """
+    中断时的检查点 → 可 JSON 序列化的 {"next": 待执行节点, "values": 状态}
 
-# 专家诊断后进入小白回复
-workflow.add_edge("expert", "novice")
+    用于把部分完成的对话写进死信队列，之后用 restore_checkpoint 原地续跑
+    """
+    snapshot = graph_app.get_state(config)
+    if not snapshot or not snapshot.values:
+        return None
+    values = dict(snapshot.values)
+    values["messages"] = messages_to_dict(values.get("messages", []))
+    return {"next": snapshot.next[0] if snapshot.next else None,
+            "values": json.loads(json.dumps(values, ensure_ascii=False, default=str))}
+
+
+def restore_checkpoint(graph_app, config: dict, checkpoint: dict) -> Optional[dict]:
+    """
+    把导出的检查点写回（需带 checkpointer 编译的工作流）
+
+    返回值：None 表示已写回，接着 invoke(None, config) 即从中断的节点继续；
+    中断在 opening（没有前驱节点）时返回恢复出的状态，作为 invoke 的初始输入
+    """
+    values = dict(checkpoint["values"])
+    values["messages"] = messages_from_dict(values.get("messages", []))
+    as_node = RESUME_AS_NODE.get(checkpoint.get("next"))
+    if as_node is None:
+        return values
+    graph_app.update_state(config, values, as_node=as_node)
+    return None
+
+
+def create_simulation_graph(stop_policy: Optional[StopPolicy] = None,
+                            roles: Optional[Dict[str, RoleConfig]] = None,
+                            prompts: Optional[dict] = None,
+                            checkpointer=None):
+    """
+    构建并编译多轮博弈工作流
+
+    stop_policy: 自定义停止策略，默认 default_stop_policy()
+    roles: 按角色覆盖模型配置，如 {"novice": {"model": "glm-4-flash", "max_tokens": 300}}
+           小白 / 开场白只做角色扮演，换成更小更快的模型可以明显降低每轮延迟和成本
+    prompts: 领域 Prompt（opening / expert / novice / branch），默认 HR，见 domain_registry.get_prompts
+    checkpointer: 检查点存储（如 CHECKPOINTER），设置后 invoke 必须带 configurable.thread_id
+    """
+    llms = build_role_llms(roles) if roles else ROLE_LLMS
+    workflow = StateGraph(SimulationState)
+
+    # 添加节点
+    workflow.add_node("opening", partial(generate_opening_node, llms=llms, prompts=prompts))
+    workflow.add_node("expert", partial(expert_node, stop_policy=stop_policy, llms=llms, prompts=prompts))
+    workflow.add_node("novice", partial(novice_node, llms=llms, prompts=prompts))
+    workflow.add_node("branch", partial(branch_node, llms=llms, prompts=prompts))
+
+    # 设置入口：先生成开场白
+    workflow.set_entry_point("opening")
+
+    # 开场白后进入专家诊断
+    workflow.add_edge("opening", "expert")
+
+    # 专家诊断后：停止策略命中则直接结束，不再浪费一次小白回复；到分支轮次则并行探索
+    workflow.add_conditional_edges(
+        "expert",
+        route_after_expert,
+        {
+            "continue": "novice",
+            "branch": "branch",
+            "end": END
+        }
+    )
+
+    # 小白回复（或分支探索）后，条件判断是否继续
+    for node in ("novice", "branch"):
+        workflow.add_conditional_edges(
+            node,
+            should_continue,
+            {
+                "continue": "expert",  # 继续下一轮追问
+                "end": END            # 结束对话
+            }
+        )
+
+    # 编译工作流
+    return workflow.compile(checkpointer=checkpointer)
 
-# 小白回复后，条件判断是否继续
-workflow.add_conditional_edges(
-    "novice",
-    should_continue,
-    {
-        "continue": "expert",  # 继续下一轮追问
-        "end": END            # 结束对话
-    }
-)
 
-# 编译工作流
-app = workflow.compile()
+app = create_simulation_graph()
 
 
 # =======================================================
@@ -339,7 +582,14 @@ def run_simulation_test():
         "key_questions": [],
         "eliminated_categories": [],
         "confidence_history": [],
-        "final_diagnosis": None
+        "final_diagnosis": None,
+        "stop_reason": None,
+        "tokens_used": 0,
+        "cost_used": 0.0,
+        "branch_turn": None,
+        "branch_k": 0,
+        "branch_tree": [],
+        "prefetched_expert": None
     }
     
     config = {"recursion_limit": 50}
@@ -350,6 +600,7 @@ def run_simulation_test():
     print(f"   总轮次: {final_state['turn_count']}")
     print(f"   置信度曲线: {final_state.get('confidence_history', [])}")
     print(f"   排除分类: {final_state.get('eliminated_categories', [])}")
+    print(f"   停止原因: {final_state.get('stop_reason')} (tokens: {final_state.get('tokens_used', 0)})")
     
     if final_state.get("final_diagnosis"):
         fd = final_state["final_diagnosis"]
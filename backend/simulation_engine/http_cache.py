@@ -0,0 +1,110 @@
+"""
+🗜️ HTTP Cache - 条件请求 + 预压缩响应体
+======================================
+核心职责：
+1. CachedBody：一份序列化好的响应体，gzip / brotli 编码按需计算一次后缓存（随存储版本一起失效）
+2. strong_etag：按内容哈希生成强 ETag；不同内容编码的表示在 ETag 后加 -gzip / -br 后缀
+3. cached_response：If-None-Match 命中直接 304（不序列化、不压缩），否则按 Accept-Encoding 选编码
+
+brotli 为可选依赖：未安装时只提供 gzip。
+"""
+
+import gzip
+import hashlib
+import threading
+from typing import Callable, Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    brotli = None
+    BROTLI_AVAILABLE = False
+
+# 小于这个大小的响应体不压缩（压缩收益抵不上头部和 CPU 开销）
+MIN_COMPRESS_SIZE = 1024
+
+
+def strong_etag(data: bytes) -> str:
+    return '"' + hashlib.sha256(data).hexdigest()[:32] + '"'
+
+
+class CachedBody:
+    """一个版本的响应体及其压缩编码"""
+
+    def __init__(self, data: bytes, etag: Optional[str] = None, media_type: str = "application/json"):
+        self.data = data
+        self.etag = etag or strong_etag(data)
+        self.media_type = media_type
+        self._encoded: Dict[str, bytes] = {"identity": data}
+        self._lock = threading.Lock()
+
+    def encoded(self, encoding: str) -> bytes:
+        with self._lock:
+            if encoding not in self._encoded:
+                if encoding == "br":
+                    self._encoded[encoding] = brotli.compress(self.data, quality=5)
+                elif encoding == "gzip":
+                    self._encoded[encoding] = gzip.compress(self.data, compresslevel=6)
+                else:
+                    raise ValueError(f"不支持的编码: {encoding}")
+            return self._encoded[encoding]
+
+    def etag_for(self, encoding: str) -> str:
+        return self.etag if encoding == "identity" else f'{self.etag[:-1]}-{encoding}"'
+
+
+def _accepted_encodings(request: Request) -> set:
+    accepted = set()
+    for part in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = part.strip().partition(";")
+        if name and params.replace(" ", "") not in ("q=0", "q=0.0"):
+            accepted.add(name.lower())
+    return accepted
+
+
+def choose_encoding(request: Request, size: int) -> str:
+    if size < MIN_COMPRESS_SIZE:
+        return "identity"
+    accepted = _accepted_encodings(request)
+    if BROTLI_AVAILABLE and "br" in accepted:
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return "identity"
+
+
+def not_modified(request: Request, etag: str) -> bool:
+    """If-None-Match 是否命中（任一内容编码的表示都算）"""
+    header = request.headers.get("if-none-match", "")
+    if not header:
+        return False
+    base = etag[:-1]
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == "*" or tag == etag or (tag.startswith(base + "-") and tag.endswith('"')):
+            return True
+    return False
+
+
+def cached_response(request: Request, etag: str, body: Callable[[], CachedBody],
+                    headers: Optional[dict] = None) -> Response:
+    """
+    条件请求 + 内容协商
+
+    etag: 当前版本的 ETag（不需要先生成响应体就能算出来）；body: 命中失败时才调用
+    """
+    headers = {"Cache-Control": "no-cache", "Vary": "Accept-Encoding", **(headers or {})}
+    if not_modified(request, etag):
+        return Response(status_code=304, headers={**headers, "ETag": etag})
+    cached = body()
+    encoding = choose_encoding(request, len(cached.data))
+    headers["ETag"] = cached.etag_for(encoding)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(cached.encoded(encoding), media_type=cached.media_type, headers=headers)
@@ -0,0 +1,93 @@
+"""
+🔌 HTTP Pool - 所有 LLM 客户端共享的连接池
+===========================================
+核心职责：
+1. 进程内一个同步 + 一个异步 httpx 客户端，keep-alive 复用 TCP/TLS 连接
+2. 安装了 h2 时启用 HTTP/2（同一连接多路复用并发请求）
+3. 连接池大小 / 超时可用环境变量调整
+4. 注入到每一个 ChatOpenAI，批量运行时不再每次调用都重新握手
+
+环境变量：
+- LLM_HTTP_MAX_CONNECTIONS   最大连接数（默认 100）
+- LLM_HTTP_MAX_KEEPALIVE     保持的空闲连接数（默认 20）
+- LLM_HTTP_KEEPALIVE_EXPIRY  空闲连接保留秒数（默认 60）
+- LLM_HTTP_TIMEOUT           单次请求超时秒数（默认 120）
+- LLM_HTTP2                  0 关闭 HTTP/2（默认开启，需要 h2）
+"""
+
+import importlib.util
+import os
+import threading
+from typing import Optional
+
+import httpx
+
+_sync_client: Optional[httpx.Client] = None
+_async_client: Optional[httpx.AsyncClient] = None
+_lock = threading.Lock()
+
+
+def _http2_enabled() -> bool:
+    if os.getenv("LLM_HTTP2", "1") == "0":
+        return False
+    return importlib.util.find_spec("h2") is not None
+
+
+def _client_options() -> dict:
+    return {
+        "limits": httpx.Limits(
+            max_connections=int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "20")),
+            keepalive_expiry=float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "60")),
+        ),
+        "timeout": httpx.Timeout(float(os.getenv("LLM_HTTP_TIMEOUT", "120")), connect=10.0),
+        "http2": _http2_enabled(),
+    }
+
+
+def get_sync_client() -> httpx.Client:
+    global _sync_client
+    with _lock:
+        if _sync_client is None or _sync_client.is_closed:
+            _sync_client = httpx.Client(**_client_options())
+        return _sync_client
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """注意：异步连接绑定在首次使用它的事件循环上（FastAPI 进程内只有一个循环）"""
+    global _async_client
+    with _lock:
+        if _async_client is None or _async_client.is_closed:
+            _async_client = httpx.AsyncClient(**_client_options())
+        return _async_client
+
+
+def openai_client_kwargs() -> dict:
+    """
+    传给 ChatOpenAI 的客户端参数
+
+    旧版 langchain-openai 只有 http_client（同步）；新版另有 http_async_client
+    """
+    from langchain_openai import ChatOpenAI
+    fields = getattr(ChatOpenAI, "model_fields", None) or getattr(ChatOpenAI, "__fields__", {})
+    kwargs = {"http_client": get_sync_client()}
+    if "http_async_client" in fields:
+        kwargs["http_async_client"] = get_async_client()
+    return kwargs
+
+
+def gemini_transport() -> str:
+    """Gemini 默认走 gRPC（长连接 + HTTP/2），GEMINI_TRANSPORT=rest 可切回"""
+    return os.getenv("GEMINI_TRANSPORT", "grpc")
+
+
+async def aclose_clients():
+    """进程退出时关闭连接池（FastAPI shutdown 钩子）"""
+    global _sync_client, _async_client
+    with _lock:
+        sync_client, _sync_client = _sync_client, None
+        async_client, _async_client = _async_client, None
+    if sync_client is not None:
+        sync_client.close()
+    if async_client is not None:
+        await async_client.aclose()
@@ -0,0 +1,232 @@
+"""
+📬 Inbox Store - ETL 收件箱（processing_log.json）的进程内存储 + 变更序列号
+=======================================================================
+核心职责：
+1. 收件箱内容按文件 mtime 缓存在内存里，轮询不再每次读盘、反序列化整个文件
+2. 每个存储一个单调递增的序列号 seq：新增 / 修改的记录记下自己的 seq，删除的记录留墓碑
+3. changes(since) 只返回 since 之后新增、修改、删除的记录（增量同步）
+4. 其他进程（etl_factory/ingest.py、旧脚本）直接改文件时，按 mtime 发现并与内存快照逐条比对生成变更
+5. 本进程内的新增 / 删除同时发布 inbox.added / inbox.removed 事件（/ws/events）
+
+seq 只在本进程内有效：进程重启后 epoch 变化，客户端带旧 epoch 来时返回全量（full=True）。
+墓碑最多保留 MAX_TOMBSTONES 条，since 早于被清理的墓碑时同样返回全量。
+
+写入方：main.save_simulation_to_etl / _ingest_items、BatchRunner.save_to_inbox，统一走 insert / remove，
+文件写入持有 write_lock("inbox")。
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from .domain_registry import BACKEND_DIR, DEFAULT_DOMAIN, write_json, write_lock
+from .events import publish
+from .http_cache import CachedBody
+from .metrics import timed, FILE_WRITE_LATENCY
+
+INBOX_FILE = BACKEND_DIR.parent / "etl_factory" / "processing_log.json"
+MAX_TOMBSTONES = 5000
+
+
+def _key(record: dict) -> str:
+    return record.get("id") or "sha1:" + hashlib.sha1(
+        json.dumps(record, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _fingerprint(record: dict) -> str:
+    return hashlib.sha1(json.dumps(record, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _domain_of(record: dict) -> str:
+    return record.get("domain", DEFAULT_DOMAIN)
+
+
+class InboxStore:
+    """收件箱存储：内存快照 + 变更序列号"""
+
+    def __init__(self, path: Path = INBOX_FILE):
+        self.path = Path(path)
+        self.epoch = format(int(time.time() * 1000), "x")
+        self.seq = 0
+        self._lock = threading.RLock()
+        self._records: List[dict] = []
+        self._mtime: Optional[int] = None
+        self._changed: Dict[str, int] = {}        # key → 最近一次新增 / 修改的 seq
+        self._fingerprints: Dict[str, str] = {}
+        self._tombstones: "OrderedDict[str, tuple]" = OrderedDict()  # key → (seq, domain)
+        self._horizon = 0                          # 已清理墓碑中最大的 seq
+        self._rendered: Dict[Optional[str], CachedBody] = {}  # 领域 → 当前 seq 下序列化好的全量 JSON
+        self._rendered_seq = -1
+
+    # ------------------------------------------------------------------
+    # 读取 / 外部修改检测
+    # ------------------------------------------------------------------
+    def _file_mtime(self) -> Optional[int]:
+        try:
+            return self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _read_file(self) -> Optional[List[dict]]:
+        if not self.path.exists():
+            return []
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            # 其他进程写到一半：保留内存快照，下次再读
+            print(f"⚠️ 收件箱读取失败: {e}")
+            return None
+        return data if isinstance(data, list) else []
+
+    def _sync(self):
+        """文件 mtime 变化时重新加载，与内存快照比对生成变更（调用方持有 self._lock）"""
+        mtime = self._file_mtime()
+        if mtime == self._mtime:
+            return
+        records = self._read_file()
+        if records is not None:
+            self._mtime = mtime
+            self._apply_snapshot(records)
+
+    def _apply_snapshot(self, records: List[dict]):
+        fingerprints = {}
+        for record in records:
+            key = _key(record)
+            fingerprints[key] = _fingerprint(record)
+            if self._fingerprints.get(key) != fingerprints[key]:
+                self._touch(key)
+        old_domains = {_key(r): _domain_of(r) for r in self._records}
+        for key in self._fingerprints.keys() - fingerprints.keys():
+            self._bury(key, old_domains.get(key, DEFAULT_DOMAIN))
+        self._records = records
+        self._fingerprints = fingerprints
+
+    def _touch(self, key: str):
+        self.seq += 1
+        self._changed[key] = self.seq
+        self._tombstones.pop(key, None)
+
+    def _bury(self, key: str, domain: str):
+        self.seq += 1
+        self._changed.pop(key, None)
+        self._tombstones[key] = (self.seq, domain)
+        self._tombstones.move_to_end(key)
+        while len(self._tombstones) > MAX_TOMBSTONES:
+            _, (seq, _) = self._tombstones.popitem(last=False)
+            self._horizon = max(self._horizon, seq)
+
+    def _write(self):
+        """整文件写回（调用方持有 write_lock("inbox") 与 self._lock）"""
+        with timed(FILE_WRITE_LATENCY, file="inbox"):
+            write_json(self.path, self._records)
+        self._mtime = self._file_mtime()
+
+    # ------------------------------------------------------------------
+    # 公开接口
+    # ------------------------------------------------------------------
+    def records(self, domain: Optional[str] = None) -> List[dict]:
+        """当前全部记录（带领域时只返回该领域的记录）；返回的是内存快照，调用方不要修改"""
+        with self._lock:
+            self._sync()
+            if domain:
+                return [r for r in self._records if _domain_of(r) == domain]
+            return list(self._records)
+
+    def version(self) -> tuple:
+        """(epoch, seq)：ETag 用，检查文件是否被外部修改过"""
+        with self._lock:
+            self._sync()
+            return self.epoch, self.seq
+
+    def etag(self, domain: Optional[str] = None) -> str:
+        epoch, seq = self.version()
+        return f'"inbox-{domain or "all"}-{epoch}-{seq}"'
+
+    def rendered(self, domain: Optional[str] = None) -> CachedBody:
+        """全量 JSON（按 seq 缓存序列化及压缩结果，同一版本只做一次）"""
+        with self._lock:
+            self._sync()
+            if self._rendered_seq != self.seq:
+                self._rendered, self._rendered_seq = {}, self.seq
+            if domain not in self._rendered:
+                self._rendered[domain] = CachedBody(
+                    json.dumps(self.records(domain), ensure_ascii=False).encode("utf-8"), etag=self.etag(domain))
+            return self._rendered[domain]
+
+    def changes(self, since: int = 0, epoch: Optional[str] = None, domain: Optional[str] = None) -> dict:
+        """
+        since 之后的变更：
+            {"epoch", "seq", "full", "upserts": [记录...], "removed": [id...]}
+
+        full=True 表示客户端需要丢弃本地数据，upserts 即全量（epoch 不符 / since 太旧 / 首次同步）
+        """
+        with self._lock:
+            self._sync()
+            full = since <= 0 or epoch != self.epoch or since < self._horizon or since > self.seq
+            if full:
+                since = 0
+            upserts = [
+                r for r in self._records
+                if self._changed.get(_key(r), 0) > since and (not domain or _domain_of(r) == domain)
+            ]
+            removed = [] if full else [
+                key for key, (seq, dom) in self._tombstones.items()
+                if seq > since and (not domain or dom == domain)
+            ]
+            return {"epoch": self.epoch, "seq": self.seq, "full": full, "upserts": upserts, "removed": removed}
+
+    def insert(self, records: Iterable[dict], front: bool = True):
+        """新增记录（默认插到最前面，与原收件箱顺序一致）"""
+        records = list(records)
+        with write_lock("inbox"), self._lock:
+            self._sync()
+            self._records = records + self._records if front else self._records + records
+            for record in records:
+                key = _key(record)
+                self._fingerprints[key] = _fingerprint(record)
+                self._touch(key)
+            self._write()
+            seq = self.seq
+        for record in records:
+            publish("inbox.added", _domain_of(record), id=record.get("id"),
+                    query=(record.get("query") or "")[:80], seq=seq)
+
+    def remove(self, ids: Iterable[str]) -> int:
+        """按 id 删除记录，返回删除条数"""
+        ids = set(ids)
+        if not ids:
+            return 0
+        with write_lock("inbox"), self._lock:
+            self._sync()
+            kept, dropped = [], []
+            for record in self._records:
+                (dropped if record.get("id") in ids else kept).append(record)
+            if dropped:
+                self._records = kept
+                for record in dropped:
+                    key = _key(record)
+                    self._fingerprints.pop(key, None)
+                    self._bury(key, _domain_of(record))
+                self._write()
+            seq = self.seq
+        for record in dropped:
+            publish("inbox.removed", _domain_of(record), id=record.get("id"), seq=seq)
+        return len(dropped)
+
+
+_stores: Dict[Path, InboxStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_inbox_store(path: Optional[Path] = None) -> InboxStore:
+    """按文件路径复用 InboxStore（同一进程内所有写入方共享一个序列号）"""
+    path = Path(path or INBOX_FILE).resolve()
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = InboxStore(path)
+        return _stores[path]
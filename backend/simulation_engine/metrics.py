@@ -0,0 +1,307 @@
+"""
+📈 Metrics - 进程内指标注册表 (Prometheus 文本格式)
+===================================================
+核心职责：
+1. 轻量级 Counter / Histogram（线程安全，无外部依赖）
+2. 图节点耗时、LLM 调用耗时（按 provider / model / 节点）
+3. Token 用量、JSON 解析失败、Provider 故障切换次数（切换由 router.py 计数；token 同时交给 usage.py 按价格表计费）
+4. 入库耗时、文件写入耗时
+
+暴露方式：main.py 的 GET /metrics 直接返回 REGISTRY.render()
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# 默认桶：覆盖从毫秒级文件写入到几十秒的 LLM 长输出
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+# 当前正在执行的图节点（供 LLM 回调打标签）
+current_node: ContextVar[str] = ContextVar("current_node", default="")
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    """单调递增计数器"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def samples(self) -> List[Tuple[Tuple[str, ...], float]]:
+        with self._lock:
+            return list(self._values.items())
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        for key, value in self.samples():
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+
+
+class Histogram:
+    """累计分桶直方图"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key → [各桶计数..., sum, count]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def summary(self, **labels) -> Dict[str, float]:
+        """返回 {"count", "sum"}（用于状态接口展示平均值）"""
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            state = self._values.get(key)
+            if not state:
+                return {"count": 0, "sum": 0.0}
+            return {"count": state[-1], "sum": state[-2]}
+
+    def samples(self) -> List[Tuple[Tuple[str, ...], List[float]]]:
+        with self._lock:
+            return [(k, list(v)) for k, v in self._values.items()]
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        for key, state in self.samples():
+            for i, bound in enumerate(self.buckets):
+                labels = _format_labels(self.labelnames, key, f'le="{bound}"')
+                yield f"{self.name}_bucket{labels} {state[i]}"
+            labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            yield f"{self.name}_bucket{labels} {state[-1]}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {state[-2]}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {state[-1]}"
+
+
+class MetricsRegistry:
+    """指标注册表（同名指标只注册一次）"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# =======================================================
+# 📊 预定义指标
+# =======================================================
+NODE_LATENCY = REGISTRY.histogram(
+    "meseeing_graph_node_seconds", "图节点执行耗时", ["node"])
+LLM_LATENCY = REGISTRY.histogram(
+    "meseeing_llm_request_seconds", "单次 LLM 调用耗时", ["provider", "model", "node"])
+LLM_TOKENS = REGISTRY.counter(
+    "meseeing_llm_tokens_total", "LLM token 用量", ["provider", "model", "kind"])
+LLM_ERRORS = REGISTRY.counter(
+    "meseeing_llm_errors_total", "LLM 调用失败次数", ["provider", "model"])
+FALLBACK_ACTIVATIONS = REGISTRY.counter(
+    "meseeing_llm_fallback_activations_total", "Provider 故障切换次数", ["from_provider", "to_provider"])
+JSON_PARSE_FAILURES = REGISTRY.counter(
+    "meseeing_json_parse_failures_total", "模型输出 JSON 解析失败次数", ["node"])
+SIMULATION_ERRORS = REGISTRY.counter(
+    "meseeing_simulation_errors_total", "仿真失败次数（重试耗尽或不可重试）", ["domain", "error_class"])
+SIMULATION_RETRIES = REGISTRY.counter(
+    "meseeing_simulation_retries_total", "仿真从失败节点重试的次数", ["error_class", "node"])
+SIMULATION_LATENCY = REGISTRY.histogram(
+    "meseeing_simulation_seconds", "单次完整仿真耗时", ["domain", "outcome"])
+INGEST_LATENCY = REGISTRY.histogram(
+    "meseeing_ingest_seconds", "知识入库耗时", ["domain", "path"])
+FILE_WRITE_LATENCY = REGISTRY.histogram(
+    "meseeing_file_write_seconds", "JSON 文件写入耗时", ["file"])
+
+
+@contextmanager
+def timed(histogram: Histogram, **labels):
+    """with timed(FILE_WRITE_LATENCY, file="inbox"): ..."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - start, **labels)
+
+
+def timed_node(node: str):
+    """图节点装饰器：记录节点耗时，并让节点内的 LLM 调用带上节点标签"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            token = current_node.set(node)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                NODE_LATENCY.observe(time.perf_counter() - start, node=node)
+                current_node.reset(token)
+        return wrapper
+    return decorator
+
+
+# =======================================================
+# 🔢 Token 用量提取（兼容 OpenAI / Gemini 的不同字段）
+# =======================================================
+def _usage_from_dict(usage: Optional[dict]) -> Tuple[int, int]:
+    if not usage:
+        return 0, 0
+    prompt = (usage.get("prompt_tokens") or usage.get("input_tokens")
+              or usage.get("prompt_token_count") or 0)
+    completion = (usage.get("completion_tokens") or usage.get("output_tokens")
+                  or usage.get("candidates_token_count") or 0)
+    return int(prompt), int(completion)
+
+
+def extract_token_usage(message) -> Tuple[int, int]:
+    """从 AIMessage 中提取 (prompt_tokens, completion_tokens)，取不到返回 (0, 0)"""
+    usage = getattr(message, "usage_metadata", None)
+    if usage:
+        return _usage_from_dict(dict(usage))
+    metadata = getattr(message, "response_metadata", None) or {}
+    return _usage_from_dict(metadata.get("token_usage") or metadata.get("usage_metadata"))
+
+
+def usage_from_llm_result(response) -> Tuple[int, int]:
+    """从回调收到的 LLMResult 中提取 (prompt_tokens, completion_tokens)"""
+    prompt_tokens, completion_tokens = _usage_from_dict((response.llm_output or {}).get("token_usage"))
+    if prompt_tokens or completion_tokens:
+        return prompt_tokens, completion_tokens
+    for generations in response.generations or []:
+        for gen in generations:
+            message = getattr(gen, "message", None)
+            if message is not None:
+                p, c = extract_token_usage(message)
+                prompt_tokens += p
+                completion_tokens += c
+    return prompt_tokens, completion_tokens
+
+
+def _provider_from_serialized(serialized: Optional[dict], metadata: Optional[dict]) -> str:
+    if metadata and metadata.get("ls_provider"):
+        return metadata["ls_provider"]
+    class_name = ((serialized or {}).get("id") or [""])[-1]
+    if "Google" in class_name:
+        return "google"
+    if "OpenAI" in class_name:
+        return "openai"
+    return class_name.lower() or "unknown"
+
+
+def _model_from_params(params: Optional[dict], metadata: Optional[dict]) -> str:
+    if metadata and metadata.get("ls_model_name"):
+        return metadata["ls_model_name"]
+    params = params or {}
+    return str(params.get("model") or params.get("model_name") or "unknown")
+
+
+# =======================================================
+# 📡 LangChain 回调：LLM 耗时 / token / 错误
+# =======================================================
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """挂在 LLM 上，自动记录每次调用的指标"""
+
+    def __init__(self):
+        self._runs: Dict[object, Tuple[float, str, str, str]] = {}
+        self._lock = threading.Lock()
+
+    def _start(self, serialized, run_id, kwargs):
+        provider = _provider_from_serialized(serialized, kwargs.get("metadata"))
+        model = _model_from_params(kwargs.get("invocation_params"), kwargs.get("metadata"))
+        with self._lock:
+            self._runs[run_id] = (time.perf_counter(), provider, model, current_node.get())
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        self._start(serialized, run_id, kwargs)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs):
+        self._start(serialized, run_id, kwargs)
+
+    def on_llm_end(self, response, *, run_id, parent_run_id=None, **kwargs):
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        start, provider, model, node = run
+        LLM_LATENCY.observe(time.perf_counter() - start, provider=provider, model=model, node=node)
+
+        prompt_tokens, completion_tokens = usage_from_llm_result(response)
+        if prompt_tokens:
+            LLM_TOKENS.inc(prompt_tokens, provider=provider, model=model, kind="prompt")
+        if completion_tokens:
+            LLM_TOKENS.inc(completion_tokens, provider=provider, model=model, kind="completion")
+        if prompt_tokens or completion_tokens:
+            from .usage import record_usage  # usage 依赖本模块的 REGISTRY，延迟导入
+            record_usage(provider, model, prompt_tokens, completion_tokens)
+
+    def on_llm_error(self, error, *, run_id, parent_run_id=None, **kwargs):
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is not None:
+            LLM_ERRORS.inc(provider=run[1], model=run[2])
+
+
+metrics_callback = MetricsCallbackHandler()
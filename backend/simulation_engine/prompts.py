@@ -73,7 +73,7 @@ system_template = """你是一位资深的人力资源诊断专家。你的任
 }}
 
 【⚠️ 重要规则】
-1. 前 3 轮必须保持 status: "active"，继续追问
+1. 信息不足时保持 status: "active"，继续追问
 2. 不要在第一轮就给出诊断，必须至少追问 2 个问题
 3. 问题要用口语化表达，让客户容易理解
 4. 当 confidence >= 0.85 时，可以设置 status: "concluded"
@@ -169,4 +169,30 @@ opening_template = """为一个正在咨询HR问题的普通人生成开场白
 
 请直接输出开场白，不需要任何格式："""
 
-opening_prompt = ChatPromptTemplate.from_template(opening_template)
\ No newline at end of file
+opening_prompt = ChatPromptTemplate.from_template(opening_template)
+
+# =============================================================================
+# 🌿 分支追问生成器 - 同一轮给出 K 个备选问题（用于挖掘信息增益）
+# =============================================================================
+branch_questions_template = """你是一位资深的人力资源诊断专家，正在与客户对话。
+
+【你的专业知识库】
+{taxonomy_context}
+
+【对话历史】
+{messages}
+
+你刚才准备问的问题是：{current_question}
+
+请再给出 {k} 个**不同角度**的备选追问，每个问题都应尽量排除或确认不同的服务分类假设。
+问题要口语化，客户能直接回答，不要与上面的问题重复。
+
+【📋 输出格式 (严格 JSON)】
+{{
+  "questions": [
+    {{"question": "追问内容", "purpose": "这个问题要排除/确认哪个分类"}}
+  ]
+}}
+"""
+
+branch_questions_prompt = ChatPromptTemplate.from_template(branch_questions_template)
@@ -0,0 +1,526 @@
+"""
+🧭 LLM Router - 多 Provider 负载均衡路由
+========================================
+核心职责：
+1. 统一管理已配置的 Provider：Gemini、GLM-4（OPENAI_API_BASE）、任意 OpenAI 兼容的本地端点
+2. 按观测到的 p50 延迟、错误率、剩余配额给每个 Provider 打分，加权随机分流
+3. 熔断器：连续失败后短时间内不再路由到该 Provider，冷却后半开试探
+4. 对冲请求：首选 Provider 超过其 p95 延迟仍未返回时，向次选 Provider 并发发起同一请求，先到先用
+5. 按节点路由：LLM_ROUTE_<NODE>=glm,local 指定某个节点可用的 Provider 及优先顺序
+6. 协作式取消：当前线程带取消令牌（cancellation.current_token）时，请求在路由线程池里执行，
+   调用方等待期间令牌被取消则立即放弃这次请求（不再等响应、不再切换 Provider），暂停时不再发起新请求
+7. 截止时间（deadlines.py）：每次请求最多等 min(Provider 超时, 节点剩余, 仿真剩余) 秒，从请求在线程池里
+   真正开始执行时计时（排队时间只受节点 / 仿真截止时间约束，不算该 Provider 的失败）；
+   单次请求超时计入该 Provider 的失败并切换到下一个，节点 / 仿真超时直接抛出
+
+Provider 配置（环境变量）：
+- GOOGLE_API_KEY                      → gemini
+- OPENAI_API_KEY / OPENAI_API_BASE    → glm（OPENAI_MODEL，默认 glm-4）
+- LOCAL_LLM_BASE                      → local（LOCAL_LLM_MODEL / LOCAL_LLM_API_KEY / LOCAL_LLM_JSON_MODE）
+- <NAME>_RPM                          → 每分钟请求配额（如 GLM_RPM=60），不配置视为不限
+- <NAME>_TIMEOUT                      → 单次请求超时秒数（默认 LLM_CALL_TIMEOUT，见 deadlines.py）
+"""
+
+import contextvars
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, List, Optional
+
+from langchain_core.runnables import Runnable
+
+from .metrics import REGISTRY, FALLBACK_ACTIVATIONS, metrics_callback, current_node
+from .cancellation import SimulationCancelled, current_token
+from .deadlines import DEADLINE_EXCEEDED, DeadlineExceeded, call_timeout, provider_timeout, remaining
+from .usage import current_provider
+from .tracing import tracing_callback
+from .structured import json_mode_openai, json_mode_google
+from .http_pool import openai_client_kwargs, gemini_transport
+
+ROUTER_DECISIONS = REGISTRY.counter(
+    "meseeing_router_decisions_total", "路由选择次数", ["node", "provider"])
+HEDGED_REQUESTS = REGISTRY.counter(
+    "meseeing_router_hedged_requests_total", "对冲请求次数", ["node", "winner"])
+CIRCUIT_OPENED = REGISTRY.counter(
+    "meseeing_router_circuit_open_total", "熔断器打开次数", ["provider"])
+CALLS_ABANDONED = REGISTRY.counter(
+    "meseeing_router_abandoned_requests_total", "取消时放弃等待的 LLM 请求数", ["node"])
+
+WINDOW = 50                 # 延迟 / 错误率的滑动窗口
+DEFAULT_LATENCY = 3.0       # 还没有样本时的先验延迟（秒）
+MIN_HEDGE_SAMPLES = 10      # 样本足够才启用对冲
+RATE_LIMIT_COOLDOWN = 60    # 命中限流后暂停该 Provider 的秒数
+
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("LLM_ROUTER_THREADS", "32")),
+                               thread_name_prefix="llm-router")
+
+
+def _is_rate_limit(error: BaseException) -> bool:
+    text = f"{type(error).__name__} {error}".lower()
+    return "ratelimit" in text or "rate limit" in text or "429" in text or "quota" in text
+
+
+# =======================================================
+# ⚡ 熔断器
+# =======================================================
+class CircuitBreaker:
+    """closed → (连续失败 threshold 次) → open → (reset_timeout 后) → half_open → 成功则 closed"""
+
+    def __init__(self, name: str, threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        return self.state != "open"
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self, cooldown: Optional[float] = None):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold or self.state == "half_open" or cooldown:
+                if self.state != "open":
+                    CIRCUIT_OPENED.inc(provider=self.name)
+                # cooldown 用于限流：强制打开到配额恢复
+                self.opened_at = time.monotonic() - self.reset_timeout + (cooldown or self.reset_timeout)
+
+
+# =======================================================
+# 📡 Provider 与运行时统计
+# =======================================================
+class ProviderState:
+    """单个 Provider 的构造方式 + 延迟 / 错误 / 配额统计（所有节点共享）"""
+
+    def __init__(self, name: str, factory: Callable[..., Runnable], rpm: Optional[int] = None,
+                 model: str = ""):
+        self.name = name
+        self.factory = factory
+        self.rpm = rpm
+        self.model = model  # 没有按角色指定模型时使用的默认模型
+        self.breaker = CircuitBreaker(name)
+        self._latencies: deque = deque(maxlen=WINDOW)
+        self._outcomes: deque = deque(maxlen=WINDOW)
+        self._calls: deque = deque()
+        self._lock = threading.Lock()
+
+    def build(self, json_mode: bool = False, **overrides) -> Runnable:
+        return self.factory(json_mode=json_mode, **overrides)
+
+    # ---- 统计 ----
+    def record(self, latency: float, ok: bool):
+        with self._lock:
+            self._outcomes.append(ok)
+            if ok:
+                self._latencies.append(latency)
+
+    def note_call(self):
+        now = time.monotonic()
+        with self._lock:
+            self._calls.append(now)
+            while self._calls and now - self._calls[0] > 60:
+                self._calls.popleft()
+
+    @property
+    def sample_count(self) -> int:
+        return len(self._latencies)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._latencies)
+        if not samples:
+            return None
+        return samples[min(int(len(samples) * q), len(samples) - 1)]
+
+    @property
+    def error_rate(self) -> float:
+        with self._lock:
+            outcomes = list(self._outcomes)
+        return outcomes.count(False) / len(outcomes) if outcomes else 0.0
+
+    @property
+    def quota_remaining(self) -> Optional[int]:
+        if not self.rpm:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            recent = sum(1 for t in self._calls if now - t <= 60)
+        return max(self.rpm - recent, 0)
+
+    def score(self, prior: float = DEFAULT_LATENCY) -> float:
+        """越小越好：p50 延迟 × 错误率惩罚 × 配额紧张度；没有样本时用乐观先验，保证会被探索到"""
+        p50 = self.percentile(0.5) or prior
+        score = p50 * (1 + 5 * self.error_rate)
+        remaining = self.quota_remaining
+        if remaining is not None:
+            score *= 1 + self.rpm / (remaining + 1) / 10
+        return score
+
+    def snapshot(self) -> dict:
+        return {
+            "provider": self.name,
+            "p50_seconds": self.percentile(0.5),
+            "p95_seconds": self.percentile(0.95),
+            "error_rate": round(self.error_rate, 3),
+            "quota_remaining": self.quota_remaining,
+            "circuit": self.breaker.state,
+        }
+
+
+def _openai_factory(name: str, model: str, api_key: str, api_base: str, supports_json: bool = True):
+    def factory(json_mode: bool = False, temperature: float = 0.3, **kwargs):
+        from langchain_openai import ChatOpenAI
+        # HTTP 层超时与路由器的等待上限一致，被放弃的请求不会一直占着连接
+        llm = ChatOpenAI(model=kwargs.pop("model", model), temperature=temperature,
+                         openai_api_key=api_key, openai_api_base=api_base, timeout=provider_timeout(name),
+                         callbacks=[metrics_callback, tracing_callback],
+                         **openai_client_kwargs(), **kwargs)
+        return json_mode_openai(llm) if json_mode and supports_json else llm
+    return factory
+
+
+def _gemini_factory(api_key: str, model: str):
+    def factory(temperature: float = 0.3, json_mode: bool = False, **kwargs):
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        max_tokens = kwargs.pop("max_tokens", None)
+        if max_tokens:
+            kwargs["max_output_tokens"] = max_tokens
+        params = dict(model=kwargs.pop("model", model), temperature=temperature,
+                      google_api_key=api_key, convert_system_message_to_human=True,
+                      timeout=provider_timeout("gemini"),
+                      transport=gemini_transport(), callbacks=[metrics_callback, tracing_callback], **kwargs)
+        if json_mode:
+            llm = json_mode_google(**params)
+            if llm is not None:
+                return llm
+        return ChatGoogleGenerativeAI(**params)
+    return factory
+
+
+def _rpm(name: str) -> Optional[int]:
+    value = os.getenv(f"{name.upper()}_RPM")
+    return int(value) if value else None
+
+
+def discover_providers() -> Dict[str, ProviderState]:
+    """根据环境变量发现可用的 Provider（按 LLM_PROVIDER 偏好排序）"""
+    providers: Dict[str, ProviderState] = {}
+    if os.getenv("GOOGLE_API_KEY"):
+        model = "gemini-flash-latest"
+        providers["gemini"] = ProviderState("gemini", _gemini_factory(os.getenv("GOOGLE_API_KEY"), model),
+                                            rpm=_rpm("gemini"), model=model)
+    if os.getenv("OPENAI_API_KEY"):
+        model = os.getenv("OPENAI_MODEL", "glm-4")
+        providers["glm"] = ProviderState("glm", _openai_factory(
+            "glm", model, os.getenv("OPENAI_API_KEY"),
+            os.getenv("OPENAI_API_BASE", "https://open.bigmodel.cn/api/paas/v4/")), rpm=_rpm("glm"), model=model)
+    if os.getenv("LOCAL_LLM_BASE"):
+        model = os.getenv("LOCAL_LLM_MODEL", "local-model")
+        providers["local"] = ProviderState("local", _openai_factory(
+            "local", model, os.getenv("LOCAL_LLM_API_KEY", "not-needed"),
+            os.getenv("LOCAL_LLM_BASE"), supports_json=os.getenv("LOCAL_LLM_JSON_MODE", "0") == "1"),
+            rpm=_rpm("local"), model=model)
+
+    # 兼容旧配置：LLM_PROVIDER=google 表示 Gemini 优先
+    preferred = {"google": "gemini", "openai": "glm"}.get(os.getenv("LLM_PROVIDER", "openai").lower())
+    if preferred in providers:
+        providers = {preferred: providers[preferred], **{k: v for k, v in providers.items() if k != preferred}}
+    return providers
+
+
+# =======================================================
+# 🧭 路由器
+# =======================================================
+class LLMRouter(Runnable):
+    """
+    可以像普通 ChatModel 一样放进 prompt | router 链
+    选择：熔断未打开、配额未耗尽的 Provider 中，按 1/score 加权随机
+    失败：按分数顺序依次切换到其余 Provider
+    """
+
+    def __init__(self, node: str, members: List[tuple], hedge: bool = True):
+        # members: [(ProviderState, runnable), ...]，顺序即偏好顺序
+        self.node = node
+        self.members = members
+        self.hedge = hedge
+
+    def _ranked(self) -> List[tuple]:
+        usable = [m for m in self.members
+                  if m[0].breaker.allow() and m[0].quota_remaining != 0]
+        if not usable:
+            # 全部熔断 / 限流时仍按偏好顺序尝试，好过直接失败
+            return list(self.members)
+        known = [p.percentile(0.5) for p, _ in usable if p.sample_count]
+        prior = min(known) if known else DEFAULT_LATENCY
+        scores = [p.score(prior) for p, _ in usable]
+        first = random.choices(range(len(usable)), weights=[1 / max(sc, 1e-3) for sc in scores])[0]
+        rest = [usable[i] for i in sorted(range(len(usable)), key=lambda i: scores[i]) if i != first]
+        others = [m for m in self.members if m not in usable]
+        return [usable[first]] + rest + others
+
+    def _call(self, provider: ProviderState, runnable: Runnable, input, config):
+        provider.note_call()
+        start = time.perf_counter()
+        reset = current_provider.set(provider.name)  # 用量按路由的 Provider 名计费
+        try:
+            result = runnable.invoke(input, config)
+        except Exception as e:
+            provider.record(time.perf_counter() - start, ok=False)
+            provider.breaker.record_failure(RATE_LIMIT_COOLDOWN if _is_rate_limit(e) else None)
+            raise
+        finally:
+            current_provider.reset(reset)
+        provider.record(time.perf_counter() - start, ok=True)
+        provider.breaker.record_success()
+        return result
+
+    def _submit(self, member, input, config):
+        ctx = contextvars.copy_context()
+        # 线程池里的调用不再嵌套等待，取消由提交方的 _wait 负责
+        ctx.run(current_token.set, None)
+        started = threading.Event()
+
+        def run():
+            started.set()
+            return self._call(member[0], member[1], input, config)
+
+        future = _executor.submit(ctx.run, run)
+        future.started = started
+        return future
+
+    def _wait_started(self, future, provider: ProviderState):
+        """
+        等请求在线程池里真正开始执行：排队时间不算进单次请求超时，也不计入 Provider 的失败；
+        排队期间节点 / 仿真截止时间到了（或被取消）则撤回这次请求
+        """
+        outer = [(left, scope) for scope in ("node", "simulation") for left in [remaining(scope)] if left is not None]
+        limit, scope = min(outer) if outer else (None, None)
+        token = current_token.get()
+        if token is None:
+            future.started.wait(limit)
+        else:
+            with token.watch(future.started):
+                future.started.wait(limit)
+            if token.cancelled:
+                future.cancel()
+                token.raise_if_cancelled()
+        if not future.started.is_set():
+            future.cancel()
+            DEADLINE_EXCEEDED.inc(scope=scope, node=current_node.get() or self.node, provider=provider.name)
+            raise DeadlineExceeded(scope, limit)
+
+    def _wait(self, futures: list, timeout: Optional[float] = None):
+        """等任一请求完成（或超时）；当前令牌被取消时立即抛 SimulationCancelled，放弃这些请求"""
+        token = current_token.get()
+        if token is None:
+            return wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+        wakeup = threading.Event()
+        for future in futures:
+            future.add_done_callback(lambda _: wakeup.set())
+        with token.watch(wakeup):
+            wakeup.wait(timeout)
+        if token.cancelled:
+            abandoned = sum(1 for future in futures if not future.done())
+            if abandoned:
+                CALLS_ABANDONED.inc(abandoned, node=current_node.get() or self.node)
+            token.raise_if_cancelled()
+        return wait(futures, timeout=0, return_when=FIRST_COMPLETED)
+
+    def _timed_out(self, provider: ProviderState, timeout: float, scope: str):
+        """等待超过截止时间：计入该 Provider 的失败（影响评分与熔断），抛 DeadlineExceeded"""
+        DEADLINE_EXCEEDED.inc(scope=scope, node=current_node.get() or self.node, provider=provider.name)
+        provider.record(timeout, ok=False)
+        provider.breaker.record_failure()
+        raise DeadlineExceeded(scope, timeout)
+
+    def _invoke_bounded(self, member, input, config, node: str):
+        """在路由线程池里执行，开始执行后最多等 call_timeout 秒（同时响应取消令牌）"""
+        future = self._submit(member, input, config)
+        self._wait_started(future, member[0])
+        timeout, scope = call_timeout(member[0].name, node)
+        done, _ = self._wait([future], timeout=timeout)
+        if not done:
+            self._timed_out(member[0], timeout, scope)
+        return future.result()
+
+    def _invoke_hedged(self, primary, backup, input, config, node: str, tried: set):
+        """
+        首选超过 p95 仍未返回时向次选发起对冲，取先完成的成功结果；首选开始执行后两路合计最多等 call_timeout 秒
+
+        发起了对冲时把次选记入 tried，两路都失败后故障切换不再重试它
+        """
+        delay = primary[0].percentile(0.95)
+        first = self._submit(primary, input, config)
+        self._wait_started(first, primary[0])
+        start = time.monotonic()
+        timeout, scope = call_timeout(primary[0].name, node)
+        done, _ = self._wait([first], timeout=delay if timeout is None else min(delay, timeout))
+        if done:
+            return first.result()
+        if timeout is not None and timeout <= delay:
+            self._timed_out(primary[0], timeout, scope)
+
+        second = self._submit(backup, input, config)
+        tried.add(backup[0].name)
+        self._wait_started(second, backup[0])
+        pending = {first: primary, second: backup}
+        error = None
+        while pending:
+            left = None if timeout is None else timeout - (time.monotonic() - start)
+            if left is not None and left <= 0:
+                self._timed_out(primary[0], timeout, scope)
+            done, _ = self._wait(list(pending), timeout=left)
+            for future in done:
+                member = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                HEDGED_REQUESTS.inc(node=self.node, winner=member[0].name)
+                return result
+        raise error
+
+    def invoke(self, input, config=None, **kwargs):
+        node = current_node.get() or self.node
+        token = current_token.get()
+        ranked = self._ranked()
+        last_error, previous, tried = None, None, set()
+        for i, member in enumerate(ranked):
+            provider = member[0]
+            if provider.name in tried:
+                continue  # 对冲时已经作为次选试过
+            if token is not None:
+                token.checkpoint()  # 暂停时停在这里；已取消则不再发起新请求
+            timeout, _ = call_timeout(provider.name, node)  # 节点 / 仿真已超时则直接抛出
+            ROUTER_DECISIONS.inc(node=node, provider=provider.name)
+            if previous is not None:
+                FALLBACK_ACTIVATIONS.inc(from_provider=previous, to_provider=provider.name)
+            previous = provider.name
+            tried.add(provider.name)
+            try:
+                backup = ranked[i + 1] if i + 1 < len(ranked) else None
+                if (self.hedge and backup is not None and i == 0
+                        and provider.sample_count >= MIN_HEDGE_SAMPLES):
+                    return self._invoke_hedged(member, backup, input, config, node, tried)
+                if token is not None or timeout is not None:
+                    return self._invoke_bounded(member, input, config, node)
+                return self._call(provider, member[1], input, config)
+            except SimulationCancelled:
+                raise
+            except DeadlineExceeded as e:
+                if e.scope != "call":
+                    raise  # 节点 / 仿真的时间用完了，换 Provider 也来不及
+                last_error = e
+                print(f"   ⏱️ [{node}] {provider.name} 超过 {e.seconds:.1f}s 未响应，切换下一个")
+            except Exception as e:
+                last_error = e
+                print(f"   ⚠️ [{node}] {provider.name} 调用失败，切换下一个: {type(e).__name__}")
+        raise last_error
+
+
+# =======================================================
+# 🏭 构建
+# =======================================================
+_providers: Optional[Dict[str, ProviderState]] = None
+_providers_lock = threading.Lock()
+
+
+def get_providers() -> Dict[str, ProviderState]:
+    """Provider 在首次使用时发现（此时 .env 已加载），之后进程内共享统计"""
+    global _providers
+    with _providers_lock:
+        if _providers is None:
+            _providers = discover_providers()
+        return _providers
+
+
+def parse_model_spec(spec: Optional[str]) -> Dict[str, str]:
+    """
+    "glm-4-flash"                         → 只用于同系列的 Provider（见 route_models），其余用各自默认模型
+    "glm:glm-4-flash,gemini:gemini-1.5-flash-8b" → 按 Provider 分别指定
+    """
+    models: Dict[str, str] = {}
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, sep, model = part.partition(":")
+        if sep:
+            models[name.strip()] = model.strip()
+        else:
+            models["*"] = part
+    return models
+
+
+def _model_family(model: str) -> str:
+    """glm-4-flash → glm，models/gemini-1.5-pro → gemini"""
+    return (model or "").lower().split("/")[-1].split("-")[0]
+
+
+def route_models(node: str, models: Optional[Dict[str, str]] = None) -> List[tuple]:
+    """
+    节点可用的 [(Provider 名, 模型名), ...]，顺序即偏好顺序
+
+    models 同 build_router；LLM_ROUTE_<NODE> 限定可用的 Provider，未指定模型的用 Provider 的默认模型。
+    不带 Provider 的模型名（"*"）只交给默认模型同系列的 Provider（glm-4-flash → glm），
+    故障切换时其他 Provider 仍用自己的模型，不会拿着别家的模型名请求失败；
+    没有同系列的 Provider 时交给偏好顺序第一的 Provider
+    """
+    providers = get_providers()
+    route = os.getenv(f"LLM_ROUTE_{node.upper()}")
+    names = [n.strip() for n in route.split(",") if n.strip() in providers] if route else []
+    names = names or list(providers)
+    models = dict(models or {})
+    bare = models.pop("*", None)
+    if bare:
+        family = [n for n in names if _model_family(providers[n].model) == _model_family(bare)]
+        for name in family or names[:1]:
+            models.setdefault(name, bare)
+    return [(name, models.get(name) or providers[name].model) for name in names]
+
+
+def build_router(node: str, json_mode: bool = False, models: Optional[Dict[str, str]] = None,
+                 **overrides) -> Runnable:
+    """
+    为一个图节点构建路由器
+
+    models: {provider: model}，"*" 表示不指定 Provider 的模型名（见 parse_model_spec / route_models）
+    overrides: temperature / max_tokens 等传给模型构造
+    LLM_ROUTE_<NODE>（如 LLM_ROUTE_NOVICE=local,glm）限定该节点可用的 Provider 及偏好顺序；
+    LLM_HEDGE=0 关闭对冲请求。只有一个 Provider 时也经过路由器（延迟统计、熔断、协作式取消）。
+    """
+    providers = get_providers()
+    if not providers:
+        raise ValueError("❌ 错误：未配置任何有效的 LLM API Key！")
+
+    members = []
+    for name, model in route_models(node, models):
+        params = {k: v for k, v in overrides.items() if v is not None}
+        if model:
+            params["model"] = model
+        members.append((providers[name], providers[name].build(json_mode=json_mode, **params)))
+
+    return LLMRouter(node, members, hedge=os.getenv("LLM_HEDGE", "1") != "0")
+
+
+def providers_snapshot() -> List[dict]:
+    """各 Provider 当前的延迟 / 错误率 / 配额 / 熔断状态"""
+    return [p.snapshot() for p in get_providers().values()]
@@ -0,0 +1,143 @@
+"""
+🛑 Stopping Policy - 多轮博弈的提前结束 / 轮次预算控制
+=====================================================
+核心职责：
+1. 每次专家发言后评估一次：返回停止原因（字符串）或 None 继续
+2. 可插拔：任意规则组合成 StopPolicy，按顺序第一条命中即停止
+3. 停止原因写入 state["stop_reason"]，随记录存档，便于对比「轮次/成本 vs 准确率」
+4. 提前结束类规则统一受最少轮次约束（min_turns），轮次不足时不会命中；预算 / 最大轮次不受限
+
+内置规则：
+- ExpertConcluded   专家自己给出 concluded（可设最少轮次）
+- ConfidencePlateau 置信度连续 N 轮 ≥ 阈值
+- SingleHypothesis  候选假设只剩 1 个
+- TokenBudget       单次仿真 token / 费用预算（费用按 usage.py 的模型价格表累计，见 state["cost_used"]）
+- MaxTurns          最大轮次
+"""
+
+import os
+from abc import ABC, abstractmethod
+from typing import List, Optional
+
+
+class StopRule(ABC):
+    """规则基类：check 返回停止原因或 None"""
+
+    reason = "stopped"
+
+    @abstractmethod
+    def check(self, state: dict, reasoning: dict, analysis: dict) -> Optional[str]:
+        ...
+
+
+class EarlyStopRule(StopRule):
+    """提前结束类规则：轮次不足 min_turns 时不检查"""
+
+    def __init__(self, min_turns: int = 1):
+        self.min_turns = min_turns
+
+    def check(self, state, reasoning, analysis):
+        if state.get("turn_count", 0) < self.min_turns:
+            return None
+        return self.reason if self.triggered(state, reasoning, analysis) else None
+
+    @abstractmethod
+    def triggered(self, state: dict, reasoning: dict, analysis: dict) -> bool:
+        ...
+
+
+class ExpertConcluded(EarlyStopRule):
+    reason = "expert_concluded"
+
+    def triggered(self, state, reasoning, analysis):
+        return analysis.get("status") == "concluded"
+
+
+class ConfidencePlateau(EarlyStopRule):
+    reason = "confidence_plateau"
+
+    def __init__(self, threshold: float = 0.85, turns: int = 2, min_turns: int = 1):
+        super().__init__(min_turns)
+        self.threshold = threshold
+        self.turns = turns
+
+    def triggered(self, state, reasoning, analysis):
+        recent = state.get("confidence_history", [])[-self.turns:]
+        return len(recent) == self.turns and all(c >= self.threshold for c in recent)
+
+
+class SingleHypothesis(EarlyStopRule):
+    reason = "single_hypothesis"
+
+    def __init__(self, min_confidence: float = 0.6, min_turns: int = 1):
+        super().__init__(min_turns)
+        self.min_confidence = min_confidence
+
+    def triggered(self, state, reasoning, analysis):
+        hypotheses = [h for h in reasoning.get("current_hypotheses", []) if h]
+        return len(hypotheses) == 1 and bool(analysis.get("matched_service")) \
+            and reasoning.get("confidence", 0) >= self.min_confidence
+
+
+class TokenBudget(StopRule):
+    reason = "budget_exhausted"
+
+    def __init__(self, max_tokens: Optional[int] = None, max_cost: Optional[float] = None):
+        self.max_tokens = max_tokens
+        self.max_cost = max_cost
+
+    def check(self, state, reasoning, analysis):
+        if self.max_tokens and state.get("tokens_used", 0) >= self.max_tokens:
+            return self.reason
+        if self.max_cost and state.get("cost_used", 0.0) >= self.max_cost:
+            return self.reason
+        return None
+
+
+class MaxTurns(StopRule):
+    reason = "max_turns"
+
+    def check(self, state, reasoning, analysis):
+        # 最后一轮小白的回复专家已经看不到了，不如在此直接收尾
+        if state.get("turn_count", 0) + 1 >= state.get("max_turns", 10):
+            return self.reason
+        return None
+
+
+class StopPolicy:
+    """规则组合：按顺序检查，第一条命中即停止"""
+
+    def __init__(self, rules: List[StopRule]):
+        self.rules = list(rules)
+
+    def evaluate(self, state: dict, reasoning: dict, analysis: dict) -> Optional[str]:
+        for rule in self.rules:
+            reason = rule.check(state, reasoning, analysis)
+            if reason:
+                return reason
+        return None
+
+
+def _env_float(name: str) -> Optional[float]:
+    value = os.getenv(name)
+    return float(value) if value else None
+
+
+def default_stop_policy() -> StopPolicy:
+    """
+    默认策略（可用环境变量调整）：
+    - STOP_MIN_TURNS          提前结束（专家结论 / 置信度平台 / 单一假设）的最少轮次（默认 2）
+    - STOP_CONFIDENCE         置信度平台阈值（默认 0.85），STOP_PLATEAU_TURNS 连续轮数（默认 2）
+    - STOP_MAX_TOKENS         单次仿真 token 上限
+    - STOP_MAX_COST           单次仿真费用上限（LLM_CURRENCY，按模型价格表计算）
+    """
+    min_turns = int(os.getenv("STOP_MIN_TURNS", "2"))
+    return StopPolicy([
+        ExpertConcluded(min_turns=min_turns),
+        ConfidencePlateau(threshold=float(os.getenv("STOP_CONFIDENCE", "0.85")),
+                          turns=int(os.getenv("STOP_PLATEAU_TURNS", "2")), min_turns=min_turns),
+        SingleHypothesis(min_turns=min_turns),
+        TokenBudget(max_tokens=int(os.getenv("STOP_MAX_TOKENS", "0")) or None,
+                    max_cost=_env_float("STOP_MAX_COST")),
+        MaxTurns(),
+    ])
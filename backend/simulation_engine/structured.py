@@ -0,0 +1,236 @@
+"""
+🧾 Structured Output - 专家 / 小白回复的结构化输出
+=================================================
+核心职责：
+1. 向模型请求原生 JSON 输出（GLM-4 response_format / Gemini response_mime_type）
+2. 用 pydantic schema 校验专家、小白的回复载荷
+3. 单次扫描的宽容解析器 parse_json_robust（替代正则扫描长文本）
+4. 校验失败时最多一次廉价的修复调用，仍失败才放弃
+"""
+
+import ast
+import json
+import re
+from typing import List, Optional, Type
+
+from langchain_core.prompts import ChatPromptTemplate
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, field_validator
+
+from .metrics import JSON_PARSE_FAILURES, REGISTRY
+
+JSON_REPAIRS = REGISTRY.counter(
+    "meseeing_json_repair_calls_total", "JSON 修复调用次数", ["node", "outcome"])
+
+# 修复调用只需要原文的开头部分
+REPAIR_INPUT_CHARS = 4000
+
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+
+# =======================================================
+# 📐 载荷 Schema
+# =======================================================
+class DiagnosisReasoning(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    current_hypotheses: List[str] = Field(default_factory=list)
+    key_signals: List[str] = Field(default_factory=list)
+    next_question_purpose: str = ""
+    eliminated_categories: List[str] = Field(default_factory=list)
+    confidence: float = 0.5
+
+    @field_validator("confidence", mode="before")
+    @classmethod
+    def _clamp_confidence(cls, v):
+        try:
+            v = float(str(v).strip().rstrip("%"))
+        except (TypeError, ValueError):
+            return 0.5
+        if v > 1:
+            v /= 100  # "85%" 或 85 这样的百分制
+        return min(max(v, 0.0), 1.0)
+
+    @field_validator("current_hypotheses", "key_signals", "eliminated_categories", mode="before")
+    @classmethod
+    def _as_list(cls, v):
+        if v is None:
+            return []
+        if isinstance(v, str):
+            return [v] if v else []
+        return [str(x) for x in v]
+
+
+class AnalysisData(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    diagnosis: str = ""
+    matched_service: str = ""
+    status: str = "active"
+    turn_count: Optional[int] = None
+
+    @field_validator("status", mode="before")
+    @classmethod
+    def _normalize_status(cls, v):
+        return "concluded" if str(v or "").strip().lower() == "concluded" else "active"
+
+    @field_validator("turn_count", mode="before")
+    @classmethod
+    def _lenient_int(cls, v):
+        try:
+            return int(v)
+        except (TypeError, ValueError):
+            return None
+
+
+class ExpertReply(BaseModel):
+    """专家节点输出"""
+    model_config = ConfigDict(extra="allow")
+
+    diagnosis_reasoning: DiagnosisReasoning = Field(default_factory=DiagnosisReasoning)
+    analysis_data: AnalysisData = Field(default_factory=AnalysisData)
+    reply_to_user: str = Field(min_length=1)
+
+
+class NoviceReply(BaseModel):
+    """小白节点输出"""
+    model_config = ConfigDict(extra="allow")
+
+    internal_thought: str = ""
+    response: str = Field(min_length=1)
+    revealed_info: List[str] = Field(default_factory=list)
+    hidden_info: List[str] = Field(default_factory=list)
+
+    @field_validator("revealed_info", "hidden_info", mode="before")
+    @classmethod
+    def _as_list(cls, v):
+        if v is None:
+            return []
+        if isinstance(v, str):
+            return [v] if v else []
+        return [str(x) for x in v]
+
+
+class BranchQuestion(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    question: str = Field(min_length=1)
+    purpose: str = ""
+
+
+class BranchQuestions(BaseModel):
+    """分支模式：专家给出的备选追问"""
+    questions: List[BranchQuestion] = Field(min_length=1)
+
+
+# =======================================================
+# 🔍 单次扫描的宽容解析
+# =======================================================
+def parse_json_robust(text) -> Optional[dict]:
+    """
+    从模型输出中取出第一个 JSON 对象
+
+    1. 从第一个 "{" 起 raw_decode（自动跳过 ```json 围栏和前后废话）
+    2. 失败时只对 "{" 到最后一个 "}" 的片段做一次宽容修正：
+       去掉尾随逗号；再不行按 Python 字面量解析（单引号 / True / None）
+    """
+    if isinstance(text, dict):
+        return text
+    text = str(text or "")
+    start = text.find("{")
+    if start == -1:
+        return None
+    try:
+        data, _ = json.JSONDecoder().raw_decode(text, start)
+        return data if isinstance(data, dict) else None
+    except ValueError:
+        pass
+
+    end = text.rfind("}")
+    if end <= start:
+        return None
+    fragment = text[start:end + 1]
+    try:
+        data = json.loads(_TRAILING_COMMA.sub(r"\1", fragment))
+    except ValueError:
+        try:
+            data = ast.literal_eval(fragment)
+        except (ValueError, SyntaxError, MemoryError, RecursionError):
+            return None
+    return data if isinstance(data, dict) else None
+
+
+def validate_payload(data: Optional[dict], schema: Type[BaseModel]) -> Optional[dict]:
+    """按 schema 校验并补齐默认值；不合格返回 None"""
+    if not isinstance(data, dict):
+        return None
+    try:
+        return schema.model_validate(data).model_dump()
+    except ValidationError:
+        return None
+
+
+# =======================================================
+# 🩹 一次修复调用
+# =======================================================
+repair_prompt = ChatPromptTemplate.from_template("""
+下面是一段本应为 JSON 的模型输出，但它无法解析或缺少必填字段。
+请把它整理成合法 JSON，字段结构如下（保留原文的含义，不要编造新内容）：
+{schema}
+
+【原始输出】
+{raw}
+
+只输出 JSON，不要输出任何其他内容。
+""")
+
+
+def _schema_hint(schema: Type[BaseModel]) -> str:
+    return json.dumps(schema.model_json_schema().get("properties", {}), ensure_ascii=False)
+
+
+def parse_structured(content, schema: Type[BaseModel], node: str,
+                     repair_llm=None) -> Optional[dict]:
+    """
+    解析 + 校验节点输出；不合格时用 repair_llm 修复一次
+
+    返回校验后的 dict，修复后仍不合格返回 None（调用方按原文降级处理）
+    """
+    payload = validate_payload(parse_json_robust(content), schema)
+    if payload is not None:
+        return payload
+
+    JSON_PARSE_FAILURES.inc(node=node)
+    if repair_llm is None:
+        return None
+
+    try:
+        repaired = (repair_prompt | repair_llm).invoke({
+            "schema": _schema_hint(schema),
+            "raw": str(content)[:REPAIR_INPUT_CHARS],
+        }).content
+    except Exception as e:
+        print(f"   ⚠️ JSON 修复调用失败 ({node}): {e}")
+        JSON_REPAIRS.inc(node=node, outcome="error")
+        return None
+
+    payload = validate_payload(parse_json_robust(repaired), schema)
+    JSON_REPAIRS.inc(node=node, outcome="ok" if payload is not None else "invalid")
+    return payload
+
+
+# =======================================================
+# 🔌 原生 JSON 模式
+# =======================================================
+def json_mode_openai(llm):
+    """OpenAI 兼容接口（含 GLM-4）：response_format=json_object"""
+    return llm.bind(response_format={"type": "json_object"})
+
+
+def json_mode_google(**kwargs):
+    """Gemini：response_mime_type=application/json；旧版 SDK 不支持时返回 None"""
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    try:
+        return ChatGoogleGenerativeAI(response_mime_type="application/json", **kwargs)
+    except Exception as e:
+        print(f"   ⚠️ Gemini 原生 JSON 模式不可用，使用普通模式: {e}")
+        return None
@@ -0,0 +1,135 @@
+"""
+🌳 Taxonomy View - 知识库的精简视图 + 按服务分页的追踪记录
+=========================================================
+核心职责：
+1. 每个领域按知识库文件版本（mtime）缓存一份快照：原始 JSON、精简视图、追踪记录索引
+2. 精简视图（/api/taxonomy 默认）：分类名、服务名、各服务追踪记录条数，不含 trace_records 正文
+3. 追踪记录按服务分页（/api/taxonomy/records），最新的在前
+4. ETag 按文件内容哈希计算（强 ETag），每个版本只算一次；响应体的 gzip / brotli 编码同样每版本一次
+
+精简视图结构：
+    {"domain": "insurance", "version": "<etag>", "record_count": 71,
+     "taxonomy": [{"name": "...", "services": [...], "record_count": 12, "trace_counts": {"服务": 3}}]}
+"""
+
+import json
+import threading
+from typing import Dict, List, Optional
+
+from .domain_registry import db_path
+from .domain_spec import short_name
+from .http_cache import CachedBody, strong_etag
+
+RECORD_FIELDS_SUMMARY = ("id", "timestamp", "query", "ai_prediction", "ground_truth", "confidence",
+                         "diagnosis_correct", "persona", "tone", "industry", "total_turns", "source")
+
+
+class TaxonomySnapshot:
+    """某个版本的知识库"""
+
+    def __init__(self, domain: str, raw: bytes):
+        self.domain = domain
+        self.etag = strong_etag(raw)
+        self.data = json.loads(raw) if raw else {}
+        self.full = CachedBody(raw, etag=self.etag)
+        self._slim: Optional[CachedBody] = None
+        self._pages: Dict[tuple, CachedBody] = {}
+        self._lock = threading.Lock()
+
+    def categories(self) -> List[dict]:
+        return self.data.get("taxonomy", []) if isinstance(self.data, dict) else []
+
+    @property
+    def slim_etag(self) -> str:
+        return f'{self.etag[:-1]}-slim"'
+
+    def slim(self) -> CachedBody:
+        with self._lock:
+            if self._slim is None:
+                categories = []
+                for category in self.categories():
+                    trace_counts = {key: len(records or []) for key, records in
+                                    (category.get("trace_records") or {}).items()}
+                    categories.append({
+                        "name": category.get("name", ""),
+                        "services": category.get("services", []),
+                        "record_count": sum(trace_counts.values()),
+                        "trace_counts": trace_counts,
+                    })
+                view = {
+                    "domain": self.domain,
+                    "version": self.etag.strip('"'),
+                    "record_count": sum(c["record_count"] for c in categories),
+                    "taxonomy": categories,
+                }
+                self._slim = CachedBody(json.dumps(view, ensure_ascii=False).encode("utf-8"), etag=self.slim_etag)
+            return self._slim
+
+    def service_records(self, service: str, category: Optional[str] = None) -> tuple:
+        """
+        服务的追踪记录：(trace_records 中的 key, 记录列表)
+
+        先按 key 精确匹配（含服务简称），找不到再按包含关系模糊匹配（与前端星图的匹配规则一致）
+        """
+        candidates = [c for c in self.categories() if not category or c.get("name") == category]
+        for match in (lambda key: key in (service, short_name(service)),
+                      lambda key: service in key or key in service):
+            for cat in candidates:
+                for key, records in (cat.get("trace_records") or {}).items():
+                    if key and match(key) and records:
+                        return key, records
+        return None, []
+
+    def page_etag(self, service: str, category: Optional[str], offset: int, limit: int, fields: str) -> str:
+        params = json.dumps([service, category, offset, limit, fields], ensure_ascii=False)
+        return f'{self.etag[:-1]}-{strong_etag(params.encode("utf-8"))[1:17]}"'
+
+    def records_page(self, service: str, category: Optional[str], offset: int, limit: int,
+                     fields: str = "full") -> CachedBody:
+        cache_key = (service, category, offset, limit, fields)
+        with self._lock:
+            if cache_key in self._pages:
+                return self._pages[cache_key]
+        key, records = self.service_records(service, category)
+        newest_first = list(reversed(records))
+        page = newest_first[offset:offset + limit]
+        if fields == "summary":
+            page = [{name: r.get(name) for name in RECORD_FIELDS_SUMMARY if name in r} for r in page]
+        body = CachedBody(json.dumps({
+            "domain": self.domain,
+            "service": service,
+            "key": key,
+            "total": len(records),
+            "offset": offset,
+            "limit": limit,
+            "records": page,
+        }, ensure_ascii=False).encode("utf-8"), etag=self.page_etag(service, category, offset, limit, fields))
+        with self._lock:
+            # 分页缓存只保留最近的若干页，避免被任意参数撑大
+            if len(self._pages) >= 256:
+                self._pages.clear()
+            self._pages[cache_key] = body
+        return body
+
+
+_snapshots: Dict[str, tuple] = {}
+_lock = threading.Lock()
+
+
+def get_taxonomy_snapshot(domain: str) -> Optional[TaxonomySnapshot]:
+    """领域知识库的当前快照（文件 mtime / 大小不变时复用），文件不存在返回 None"""
+    path = db_path(domain)
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    version = (stat.st_mtime_ns, stat.st_size)
+    with _lock:
+        cached = _snapshots.get(domain)
+        if cached and cached[0] == version:
+            return cached[1]
+    with open(path, "rb") as f:
+        snapshot = TaxonomySnapshot(domain, f.read())
+    with _lock:
+        _snapshots[domain] = (version, snapshot)
+    return snapshot
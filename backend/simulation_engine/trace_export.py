@@ -0,0 +1,228 @@
+"""
+📦 Trace Export - 追踪记录 / 收件箱记录的列式导出（Arrow / Parquet）
+==================================================================
+核心职责：
+1. 把嵌套在 domain_db/*.json 里 taxonomy[*].trace_records[service] 的追踪记录、
+   以及 processing_log.json 里的收件箱记录拍平成两张 Arrow 表：
+   - records：一条记录一行（origin = trace / inbox）
+   - turns：对话轮次子表，按 (origin, record_id) 关联 records
+2. 写成 Parquet 文件，或序列化为 Arrow IPC stream 供 /api/export/traces 直接下发
+3. 准确率 / 混淆 / 覆盖率分析交给 DuckDB / pandas，不再在 Python 循环里数
+
+用法：
+    python -m simulation_engine.trace_export --out ../etl_factory/exports           # 全部领域
+    python -m simulation_engine.trace_export --domain insurance --out exports
+
+    duckdb> SELECT service, avg(diagnosis_correct::INT) FROM 'exports/records.parquet' GROUP BY 1;
+
+依赖 pyarrow（可选依赖）：未安装时 ARROW_AVAILABLE 为 False，导出接口返回 501。
+"""
+
+import io
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    ARROW_AVAILABLE = True
+except ImportError:
+    pa = pq = None
+    ARROW_AVAILABLE = False
+
+TABLES = ("records", "turns")
+ORIGINS = ("trace", "inbox")
+MEDIA_TYPES = {
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+# 列定义：(列名, Arrow 类型名)，顺序即导出顺序
+RECORD_COLUMNS = [
+    ("record_id", "string"),
+    ("origin", "string"),
+    ("domain", "string"),
+    ("category", "string"),
+    ("service", "string"),
+    ("timestamp", "string"),
+    ("status", "string"),
+    ("source", "string"),
+    ("query", "string"),
+    ("ai_prediction", "string"),
+    ("ground_truth", "string"),
+    ("confidence", "float64"),
+    ("diagnosis_correct", "bool_"),
+    ("persona", "string"),
+    ("tone", "string"),
+    ("industry", "string"),
+    ("total_turns", "int32"),
+]
+TURN_COLUMNS = [
+    ("record_id", "string"),
+    ("origin", "string"),
+    ("domain", "string"),
+    ("step", "int32"),
+    ("role", "string"),
+    ("content", "string"),
+]
+
+
+def _require_arrow():
+    if not ARROW_AVAILABLE:
+        raise RuntimeError("导出需要 pyarrow：pip install pyarrow")
+
+
+def _schema(columns: List[tuple]):
+    return pa.schema([(name, getattr(pa, type_name)()) for name, type_name in columns])
+
+
+# =======================================================
+# 🔨 拍平
+# =======================================================
+def _record_row(record: dict, origin: str, domain: str, category: str, service: str) -> dict:
+    confidence = record.get("confidence")
+    correct = record.get("diagnosis_correct")
+    turns = record.get("total_turns")
+    return {
+        "record_id": record.get("id"),
+        "origin": origin,
+        "domain": domain,
+        "category": category,
+        "service": service,
+        "timestamp": record.get("timestamp"),
+        "status": record.get("status"),
+        "source": record.get("source"),
+        "query": record.get("query"),
+        "ai_prediction": record.get("ai_prediction"),
+        "ground_truth": record.get("ground_truth") or record.get("ground_truth_term"),
+        "confidence": float(confidence) if isinstance(confidence, (int, float)) else None,
+        "diagnosis_correct": correct if isinstance(correct, bool) else None,
+        "persona": record.get("persona"),
+        "tone": record.get("tone"),
+        "industry": record.get("industry"),
+        "total_turns": int(turns) if isinstance(turns, (int, float)) else None,
+    }
+
+
+def _turn_rows(record: dict, origin: str, domain: str) -> Iterable[dict]:
+    for index, turn in enumerate(record.get("dialogue_path") or [], start=1):
+        if not isinstance(turn, dict):
+            continue
+        step = turn.get("step")
+        yield {
+            "record_id": record.get("id"),
+            "origin": origin,
+            "domain": domain,
+            "step": int(step) if isinstance(step, (int, float)) else index,
+            "role": turn.get("role"),
+            "content": turn.get("content"),
+        }
+
+
+def iter_trace_records(domain_db: dict) -> Iterable[tuple]:
+    """(分类, 服务, 记录)：遍历知识库中所有追踪记录"""
+    for category in domain_db.get("taxonomy", []):
+        for service, records in (category.get("trace_records") or {}).items():
+            for record in records or []:
+                yield category.get("name", ""), service, record
+
+
+class _Columns:
+    """按列累积行，最后一次性转成 Arrow 表（比逐行 append RecordBatch 快）"""
+
+    def __init__(self, columns: List[tuple]):
+        self.columns = columns
+        self.data: Dict[str, list] = {name: [] for name, _ in columns}
+
+    def append(self, row: dict):
+        for name, _ in self.columns:
+            self.data[name].append(row.get(name))
+
+    def to_table(self):
+        return pa.Table.from_pydict(self.data, schema=_schema(self.columns))
+
+
+def build_tables(domain_dbs: Dict[str, dict], inbox: Optional[List[dict]] = None,
+                 origin: Optional[str] = None, default_domain: str = "hr") -> dict:
+    """
+    拍平为 {"records": pa.Table, "turns": pa.Table}
+
+    domain_dbs: {领域 id: 知识库 JSON}；inbox: 收件箱记录（按 domain_dbs 中的领域过滤）
+    origin: 只导出 trace 或 inbox，默认两者都导出
+    """
+    _require_arrow()
+    records, turns = _Columns(RECORD_COLUMNS), _Columns(TURN_COLUMNS)
+
+    if origin in (None, "trace"):
+        for domain, domain_db in domain_dbs.items():
+            for category, service, record in iter_trace_records(domain_db):
+                records.append(_record_row(record, "trace", domain, category, service))
+                for row in _turn_rows(record, "trace", domain):
+                    turns.append(row)
+
+    if origin in (None, "inbox"):
+        for record in inbox or []:
+            domain = record.get("domain", default_domain)
+            if domain not in domain_dbs:
+                continue
+            records.append(_record_row(record, "inbox", domain, record.get("category"), None))
+            for row in _turn_rows(record, "inbox", domain):
+                turns.append(row)
+
+    return {"records": records.to_table(), "turns": turns.to_table()}
+
+
+# =======================================================
+# 💾 序列化
+# =======================================================
+def to_bytes(table, fmt: str = "parquet") -> bytes:
+    """单张表序列化为 Parquet 文件或 Arrow IPC stream"""
+    _require_arrow()
+    sink = io.BytesIO()
+    if fmt == "parquet":
+        pq.write_table(table, sink, compression="zstd")
+    elif fmt == "arrow":
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+    else:
+        raise ValueError(f"未知导出格式: {fmt}（可选: {', '.join(MEDIA_TYPES)}）")
+    return sink.getvalue()
+
+
+def write_parquet(tables: dict, out_dir: Path) -> Dict[str, Path]:
+    """每张表写一个 <name>.parquet，返回 {表名: 路径}"""
+    _require_arrow()
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    paths = {}
+    for name, table in tables.items():
+        paths[name] = out_dir / f"{name}.parquet"
+        pq.write_table(table, paths[name], compression="zstd")
+    return paths
+
+
+def load_sources(domains: List[str], inbox_path: Optional[Path] = None) -> tuple:
+    """读取各领域知识库与收件箱（都复用进程内缓存）"""
+    from .domain_registry import get_domain_manager
+    from .inbox_store import get_inbox_store
+
+    domain_dbs = {d: get_domain_manager(d).domain_db for d in domains}
+    return domain_dbs, get_inbox_store(inbox_path).records()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from .domain_registry import DEFAULT_DOMAIN, load_domains
+
+    parser = argparse.ArgumentParser(description="导出追踪记录 / 收件箱记录为 Parquet")
+    parser.add_argument("--domain", help="只导出该领域（默认全部 active 领域）")
+    parser.add_argument("--origin", choices=ORIGINS, help="只导出追踪记录或收件箱记录")
+    parser.add_argument("--inbox", help="收件箱路径（默认 etl_factory/processing_log.json）")
+    parser.add_argument("--out", default="exports", help="输出目录")
+    args = parser.parse_args()
+
+    domain_dbs, inbox = load_sources([args.domain] if args.domain else list(load_domains()), args.inbox)
+    tables = build_tables(domain_dbs, inbox, origin=args.origin, default_domain=DEFAULT_DOMAIN)
+    for name, path in write_parquet(tables, Path(args.out)).items():
+        print(f"✅ {name}: {tables[name].num_rows} 行 → {path}")
@@ -0,0 +1,306 @@
+"""
+🧵 Tracing - 单次仿真的结构化 Span 树
+=====================================
+核心职责：
+1. 每次仿真一棵 span 树：任务生成 → 图节点 → LLM 调用 → JSON 解析 → 入库 → 写收件箱
+2. LLM 调用 span 记录 provider / model / token / 重试次数（通过 LangChain 回调）
+3. 记录里只存 trace_id + 小摘要（各 span 耗时汇总、LLM 调用数、错误数），完整 span 导出为 OTLP 兼容的
+   JSON Lines（STATE_DIR/traces.otlp.jsonl，按大小轮转）
+
+环境变量：
+- TRACE_EXPORT_FILE         导出文件（默认 $STATE_DIR/traces.otlp.jsonl）
+- TRACE_EXPORT_MAX_BYTES    单个文件上限，超出后轮转为 .1 / .2 ...（默认 50MB，0 表示不轮转）
+- TRACE_EXPORT_BACKUPS      保留的轮转文件数（默认 3）
+
+没有活动 trace 时所有 API 都是空操作，图可以在 trace 之外正常运行。
+"""
+
+import json
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from .metrics import _provider_from_serialized, _model_from_params, usage_from_llm_result
+from .domain_registry import STATE_DIR, write_lock
+
+SERVICE_NAME = "meseeing-backend"
+DEFAULT_EXPORT_FILE = STATE_DIR / "traces.otlp.jsonl"
+EXPORT_MAX_BYTES = int(os.getenv("TRACE_EXPORT_MAX_BYTES", str(50 * 1024 * 1024)))
+EXPORT_BACKUPS = int(os.getenv("TRACE_EXPORT_BACKUPS", "3"))
+
+STATUS_UNSET, STATUS_OK, STATUS_ERROR = 0, 1, 2
+
+
+class Span:
+    """一个计时片段"""
+
+    def __init__(self, trace: "SimulationTrace", name: str, parent: Optional["Span"], attributes: dict):
+        self.trace = trace
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict = dict(attributes)
+        self.status = STATUS_UNSET
+        self.status_message = ""
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def end(self, error: Optional[BaseException] = None):
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.status = STATUS_ERROR
+            self.status_message = f"{type(error).__name__}: {error}"[:300]
+        elif self.status == STATUS_UNSET:
+            self.status = STATUS_OK
+
+    def fail(self, message: str):
+        """没有异常对象时标记失败（如被捕获后转成结果的错误）"""
+        self.status = STATUS_ERROR
+        self.status_message = str(message)[:300]
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return round((end - self.start_ns) / 1e6, 2)
+
+
+class SimulationTrace:
+    """一次仿真的全部 span"""
+
+    def __init__(self, name: str, attributes: dict):
+        self.trace_id = secrets.token_hex(16)
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+        self.root = self.new_span(name, None, attributes)
+
+    def new_span(self, name: str, parent: Optional[Span], attributes: dict) -> Span:
+        span = Span(self, name, parent, attributes)
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    def summary(self) -> dict:
+        """随仿真记录存档的小摘要：各 span 名的次数与累计耗时、LLM 调用数、错误数（完整 span 见 OTLP 导出）"""
+        with self._lock:
+            spans = list(self.spans)
+        by_name: Dict[str, dict] = {}
+        for span in spans:
+            if span is self.root:
+                continue
+            entry = by_name.setdefault(span.name, {"count": 0, "duration_ms": 0.0})
+            entry["count"] += 1
+            entry["duration_ms"] = round(entry["duration_ms"] + span.duration_ms, 2)
+        return {
+            "duration_ms": self.root.duration_ms,
+            "spans": by_name,
+            "llm_calls": by_name.get("llm.call", {}).get("count", 0),
+            "errors": sum(1 for span in spans if span.status == STATUS_ERROR),
+        }
+
+    def to_otlp(self) -> dict:
+        """OTLP/JSON 的 ExportTraceServiceRequest 结构"""
+        with self._lock:
+            spans = list(self.spans)
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [_otlp_attr("service.name", SERVICE_NAME)]},
+                "scopeSpans": [{
+                    "scope": {"name": "meseeing.simulation"},
+                    "spans": [_otlp_span(self.trace_id, s) for s in spans],
+                }],
+            }]
+        }
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple, dict)):
+        return {"stringValue": json.dumps(value, ensure_ascii=False)}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attr(key: str, value) -> dict:
+    return {"key": key, "value": _otlp_value(value)}
+
+
+def _otlp_span(trace_id: str, span: Span) -> dict:
+    data = {
+        "traceId": trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": 1,  # SPAN_KIND_INTERNAL
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns or time.time_ns()),
+        "attributes": [_otlp_attr(k, v) for k, v in span.attributes.items()],
+        "status": {"code": span.status},
+    }
+    if span.parent_id:
+        data["parentSpanId"] = span.parent_id
+    if span.status_message:
+        data["status"]["message"] = span.status_message
+    return data
+
+
+# =======================================================
+# 🔗 上下文：当前 trace / 当前 span
+# =======================================================
+_current_trace: ContextVar[Optional[SimulationTrace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_trace() -> Optional[SimulationTrace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def start_trace(name: str = "simulation", **attributes):
+    """开启一次仿真的 trace，with 块结束时根 span 结束"""
+    trace = SimulationTrace(name, attributes)
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(trace.root)
+    try:
+        yield trace
+    except BaseException as e:
+        trace.root.end(e)
+        raise
+    finally:
+        trace.root.end()
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """在当前 span 下开一个子 span；没有活动 trace 时 yield None"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    child = trace.new_span(name, _current_span.get(), attributes)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.end(e)
+        raise
+    finally:
+        child.end()
+        _current_span.reset(token)
+
+
+def traced(name: str):
+    """函数装饰器版本的 span（用于图节点）"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _rotate(path: Path):
+    """path → path.1 → path.2 ...，超出 EXPORT_BACKUPS 的最旧文件删除（调用方持有写锁）"""
+    for i in range(EXPORT_BACKUPS, 0, -1):
+        older = path.with_name(f"{path.name}.{i}")
+        if i == EXPORT_BACKUPS:
+            older.unlink(missing_ok=True)
+        else:
+            newer = path.with_name(f"{path.name}.{i + 1}")
+            if older.exists():
+                older.replace(newer)
+    if EXPORT_BACKUPS > 0:
+        path.replace(path.with_name(f"{path.name}.1"))
+    else:
+        path.unlink(missing_ok=True)
+
+
+def export_otlp_json(trace: SimulationTrace, path: Optional[Path] = None):
+    """
+    把完整 trace 以 OTLP JSON 追加写入本地文件（每行一个 trace）
+
+    多个线程 / 进程（API + worker）同时导出时，写锁保证一行不会和另一行交错，轮转也不会丢行
+    """
+    path = Path(path or os.getenv("TRACE_EXPORT_FILE", DEFAULT_EXPORT_FILE))
+    try:
+        line = json.dumps(trace.to_otlp(), ensure_ascii=False) + "\n"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with write_lock("traces"):
+            if EXPORT_MAX_BYTES and path.exists() and path.stat().st_size + len(line) > EXPORT_MAX_BYTES:
+                _rotate(path)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(line)
+    except Exception as e:
+        print(f"⚠️ Trace 导出失败: {e}")
+
+
+# =======================================================
+# 📡 LangChain 回调：为每次 LLM 调用开 span
+# =======================================================
+class TracingCallbackHandler(BaseCallbackHandler):
+    """挂在 LLM 上；只有在活动 trace 内才会记录"""
+
+    def __init__(self):
+        self._spans: Dict[object, Span] = {}
+        self._lock = threading.Lock()
+
+    def _start(self, serialized, run_id, kwargs):
+        trace = _current_trace.get()
+        if trace is None:
+            return
+        metadata = kwargs.get("metadata")
+        child = trace.new_span("llm.call", _current_span.get(), {
+            "llm.provider": _provider_from_serialized(serialized, metadata),
+            "llm.model": _model_from_params(kwargs.get("invocation_params"), metadata),
+            "llm.retries": 0,
+        })
+        with self._lock:
+            self._spans[run_id] = child
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        self._start(serialized, run_id, kwargs)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs):
+        self._start(serialized, run_id, kwargs)
+
+    def on_retry(self, retry_state, *, run_id, parent_run_id=None, **kwargs):
+        with self._lock:
+            child = self._spans.get(run_id)
+        if child is not None:
+            child.attributes["llm.retries"] += 1
+
+    def on_llm_end(self, response, *, run_id, parent_run_id=None, **kwargs):
+        with self._lock:
+            child = self._spans.pop(run_id, None)
+        if child is None:
+            return
+        prompt_tokens, completion_tokens = usage_from_llm_result(response)
+        child.set(**{"llm.prompt_tokens": prompt_tokens, "llm.completion_tokens": completion_tokens})
+        child.end()
+
+    def on_llm_error(self, error, *, run_id, parent_run_id=None, **kwargs):
+        with self._lock:
+            child = self._spans.pop(run_id, None)
+        if child is not None:
+            child.end(error)
+
+
+tracing_callback = TracingCallbackHandler()
@@ -0,0 +1,232 @@
+"""
+💰 Usage - LLM token 用量 / 费用计量 + 预算
+===========================================
+核心职责：
+1. 每次 LLM 响应的 token 用量（metrics 回调里提取）按价格表折算费用，计入当前上下文里的全部计量器
+2. UsageMeter：按仿真、按批量任务分别计量，内部再按 Provider 拆分（调用数、输入 / 输出 token、费用）
+3. 预算：计量器可设 token / 费用上限，超出时回调一次（BatchRunner / 任务队列据此自动暂停）
+4. 费用指标：meseeing_llm_cost_total{provider, model}
+
+计量器随 ContextVar 传递（LangGraph 节点、chain.batch、路由线程池都会带上）：
+    with metering(simulation_meter, batch_meter):
+        graph_app.invoke(...)
+
+价格表：每百万 token 的价格（输入 / 输出），模型名精确匹配优先，其次最长前缀匹配；匹配不上按 0 计并标记 unpriced。
+内置价格为各家公开标价的近似值，以实际账单为准，可用环境变量覆盖：
+- LLM_PRICES        JSON，如 {"glm-4": {"input": 100, "output": 100}, "my-local": {"input": 0, "output": 0}}
+- LLM_PRICES_FILE   同格式的 JSON 文件路径
+- LLM_CURRENCY      费用单位（默认 CNY，只用于展示，价格表需与之一致）
+"""
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional, Tuple, TypedDict
+
+from .metrics import REGISTRY
+
+LLM_COST = REGISTRY.counter(
+    "meseeing_llm_cost_total", "LLM 调用费用（LLM_CURRENCY）", ["provider", "model"])
+
+CURRENCY = os.getenv("LLM_CURRENCY", "CNY")
+
+
+class Price(TypedDict):
+    input: float   # 每百万输入 token
+    output: float  # 每百万输出 token
+
+
+DEFAULT_PRICES: Dict[str, Price] = {
+    "glm-4": {"input": 100.0, "output": 100.0},
+    "glm-4-plus": {"input": 50.0, "output": 50.0},
+    "glm-4-0520": {"input": 100.0, "output": 100.0},
+    "glm-4-air": {"input": 1.0, "output": 1.0},
+    "glm-4-airx": {"input": 10.0, "output": 10.0},
+    "glm-4-long": {"input": 1.0, "output": 1.0},
+    "glm-4-flash": {"input": 0.0, "output": 0.0},
+    "gemini-flash": {"input": 0.55, "output": 2.2},
+    "gemini-1.5-flash": {"input": 0.55, "output": 2.2},
+    "gemini-1.5-flash-8b": {"input": 0.27, "output": 1.1},
+    "gemini-1.5-pro": {"input": 9.0, "output": 36.0},
+    "local-model": {"input": 0.0, "output": 0.0},
+}
+
+
+def load_prices() -> Dict[str, Price]:
+    prices = dict(DEFAULT_PRICES)
+    path = os.getenv("LLM_PRICES_FILE")
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            prices.update(json.load(f))
+    if os.getenv("LLM_PRICES"):
+        prices.update(json.loads(os.getenv("LLM_PRICES")))
+    return prices
+
+
+PRICES = load_prices()
+
+
+def price_for(model: str) -> Optional[Price]:
+    """
+    模型名 → 价格（精确匹配，其次最长前缀；都不匹配返回 None，记为未定价）
+
+    前缀只在 "-" 处断开（如 glm-4-plus-0111 → glm-4-plus）；"." 是版本号的一部分，
+    glm-4.5 / glm-4v 是不同的模型，不能按 glm-4 计价
+    """
+    model = (model or "").lower()
+    if model in PRICES:
+        return PRICES[model]
+    # Gemini 的模型名可能带 models/ 前缀
+    model = model.split("/")[-1]
+    if model in PRICES:
+        return PRICES[model]
+    matches = [name for name in PRICES if model.startswith(name + "-")]
+    return PRICES[max(matches, key=len)] if matches else None
+
+
+def cost_of(model: str, prompt_tokens: int, completion_tokens: int) -> Tuple[float, bool]:
+    """(费用, 是否有价格)"""
+    price = price_for(model)
+    if price is None:
+        return 0.0, False
+    return (prompt_tokens * price["input"] + completion_tokens * price["output"]) / 1_000_000, True
+
+
+class Budget(TypedDict, total=False):
+    """批量任务预算（任一项超出即暂停）"""
+    max_tokens: int
+    max_cost: float
+
+
+def _empty() -> dict:
+    return {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0}
+
+
+class UsageMeter:
+    """
+    线程安全的用量累加器
+
+    baseline: 计量开始前已经用掉的 {tokens, cost}（任务队列恢复执行时，其他进程 / 之前的用量），只参与预算判断
+    on_exceeded: 首次超出预算时调用，参数为超出的项（"tokens" / "cost"）
+    """
+
+    def __init__(self, budget: Optional[Budget] = None, on_exceeded: Optional[Callable[[str], None]] = None,
+                 baseline: Optional[dict] = None):
+        self.budget: Budget = dict(budget or {})
+        self.on_exceeded = on_exceeded
+        self.baseline = {"tokens": 0, "cost": 0.0, **(baseline or {})}
+        self._totals = _empty()
+        self._by_provider: Dict[str, dict] = {}
+        self._unpriced: set = set()
+        self._tripped = False
+        self._lock = threading.Lock()
+
+    def add(self, provider: str, model: str, prompt_tokens: int, completion_tokens: int, cost: float,
+            priced: bool = True):
+        with self._lock:
+            for bucket in (self._totals, self._by_provider.setdefault(provider, _empty())):
+                bucket["calls"] += 1
+                bucket["prompt_tokens"] += prompt_tokens
+                bucket["completion_tokens"] += completion_tokens
+                bucket["cost"] += cost
+            if not priced:
+                self._unpriced.add(model)
+            exceeded = None if self._tripped else self._exceeded()
+            if exceeded:
+                self._tripped = True
+        if exceeded and self.on_exceeded:
+            self.on_exceeded(exceeded)
+
+    def _exceeded(self) -> Optional[str]:
+        tokens = self.baseline["tokens"] + self._totals["prompt_tokens"] + self._totals["completion_tokens"]
+        return over_budget(self.budget, tokens, self.baseline["cost"] + self._totals["cost"])
+
+    def exceeded(self) -> Optional[str]:
+        with self._lock:
+            return self._exceeded()
+
+    def set_budget(self, budget: Optional[Budget], baseline: Optional[dict] = None):
+        """调整预算 / baseline（恢复执行时），重新开始超出判断"""
+        with self._lock:
+            self.budget = dict(budget or {})
+            if baseline is not None:
+                self.baseline = {"tokens": 0, "cost": 0.0, **baseline}
+            self._tripped = False
+
+    @property
+    def total_tokens(self) -> int:
+        return self._totals["prompt_tokens"] + self._totals["completion_tokens"]
+
+    @property
+    def cost(self) -> float:
+        return self._totals["cost"]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            totals = dict(self._totals)
+            by_provider = {name: _rounded(dict(b)) for name, b in self._by_provider.items()}
+            unpriced = sorted(self._unpriced)
+        return {**_rounded(totals), "currency": CURRENCY, "by_provider": by_provider,
+                **({"unpriced_models": unpriced} if unpriced else {})}
+
+
+def _rounded(bucket: dict) -> dict:
+    bucket["total_tokens"] = bucket["prompt_tokens"] + bucket["completion_tokens"]
+    bucket["cost"] = round(bucket["cost"], 6)
+    return bucket
+
+
+def merge_usage(snapshots) -> dict:
+    """把多个 snapshot（如任务队列里每条仿真的用量）合并成一个"""
+    totals, by_provider, unpriced = _empty(), {}, set()
+    for snap in snapshots:
+        if not snap:
+            continue
+        for bucket, source in [(totals, snap)] + [
+                (by_provider.setdefault(name, _empty()), b) for name, b in (snap.get("by_provider") or {}).items()]:
+            for key in ("calls", "prompt_tokens", "completion_tokens", "cost"):
+                bucket[key] += source.get(key) or 0
+        unpriced.update(snap.get("unpriced_models") or ())
+    return {**_rounded(totals), "currency": CURRENCY,
+            "by_provider": {name: _rounded(b) for name, b in by_provider.items()},
+            **({"unpriced_models": sorted(unpriced)} if unpriced else {})}
+
+
+def over_budget(budget: Optional[Budget], tokens: int, cost: float) -> Optional[str]:
+    """已用量是否超出预算（任务队列在每条仿真结束后按 SQLite 里的累计值判断）"""
+    budget = budget or {}
+    if budget.get("max_tokens") and tokens >= budget["max_tokens"]:
+        return "tokens"
+    if budget.get("max_cost") and cost >= budget["max_cost"]:
+        return "cost"
+    return None
+
+
+# =======================================================
+# 🔌 计量上下文
+# =======================================================
+_meters: ContextVar[tuple] = ContextVar("usage_meters", default=())
+# LLMRouter 在调用前设置（glm / gemini / local），回调里的 ls_provider 只能区分到 openai / google
+current_provider: ContextVar[str] = ContextVar("current_provider", default="")
+
+
+@contextmanager
+def metering(*meters: UsageMeter):
+    """with 块内的 LLM 调用计入这些计量器（可嵌套，外层的计量器同样生效）"""
+    reset = _meters.set(_meters.get() + tuple(m for m in meters if m is not None))
+    try:
+        yield
+    finally:
+        _meters.reset(reset)
+
+
+def record_usage(provider: str, model: str, prompt_tokens: int, completion_tokens: int):
+    """metrics 回调在每次 LLM 响应后调用"""
+    provider = current_provider.get() or provider
+    cost, priced = cost_of(model, prompt_tokens, completion_tokens)
+    if cost:
+        LLM_COST.inc(cost, provider=provider, model=model)
+    for meter in _meters.get():
+        meter.add(provider, model, prompt_tokens, completion_tokens, cost, priced)
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# 测试直接 import backend 下的模块（与 uvicorn main:app 的运行方式一致）
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
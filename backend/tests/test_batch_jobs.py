@@ -0,0 +1,46 @@
+from batch_jobs import COMPLETED, PAUSED, JobStore
+
+
+def test_job_paused_while_last_task_runs_completes(tmp_path):
+    store = JobStore(tmp_path / "jobs.sqlite3")
+    job_id = store.submit("hr", 1)
+    task = store.claim_next("w1")
+    assert store.pause(job_id)
+    assert store.finish_task(job_id, task["idx"], "w1", {"success": True, "tokens_used": 10}) is True
+    job = store.get(job_id)
+    assert job["state"] == COMPLETED
+    assert not store.resume(job_id)
+
+
+def test_resume_completes_job_without_unfinished_tasks(tmp_path):
+    store = JobStore(tmp_path / "jobs.sqlite3")
+    job_id = store.submit("hr", 1)
+    task = store.claim_next("w1")
+    store.finish_task(job_id, task["idx"], "w1", {"success": True})
+    # 模拟旧版本留下的卡住状态：仿真都已结束，任务却停在 paused
+    with store._tx() as conn:
+        conn.execute("UPDATE jobs SET state = ?, finished_at = NULL WHERE id = ?", (PAUSED, job_id))
+    assert store.resume(job_id)
+    assert store.get(job_id)["state"] == COMPLETED
+    assert store.claim_next("w1") is None
+
+
+def test_heartbeat_cancels_tasks_whose_lease_was_reclaimed(tmp_path):
+    from batch_jobs import JobScheduler
+    from simulation_engine.cancellation import CancelToken
+
+    store = JobStore(tmp_path / "jobs.sqlite3")
+    job_id = store.submit("hr", 2)
+    kept, lost = store.claim_next("w1"), store.claim_next("w1")
+    # w1 卡住超过租约：第二条被回收并由 w2 领走
+    with store._tx() as conn:
+        conn.execute("UPDATE tasks SET lease_expires = 0 WHERE job_id = ? AND idx = ?", (job_id, lost["idx"]))
+    store.reclaim_expired()
+    assert store.claim_next("w2")["idx"] == lost["idx"]
+
+    scheduler = JobScheduler(store, execute=False)
+    info = {"host": "h", "pid": 1, "mode": "worker", "concurrency": 1, "started_at": 0}
+    running = {(job_id, kept["idx"]): CancelToken(), (job_id, lost["idx"]): CancelToken()}
+    scheduler._cancel_lost(running, store.heartbeat("w1", info))
+    assert not running[(job_id, kept["idx"])].cancelled
+    assert running[(job_id, lost["idx"])].reason == "lease_lost"
@@ -0,0 +1,79 @@
+import threading
+import time
+
+from simulation_engine.cancellation import CancelToken, ConcurrencySlot, current_token
+
+
+def _simulate(token, semaphore, acquired=False):
+    """一场仿真：占着名额，在检查点处按令牌暂停"""
+    def run():
+        reset = current_token.set(token)
+        try:
+            with ConcurrencySlot(semaphore, acquired=acquired):
+                token.checkpoint()
+        finally:
+            current_token.reset(reset)
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def test_paused_simulation_gives_up_its_slot():
+    semaphore = threading.BoundedSemaphore(1)
+    token = CancelToken()
+    token.pause()
+    thread = _simulate(token, semaphore)
+    time.sleep(0.1)
+    assert semaphore.acquire(timeout=1)  # 暂停中的仿真让出了唯一的名额
+    semaphore.release()
+    token.resume()
+    thread.join(timeout=1)
+    assert not thread.is_alive()
+    assert semaphore.acquire(blocking=False)  # 结束后名额归还，且没有多还
+    assert not semaphore.acquire(blocking=False)
+
+
+def test_resumed_simulation_waits_for_a_free_slot():
+    semaphore = threading.BoundedSemaphore(1)
+    token = CancelToken()
+    token.pause()
+    thread = _simulate(token, semaphore)
+    time.sleep(0.1)
+    semaphore.acquire()  # 其他任务拿走了名额
+    token.resume()
+    thread.join(timeout=0.2)
+    assert thread.is_alive()
+    semaphore.release()
+    thread.join(timeout=1)
+    assert not thread.is_alive()
+
+
+def test_backoff_sleep_gives_up_slot():
+    semaphore = threading.BoundedSemaphore(1)
+    semaphore.acquire()
+    token = CancelToken()
+    done = threading.Event()
+
+    def run():
+        with ConcurrencySlot(semaphore, acquired=True):
+            token.sleep(0.3)
+        done.set()
+    threading.Thread(target=run).start()
+    assert semaphore.acquire(timeout=0.2)
+    semaphore.release()
+    assert done.wait(1)
+
+
+def test_child_token_follows_parent_and_cancels_alone():
+    parent = CancelToken()
+    parent.pause()
+    child = parent.child()
+    assert child.paused
+    parent.resume()
+    assert not child.paused
+    other = parent.child()
+    child.cancel("lease_lost")
+    assert child.cancelled and not parent.cancelled and not other.cancelled
+    parent.cancel()
+    assert other.cancelled and other.reason == "cancelled"
+    parent.release(other)
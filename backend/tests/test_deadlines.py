@@ -0,0 +1,68 @@
+import threading
+import time
+
+import pytest
+
+from simulation_engine.cancellation import CancelToken, checkpoint, current_token
+from simulation_engine.deadlines import (
+    DeadlineExceeded, call_timeout, deadline_scope, expired, node_deadline, remaining, simulation_deadline
+)
+
+
+@pytest.fixture
+def token():
+    token = CancelToken()
+    reset = current_token.set(token)
+    yield token
+    current_token.reset(reset)
+
+
+def test_pause_is_not_counted_against_deadline(token):
+    with deadline_scope("node", 0.3):
+        token.pause()
+        time.sleep(0.5)
+        token.resume()
+        assert not expired("node")
+        assert remaining("node") > 0.1
+        time.sleep(0.35)
+        assert expired("node")
+
+
+def test_node_paused_past_node_deadline_resumes(token):
+    @node_deadline("expert")
+    def node():
+        checkpoint()  # 暂停中：阻塞到恢复
+        return call_timeout("glm", "expert")
+
+    with simulation_deadline({"node": 0.2, "simulation": 0.4}):
+        token.pause()
+        threading.Timer(0.6, token.resume).start()
+        timeout, scope = node()
+    assert scope == "node"
+    assert 0 < timeout <= 0.2
+
+
+def test_deadline_still_expires_without_pause(token):
+    @node_deadline("expert")
+    def node():
+        time.sleep(0.25)
+        return call_timeout("glm", "expert")
+
+    with simulation_deadline({"node": 0.2}):
+        with pytest.raises(DeadlineExceeded) as info:
+            node()
+    assert info.value.scope == "node"
+
+
+def test_paused_seconds_accumulates():
+    token = CancelToken()
+    token.pause()
+    time.sleep(0.1)
+    token.resume()
+    token.pause()
+    time.sleep(0.1)
+    assert token.paused_seconds >= 0.2
+    token.cancel()
+    paused = token.paused_seconds
+    time.sleep(0.05)
+    assert token.paused_seconds == paused
@@ -0,0 +1,46 @@
+import json
+import os
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+
+os.environ.setdefault("OPENAI_API_KEY", "test")  # graph 在导入时构建 ROLE_LLMS，本测试传入假模型，不会真正请求
+
+from simulation_engine import graph  # noqa: E402
+
+EXPERT_REPLY = json.dumps({
+    "diagnosis_reasoning": {"current_hypotheses": ["社保转移"], "confidence": 0.6},
+    "analysis_data": {"status": "asking", "matched_service": ""},
+    "reply_to_user": "您之前在哪个城市缴纳社保？"
+}, ensure_ascii=False)
+
+
+class CountingChatModel(FakeListChatModel):
+    calls: int = 0
+
+    def _call(self, *args, **kwargs):
+        self.calls += 1
+        return super()._call(*args, **kwargs)
+
+
+def test_expert_reuses_branch_zero_evaluation():
+    expert = CountingChatModel(responses=[json.dumps({"questions": [{"question": "备选追问", "purpose": "x"}]}, ensure_ascii=False), EXPERT_REPLY])
+    novice = FakeListChatModel(responses=[json.dumps({"response": "在北京"}, ensure_ascii=False)])
+    llms = {"expert": expert, "novice": novice}
+    state = {
+        "messages": [HumanMessage(content="我换工作了"), AIMessage(content="您在哪个城市？")],
+        "domain": "hr", "taxonomy_context": "", "secret_mission": {"novice_intent": "社保转移"},
+        "turn_count": 1, "max_turns": 10, "branch_k": 2, "confidence_history": [0.5],
+        "tokens_used": 0, "cost_used": 0.0, "diagnosis_trace": [], "eliminated_categories": [],
+    }
+
+    update = graph.branch_node(state, llms=llms)
+    state = {**state, **update, "messages": state["messages"] + update["messages"]}
+    calls_after_branch = expert.calls
+    assert state["prefetched_expert"]["turn"] == state["turn_count"]
+
+    update = graph.expert_node(state, llms=llms)
+    assert expert.calls == calls_after_branch
+    assert update["prefetched_expert"] is None
+    assert update["tokens_used"] == state["tokens_used"]
+    assert update["messages"][-1].content == "您之前在哪个城市缴纳社保？"
@@ -0,0 +1,69 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+from simulation_engine import router
+from simulation_engine.cancellation import CancelToken, current_token
+from simulation_engine.deadlines import simulation_deadline
+from simulation_engine.router import LLMRouter, ProviderState
+
+
+def _provider(name, fn, calls):
+    def invoke(x):
+        calls.append(name)
+        return fn(x)
+    provider = ProviderState(name, lambda **_: RunnableLambda(invoke), model=name)
+    return provider, provider.build()
+
+
+def _fail(x):
+    raise RuntimeError("503 service unavailable")
+
+
+@pytest.fixture
+def token():
+    token = CancelToken()
+    reset = current_token.set(token)
+    yield token
+    current_token.reset(reset)
+
+
+def test_queue_wait_does_not_count_against_call_timeout(token, monkeypatch):
+    monkeypatch.setattr(router, "_executor", ThreadPoolExecutor(max_workers=1))
+    router._executor.submit(time.sleep, 0.5)  # 占满线程池
+    calls = []
+    member = _provider("glm", lambda x: (time.sleep(0.05), "ok")[1], calls)
+    llm = LLMRouter("expert", [member], hedge=False)
+    with simulation_deadline({"call": 0.3}):
+        assert llm.invoke("hi") == "ok"
+    assert member[0].breaker.failures == 0
+
+
+def test_failover_skips_backup_already_tried_by_hedge(token, monkeypatch):
+    calls = []
+    primary = _provider("glm", lambda x: (time.sleep(0.1), _fail(x)), calls)
+    backup = _provider("gemini", _fail, calls)
+    third = _provider("local", lambda x: "ok", calls)
+    for _ in range(router.MIN_HEDGE_SAMPLES):
+        primary[0].record(0.01, ok=True)  # p95 很小，首选一慢就发起对冲
+    llm = LLMRouter("expert", [primary, backup, third])
+    monkeypatch.setattr(llm, "_ranked", lambda: [primary, backup, third])
+    assert llm.invoke("hi") == "ok"
+    assert calls.count("gemini") == 1
+    assert calls[-1] == "local"
+
+
+def test_bare_model_name_only_goes_to_its_own_provider(monkeypatch):
+    providers = {name: ProviderState(name, lambda **_: None, model=model)
+                 for name, model in [("glm", "glm-4"), ("gemini", "gemini-flash-latest"), ("local", "local-model")]}
+    monkeypatch.setattr(router, "get_providers", lambda: providers)
+    monkeypatch.delenv("LLM_ROUTE_EXPERT", raising=False)
+    assert router.route_models("expert", router.parse_model_spec("glm-4-flash")) == [
+        ("glm", "glm-4-flash"), ("gemini", "gemini-flash-latest"), ("local", "local-model")]
+    assert router.route_models("expert", router.parse_model_spec("gemini-1.5-pro,local:qwen2")) == [
+        ("glm", "glm-4"), ("gemini", "gemini-1.5-pro"), ("local", "qwen2")]
+    # 没有同系列的 Provider：只给偏好顺序第一的
+    assert router.route_models("expert", router.parse_model_spec("qwen2-7b"))[1:] == [
+        ("gemini", "gemini-flash-latest"), ("local", "local-model")]
@@ -0,0 +1,35 @@
+import pytest
+
+from simulation_engine.stopping import (
+    ConfidencePlateau, ExpertConcluded, SingleHypothesis, StopPolicy, StopRule, TokenBudget
+)
+
+CONFIDENT = {"current_hypotheses": ["社保转移"], "confidence": 0.9}
+MATCHED = {"status": "concluded", "matched_service": "社保转移"}
+
+
+@pytest.mark.parametrize("rule", [
+    ExpertConcluded(min_turns=2),
+    ConfidencePlateau(threshold=0.85, turns=2, min_turns=2),
+    SingleHypothesis(min_turns=2),
+])
+def test_early_stop_rules_respect_min_turns(rule):
+    state = {"turn_count": 1, "confidence_history": [0.9, 0.9]}
+    assert rule.check(state, CONFIDENT, MATCHED) is None
+    assert rule.check({**state, "turn_count": 2}, CONFIDENT, MATCHED) == rule.reason
+
+
+def test_token_budget_uses_accumulated_cost():
+    rule = TokenBudget(max_cost=0.05)
+    assert rule.check({"tokens_used": 10 ** 6, "cost_used": 0.01}, {}, {}) is None
+    assert rule.check({"tokens_used": 10, "cost_used": 0.05}, {}, {}) == "budget_exhausted"
+
+
+def test_policy_returns_first_matching_rule():
+    policy = StopPolicy([TokenBudget(max_tokens=100), ExpertConcluded()])
+    assert policy.evaluate({"turn_count": 3, "tokens_used": 200}, {}, MATCHED) == "budget_exhausted"
+
+
+def test_stop_rule_is_abstract():
+    with pytest.raises(TypeError):
+        StopRule()
@@ -0,0 +1,44 @@
+import json
+import threading
+
+from simulation_engine import tracing
+from simulation_engine.tracing import export_otlp_json, span, start_trace
+
+
+def _trace(index=0):
+    with start_trace("simulation", index=index) as trace:
+        for _ in range(2):
+            with span("graph.expert"):
+                with span("llm.call", prompt="x" * 200):
+                    pass
+        try:
+            with span("ingest"):
+                raise ValueError("boom")
+        except ValueError:
+            pass
+    return trace
+
+
+def test_summary_aggregates_spans_without_attributes():
+    summary = _trace().summary()
+    assert summary["spans"]["graph.expert"]["count"] == 2
+    assert summary["llm_calls"] == 2
+    assert summary["errors"] == 1
+    assert "prompt" not in json.dumps(summary)
+
+
+def test_export_rotates_and_keeps_lines_whole(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracing, "EXPORT_MAX_BYTES", 20_000)
+    monkeypatch.setattr(tracing, "EXPORT_BACKUPS", 2)
+    path = tmp_path / "traces.otlp.jsonl"
+    threads = [threading.Thread(target=lambda i=i: export_otlp_json(_trace(i), path)) for i in range(40)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    files = sorted(tmp_path.glob("traces.otlp.jsonl*"))
+    assert [f.name for f in files] == ["traces.otlp.jsonl", "traces.otlp.jsonl.1", "traces.otlp.jsonl.2"]
+    for f in files:
+        assert f.stat().st_size <= 20_000
+        for line in f.read_text(encoding="utf-8").splitlines():
+            assert json.loads(line)["resourceSpans"]
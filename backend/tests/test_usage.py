@@ -0,0 +1,20 @@
+import pytest
+
+from simulation_engine.usage import DEFAULT_PRICES, cost_of, price_for
+
+
+@pytest.mark.parametrize("model, expected", [
+    ("glm-4", "glm-4"),
+    ("GLM-4-Plus", "glm-4-plus"),
+    ("glm-4-plus-0111", "glm-4-plus"),
+    ("models/gemini-1.5-flash", "gemini-1.5-flash"),
+    ("gemini-1.5-flash-002", "gemini-1.5-flash"),
+])
+def test_price_for_matches_exact_and_dash_suffixed_names(model, expected):
+    assert price_for(model) == DEFAULT_PRICES[expected]
+
+
+@pytest.mark.parametrize("model", ["glm-4.5", "glm-4v", "glm-4air", "gpt-4o", ""])
+def test_price_for_leaves_other_models_unpriced(model):
+    assert price_for(model) is None
+    assert cost_of(model, 1000, 1000) == (0.0, False)
@@ -1,13 +1,144 @@
+"""
+📊 Excel / CSV / Parquet FAQ 加载器 - 向量化拼接 + 分块流式
+===========================================================
+核心改进：
+1. 整列向量化拼接 prompt 文本，不再逐行 iterrows
+2. 大表按行分块流式读取（xlsx 走 openpyxl 只读模式，csv/parquet 原生分块）
+3. 列名可配置，支持多个候选列名（如 "问题" / "客户问题" / "question"）
+4. 在任何 LLM 调用之前，按 Q/A 哈希去重
+"""
+
+from pathlib import Path
+from typing import Dict, Hashable, Iterator, List, Optional, Sequence, Union
+
 import pandas as pd
 
-def load_excel(file_path):
-    # 假设 Excel 里有 "问题" 和 "回答" 两列
-    df = pd.read_excel(file_path)
+DEFAULT_CHUNK_ROWS = 5000
+
+# 逻辑列 → 候选的原始列名（按优先级）
+DEFAULT_COLUMN_MAP: Dict[str, Sequence[str]] = {
+    "question": ("问题", "客户问题", "咨询", "question", "Question", "Q"),
+    "answer": ("回答", "专家回复", "答复", "answer", "Answer", "A"),
+}
+
+PROMPT_TEMPLATE = ("客户咨询：", "\n专家回复：")
+
+ColumnMap = Dict[str, Union[str, Sequence[str]]]
+
+
+def _resolve_columns(columns: Sequence[Hashable], column_map: ColumnMap) -> Dict[str, Hashable]:
+    """把逻辑列映射到表头中真实存在的列（按去掉首尾空白后的名字匹配，返回原始列标签，可直接索引 DataFrame）"""
+    resolved = {}
+    available = {}
+    for column in columns:
+        available.setdefault(str(column).strip(), column)
+    for logical, candidates in column_map.items():
+        if isinstance(candidates, str):
+            candidates = (candidates,)
+        match = next((c for c in candidates if c in available), None)
+        if match is None:
+            raise ValueError(f"❌ 找不到 {logical} 列，候选: {list(candidates)}，表头: {list(available)}")
+        resolved[logical] = available[match]
+    return resolved
+
+
+def _iter_xlsx_frames(file_path: Path, sheet_name: Optional[str], chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """openpyxl 只读模式逐行读取，每 chunk_rows 行组装一个 DataFrame"""
+    from openpyxl import load_workbook
+
+    wb = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet_name] if sheet_name else wb.worksheets[0]
+        rows = ws.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = [str(h).strip() if h is not None else "" for h in header]
+
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= chunk_rows:
+                yield pd.DataFrame(batch, columns=header)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=header)
+    finally:
+        wb.close()
+
+
+def _iter_parquet_frames(file_path: Path, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    import pyarrow.parquet as pq
+
+    pf = pq.ParquetFile(file_path)
+    for batch in pf.iter_batches(batch_size=chunk_rows):
+        yield batch.to_pandas()
+
+
+def iter_frames(file_path, sheet_name: Optional[str] = None,
+                chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """按文件类型选择分块读取方式"""
+    file_path = Path(file_path)
+    suffix = file_path.suffix.lower()
+
+    if suffix in (".xlsx", ".xlsm"):
+        yield from _iter_xlsx_frames(file_path, sheet_name, chunk_rows)
+    elif suffix == ".xls":
+        # 老格式 openpyxl 不支持，只能整表读取
+        yield pd.read_excel(file_path, sheet_name=sheet_name or 0)
+    elif suffix in (".csv", ".tsv", ".txt"):
+        sep = "\t" if suffix == ".tsv" else ","
+        yield from pd.read_csv(file_path, sep=sep, chunksize=chunk_rows, dtype=str)
+    elif suffix == ".parquet":
+        yield from _iter_parquet_frames(file_path, chunk_rows)
+    else:
+        raise ValueError(f"❌ 不支持的文件类型: {suffix}")
+
+
+def iter_qa_chunks(file_path, column_map: Optional[ColumnMap] = None,
+                   sheet_name: Optional[str] = None,
+                   chunk_rows: int = DEFAULT_CHUNK_ROWS,
+                   dedupe: bool = True) -> Iterator[List[str]]:
+    """
+    流式产出「客户咨询 / 专家回复」文本，每次产出一个块（列表）
+
+    去重基于规范化后 Q/A 的 64 位哈希，跨块生效；空问题或空回答的行直接丢弃。
+    """
+    column_map = column_map or DEFAULT_COLUMN_MAP
+    seen_hashes = set()
+    resolved = None
+
+    for df in iter_frames(file_path, sheet_name, chunk_rows):
+        if resolved is None:
+            resolved = _resolve_columns(list(df.columns), column_map)
+
+        q = df[resolved["question"]].fillna("").astype(str).str.strip()
+        a = df[resolved["answer"]].fillna("").astype(str).str.strip()
+        mask = (q != "") & (a != "")
+        q, a = q[mask], a[mask]
+        if q.empty:
+            continue
+
+        if dedupe:
+            pairs = pd.DataFrame({"q": q.str.replace(r"\s+", "", regex=True),
+                                  "a": a.str.replace(r"\s+", "", regex=True)})
+            hashes = pd.util.hash_pandas_object(pairs, index=False)
+            # 块内去重 + 跨块去重
+            keep = ~hashes.duplicated() & ~hashes.isin(seen_hashes)
+            seen_hashes.update(hashes[keep].tolist())
+            q, a = q[keep.values], a[keep.values]
+
+        texts = (PROMPT_TEMPLATE[0] + q + PROMPT_TEMPLATE[1] + a).tolist()
+        if texts:
+            yield texts
+
+
+def load_excel(file_path, column_map: Optional[ColumnMap] = None,
+               sheet_name: Optional[str] = None,
+               chunk_rows: int = DEFAULT_CHUNK_ROWS,
+               dedupe: bool = True) -> List[str]:
+    """兼容旧接口：返回一个列表，每行一个案例"""
     text_chunks = []
-    
-    for index, row in df.iterrows():
-        # 拼成 AI 能读懂的格式
-        content = f"客户咨询：{row['问题']}\n专家回复：{row['回答']}"
-        text_chunks.append(content)
-        
-    return text_chunks # 返回一个列表，每行一个案例
\ No newline at end of file
+    for chunk in iter_qa_chunks(file_path, column_map, sheet_name, chunk_rows, dedupe):
+        text_chunks.extend(chunk)
+    return text_chunks
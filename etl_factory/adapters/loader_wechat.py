@@ -1,7 +1,218 @@
+"""
+💬 微信聊天记录加载器 - 流式逐行解析 + 按案例切分
+=================================================
+核心改进：
+1. 逐行流式解析（预编译正则），不再把整个导出文件读成一个字符串
+2. 保留发言人和时间戳元数据
+3. 按「时间间隔 + 发言轮次 + 字数上限」把长群聊切成案例大小的对话窗口
+4. 惰性产出窗口，超大导出文件可以边读边挖、并行处理，且不会撑爆模型上下文
+
+支持的行格式：
+- "[2026-01-26 10:00:00] 张三: 内容"       （方括号头，内容同行）
+- "张三 2026-01-26 10:00:00" + 下一行起为内容 （微信 PC 端导出；整行只有昵称 + 带秒的时间）
+- "时间：2026-01-26" 日期行 + "陈主管：" 发言人行 + 下一行起为内容（手工整理稿）
+
+发言人行只在空行、日期 / 元数据行之后（或文件开头）才认，
+正文里以冒号结尾的短句（如"我们的流程如下："）不会被当成换人。
+"""
+
 import re
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+DEFAULT_GAP_MINUTES = 30
+DEFAULT_MAX_TURNS = 30
+DEFAULT_MAX_CHARS = 3000
+
+# [2026-01-26 10:00:00] 张三: 内容
+BRACKET_LINE = re.compile(
+    r"^\[(?P<ts>\d{4}-\d{1,2}-\d{1,2}[ T]\d{1,2}:\d{2}(?::\d{2})?)\]\s*(?P<speaker>[^:：]{1,32})[:：]\s?(?P<text>.*)$"
+)
+# 张三 2026-01-26 10:00:00（昵称不含空白和标点，时间带秒，避免把"会议定在 2026-01-27 10:00"当成消息头）
+EXPORT_HEADER = re.compile(
+    r"^(?P<speaker>[^\s:：,，。.!！?？;；、]{1,32})\s+(?P<ts>\d{4}-\d{1,2}-\d{1,2}[ T]\d{1,2}:\d{2}:\d{2})$"
+)
+# 时间：2026-01-26
+DATE_LINE = re.compile(r"^(?:时间|日期)[:：]\s*(?P<date>\d{4}-\d{1,2}-\d{1,2})")
+# 陈主管：（整行只有发言人）
+SPEAKER_LINE = re.compile(r"^(?P<speaker>[^\s:：]{1,16})[:：]$")
+# 参与人：行政陈主管，顾问李工（元数据行，跳过）
+META_LINE = re.compile(r"^(?:参与人|群聊|群名称)[:：]")
+
+TS_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M")
+
+
+def _parse_ts(raw: str) -> Optional[datetime]:
+    for fmt in TS_FORMATS:
+        try:
+            return datetime.strptime(raw, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def iter_messages(lines: Iterable[str]) -> Iterator[Dict]:
+    """
+    逐行解析聊天记录，产出 {"speaker", "timestamp", "text"}
+
+    多行消息会被合并到同一条；没有时间戳的格式 timestamp 为 None（仅有日期时取当日 0 点）。
+    """
+    current: Optional[Dict] = None
+    current_date: Optional[datetime] = None
+
+    def _emit():
+        if current and current["text"].strip():
+            current["text"] = current["text"].strip()
+            return current
+        return None
+
+    # 上一行是否为空行 / 日期行 / 元数据行（或还在文件开头）：只有这时才认发言人行
+    at_break = True
+    for raw_line in lines:
+        line = raw_line.rstrip("\r\n").strip()
+        if not line:
+            at_break = True
+            continue
+        after_break, at_break = at_break, False
+
+        m = BRACKET_LINE.match(line)
+        if m:
+            done = _emit()
+            if done:
+                yield done
+            current = {"speaker": m.group("speaker").strip(), "timestamp": _parse_ts(m.group("ts")),
+                       "text": m.group("text")}
+            continue
+
+        m = EXPORT_HEADER.match(line)
+        if m:
+            done = _emit()
+            if done:
+                yield done
+            current = {"speaker": m.group("speaker").strip(), "timestamp": _parse_ts(m.group("ts")),
+                       "text": ""}
+            continue
+
+        m = DATE_LINE.match(line)
+        if m:
+            current_date = _parse_ts(m.group("date") + " 00:00")
+            at_break = True
+            continue
+
+        if META_LINE.match(line):
+            at_break = True
+            continue
+
+        m = SPEAKER_LINE.match(line) if after_break else None
+        if m:
+            done = _emit()
+            if done:
+                yield done
+            current = {"speaker": m.group("speaker"), "timestamp": current_date, "text": ""}
+            continue
+
+        if current is None:
+            # 没有任何头信息的开头内容，归到匿名发言人
+            current = {"speaker": "", "timestamp": current_date, "text": ""}
+        current["text"] += ("\n" if current["text"] else "") + line
+
+    done = _emit()
+    if done:
+        yield done
+
+
+def _split_text(text: str, max_chars: int) -> List[str]:
+    """把超长的一段发言按行切成不超过 max_chars 的块（单行超长时硬切）"""
+    chunks, current = [], ""
+    for line in text.split("\n"):
+        while len(line) > max_chars:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:max_chars])
+            line = line[max_chars:]
+        if current and len(current) + 1 + len(line) > max_chars:
+            chunks.append(current)
+            current = ""
+        current += ("\n" if current else "") + line
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _format_window(window: List[Dict]) -> str:
+    return "\n".join(f"{t['speaker']}：{t['text']}" if t["speaker"] else t["text"] for t in window)
+
+
+def iter_chat_cases(source, gap_minutes: int = DEFAULT_GAP_MINUTES,
+                    max_turns: int = DEFAULT_MAX_TURNS,
+                    max_chars: int = DEFAULT_MAX_CHARS,
+                    min_turns: int = 2) -> Iterator[Dict]:
+    """
+    把聊天记录切成案例大小的对话窗口，惰性产出
+
+    source: 文件路径，或任意行迭代器（如打开的文件对象）
+    切分规则：
+    1. 相邻两条消息间隔超过 gap_minutes → 新案例
+    2. 窗口内发言轮次（同一人连续发言合并为一轮）达到 max_turns → 新案例
+    3. 窗口字数超过 max_chars → 新案例（防止超出模型上下文）；单条发言本身超长时按行切成多块
+    因时间间隔切出的、少于 min_turns 轮的窗口（如一句"收到"）会被丢弃；
+    被字数撑满的窗口及其续段即使只有一个人在说（长篇独白）也保留。
+    """
+    if isinstance(source, (str, Path)):
+        with open(source, "r", encoding="utf-8", errors="replace") as f:
+            yield from iter_chat_cases(f, gap_minutes, max_turns, max_chars, min_turns)
+        return
+
+    gap = timedelta(minutes=gap_minutes)
+    window: List[Dict] = []
+    window_chars = 0
+    last_ts: Optional[datetime] = None
+    case_index = 0
+    # 当前窗口是被字数切开的续段（长篇独白的后半截），轮次少也保留
+    continued = False
+
+    def _build_case():
+        return {
+            "case_id": case_index,
+            "start": window[0]["timestamp"].isoformat() if window[0]["timestamp"] else None,
+            "end": window[-1]["timestamp"].isoformat() if window[-1]["timestamp"] else None,
+            "speakers": sorted({t["speaker"] for t in window if t["speaker"]}),
+            "turns": window,
+            "text": _format_window(window),
+        }
+
+    for msg in iter_messages(source):
+        ts = msg["timestamp"]
+        time_break = ts is not None and last_ts is not None and ts - last_ts > gap
+        for text in _split_text(msg["text"], max_chars):
+            same_speaker = bool(window) and window[-1]["speaker"] == msg["speaker"]
+            new_turns = len(window) + (0 if same_speaker else 1)
+            char_overflow = bool(window) and window_chars + len(text) > max_chars
+            overflow = bool(window) and (new_turns > max_turns or char_overflow)
+
+            if window and (time_break or overflow):
+                # 被字数撑满的窗口（长篇独白）即使轮次不够也保留
+                if len(window) >= min_turns or continued or (char_overflow and window_chars * 2 >= max_chars):
+                    yield _build_case()
+                    case_index += 1
+                continued = char_overflow and same_speaker and not time_break
+                window, window_chars, same_speaker = [], 0, False
+            time_break = False
+
+            if same_speaker:
+                window[-1]["text"] += "\n" + text
+            else:
+                window.append({"speaker": msg["speaker"], "timestamp": ts, "text": text})
+            window_chars += len(text)
+        if ts is not None:
+            last_ts = ts
+
+    if window and (len(window) >= min_turns or continued):
+        yield _build_case()
+
 
-def clean_chat_log(raw_text):
-    # 去掉 "[2026-01-26 10:00:00] 张三:" 这种头
-    clean_text = re.sub(r"\[.*?\] .*?:", "", raw_text)
-    # 去掉空行
-    return clean_text.strip()
\ No newline at end of file
+def clean_chat_log(raw_text: str) -> str:
+    """兼容旧接口：去掉发言头，只保留正文"""
+    return "\n".join(m["text"] for m in iter_messages(raw_text.splitlines())).strip()
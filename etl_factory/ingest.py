@@ -18,6 +18,11 @@ sys.path.append(str(BASE_DIR))
 # 引入专家提示词
 from backend.simulation_engine.prompts import expert_prompt
 from backend.simulation_engine.domain_manager import DomainManager
+from backend.simulation_engine.http_pool import openai_client_kwargs
+from backend.simulation_engine.deadlines import provider_timeout
+from backend.simulation_engine.inbox_store import get_inbox_store
+from etl_factory.adapters.loader_wechat import iter_chat_cases
+from etl_factory.judge import TaxonomyIndex, judge_pairs
 
 api_key = os.getenv("OPENAI_API_KEY")
 api_base = os.getenv("OPENAI_API_BASE", "https://open.bigmodel.cn/api/paas/v4/")
@@ -34,7 +39,9 @@ llm = ChatOpenAI(
     model="glm-4",
     temperature=0.01,
     openai_api_key=api_key,
-    openai_api_base=api_base
+    openai_api_base=api_base,
+    timeout=provider_timeout("glm"),  # GLM_TIMEOUT / LLM_CALL_TIMEOUT：卡住的连接超时后报错，不会拖住整批质检
+    **openai_client_kwargs()  # 共享连接池：批量质检时复用 keep-alive 连接
 )
 
 extract_prompt = ChatPromptTemplate.from_template("""
@@ -52,70 +59,86 @@ extract_prompt = ChatPromptTemplate.from_template("""
 # ==========================================
 LOG_FILE = Path(__file__).parent / "processing_log.json"
 
+def save_reports(records):
+    """把一批质检结果追加到收件箱，供前端读取（走 InboxStore：持 write_lock("inbox")，原子写回）"""
+    if not records:
+        return
+    # 加上时间戳和唯一ID（同一秒内的多条记录用序号区分）
+    batch_ts = int(time.time() * 1000)
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    for i, record in enumerate(records):
+        record["id"] = f"etl_{batch_ts}_{i}"
+        record["timestamp"] = now
+    get_inbox_store(LOG_FILE).insert(records, front=False)
+    print(f"💾 {len(records)} 份报告已存档至: {LOG_FILE.name}")
+
 def save_report(record):
-    """把质检结果存入 JSON 文件，供前端读取"""
-    if not LOG_FILE.exists():
-        with open(LOG_FILE, 'w', encoding='utf-8') as f:
-            json.dump([], f)
-    
-    with open(LOG_FILE, 'r+', encoding='utf-8') as f:
-        try:
-            data = json.load(f)
-        except:
-            data = []
-        
-        # 加上时间戳和唯一ID
-        record["id"] = f"etl_{int(time.time())}"
-        record["timestamp"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        data.append(record)
-        f.seek(0)
-        json.dump(data, f, ensure_ascii=False, indent=2)
-    
-    print(f"💾 报告已存档至: {LOG_FILE.name}")
+    """兼容旧接口：存一条"""
+    save_reports([record])
 
 # ==========================================
 # 4. 核心功能：模拟考
 # ==========================================
-def run_mock_exam(novice_intent, ground_truth_term):
-    print(f"\n📝 [模拟考] 正在测试当前 Expert Agent 的能力...")
-    
-    dm = DomainManager("hr")
-    taxonomy_context = dm.get_expert_context()
+_domain_cache = {}
+
+def _get_domain(domain="hr"):
+    """知识库上下文和服务索引只构建一次"""
+    if domain not in _domain_cache:
+        dm = DomainManager(domain)
+        _domain_cache[domain] = (
+            dm.get_expert_context(),
+            TaxonomyIndex(dm.domain_db.get("taxonomy", []))
+        )
+    return _domain_cache[domain]
+
+def ask_expert(novice_intent, domain="hr"):
+    """让当前 Expert Agent 作答（每个案例一次调用，不含判卷）"""
+    taxonomy_context, _ = _get_domain(domain)
     
     chain = expert_prompt | llm
     response = chain.invoke({
-        "domain": "hr",
+        "domain": domain,
         "taxonomy_context": taxonomy_context,
         "messages": [{"role": "user", "content": novice_intent}]
     })
     
     ai_answer_raw = response.content
     print(f"   🤖 Expert Agent 回答: {ai_answer_raw[:40]}...")
-    
-    judge_prompt = ChatPromptTemplate.from_template("""
-    我是系统判卷员。请判断以下两个服务名称是否属于同一个服务范畴？
-    标准答案: {ground_truth}
-    AI回答: {ai_answer}
-    
-    如果意思相近且属于同一领域，输出 TRUE。如果不相关或 AI 明确拒绝，输出 FALSE。只输出单词。
-    """)
-    judge_chain = judge_prompt | llm
-    verdict = judge_chain.invoke({
-        "ground_truth": ground_truth_term,
-        "ai_answer": ai_answer_raw
-    }).content.strip()
+    return ai_answer_raw
 
-    return verdict == "TRUE", ai_answer_raw
+def run_mock_exam(novice_intent, ground_truth_term):
+    """兼容旧接口：单个案例作答 + 判卷"""
+    print("\n📝 [模拟考] 正在测试当前 Expert Agent 的能力...")
+    ai_answer_raw = ask_expert(novice_intent)
+    _, index = _get_domain()
+    verdict = judge_pairs([(ground_truth_term, ai_answer_raw)], llm, index)[0]
+    return verdict["passed"], ai_answer_raw
 
 # ==========================================
 # 5. 主流水线
 # ==========================================
 def process_file(file_path):
+    """提取 + 作答，返回待判卷的案例列表（判卷统一在 judge_and_save 中批量进行）"""
     print(f"\n📂 读取: {file_path.name}")
-    with open(file_path, "r", encoding="utf-8") as f:
-        raw_content = f.read()
-
+    exams = []
+    # 按时间间隔 / 发言轮次把长聊天记录切成案例，边读边挖
+    case_count = 0
+    for case in iter_chat_cases(file_path):
+        case_count += 1
+        exam = process_case(case["text"], f"{file_path.name}#{case['case_id']}")
+        if exam:
+            exams.append(exam)
+
+    if case_count == 0:
+        # 不是聊天格式的原料，整份交给模型
+        with open(file_path, "r", encoding="utf-8") as f:
+            exam = process_case(f.read(), file_path.name)
+        if exam:
+            exams.append(exam)
+    return exams
+
+
+def process_case(raw_content, source_name):
     # Step 1: 提取
     print("⛏️  正在提取 Ground Truth...")
     chain = extract_prompt | llm
@@ -132,31 +155,42 @@ def process_file(file_path):
         print(f"   🎯 提取结果: {expert_term}")
     except Exception as e:
         print(f"❌ 提取失败: {e}")
-        return
-
-    # Step 2: 质检
-    is_pass, ai_answer = run_mock_exam(novice_intent, expert_term)
-
-    status = "PASS" if is_pass else "REJECT"
-    print("-" * 40)
-    print(f"🏁 最终判定: {status}")
-    print("-" * 40)
+        return None
 
-    # Step 3: 存档 (New!)
-    report = {
-        "file_source": file_path.name,
+    # Step 2: 模拟考作答
+    print("\n📝 [模拟考] 正在测试当前 Expert Agent 的能力...")
+    ai_answer = ask_expert(novice_intent)
+    return {
+        "file_source": source_name,
         "novice_intent": novice_intent,
         "ground_truth_term": expert_term,
         "current_ai_response": ai_answer,
-        "status": status, # PASS 或 REJECT
-        "action_required": not is_pass # 如果是 Reject，则需要人工处理
     }
-    save_report(report)
 
-# ... (上面的 import, extract_prompt, run_mock_exam, process_file 全部保持原样！！！) ...
+
+def judge_and_save(exams, batch_size=10):
+    """Step 3 + 4: 本地快判 + 批量判卷，然后存档这一批"""
+    if not exams:
+        return
+    _, index = _get_domain()
+    pairs = [(e["ground_truth_term"], e["current_ai_response"]) for e in exams]
+    verdicts = judge_pairs(pairs, llm, index, batch_size=batch_size)
+
+    reports = []
+    for exam, verdict in zip(exams, verdicts):
+        is_pass = verdict["passed"]
+        status = "PASS" if is_pass else "REJECT"
+        print(f"🏁 {exam['file_source']}: {status} ({verdict['judged_by']})")
+        reports.append({
+            **exam,
+            "status": status, # PASS 或 REJECT
+            "judged_by": verdict["judged_by"],
+            "action_required": not is_pass # 如果是 Reject，则需要人工处理
+        })
+    save_reports(reports)
 
 # ==========================================
-# 4. 运行主程序 (微创升级版：批量扫描)
+# 6. 运行主程序 (批量扫描 → 批量判卷)
 # ==========================================
 if __name__ == "__main__":
     # 定义原料仓库目录
@@ -169,9 +203,19 @@ if __name__ == "__main__":
         print(f"⚠️ 仓库为空: {raw_dir} 下没有 .txt 文件")
     else:
         print(f"📦 发现 {len(txt_files)} 个文件，开始批量处理...\n")
+        batch_size = int(os.getenv("JUDGE_BATCH_SIZE", "10"))
+        pending = []
         for file_path in txt_files:
-            process_file(file_path)
+            pending.extend(process_file(file_path))
+            # 攒满一批就判卷存档：后面的文件出错不会丢掉已经作答（已付费）的结果
+            while len(pending) >= batch_size:
+                judge_and_save(pending[:batch_size], batch_size=batch_size)
+                pending = pending[batch_size:]
             print("\n" + "="*50 + "\n") # 文件之间加个分割线
+        
+        print("-" * 40)
+        print(f"⚖️ 判卷剩余 {len(pending)} 个案例")
+        print("-" * 40)
+        judge_and_save(pending, batch_size=batch_size)
             
     print("🎉 所有文件处理完毕！")
-
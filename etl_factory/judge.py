@@ -0,0 +1,205 @@
+"""
+⚖️ ETL 判卷员 - 本地快判 + 批量 LLM 判卷
+=========================================
+核心改进：
+1. 明显的结果先在本地判定（规范化字符串相似度 + 知识库服务索引），不花 LLM 调用
+2. 剩下拿不准的 (标准答案, AI回答) 对，每 N 对拼成一个 prompt 交给判卷 LLM
+3. 判卷 LLM 输出结构化 JSON，按编号对回每一对
+"""
+
+import json
+import re
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.prompts import ChatPromptTemplate
+
+DEFAULT_BATCH_SIZE = 10
+# 规范化后相似度超过该阈值直接判 TRUE
+SIMILARITY_THRESHOLD = 0.85
+
+# 去掉英文注释括号、标点和空白，只保留用于比较的主体
+_PAREN = re.compile(r"[\(（][^\)）]*[\)）]")
+_NOISE = re.compile(r"[\s\"'“”‘’「」『』《》、，,。.:：;；!！?？\-_]+")
+
+judge_batch_prompt = ChatPromptTemplate.from_template("""
+我是系统判卷员。下面有若干组 (标准答案, AI回答)，请逐组判断两者是否属于同一个服务范畴。
+如果意思相近且属于同一领域，判 true。如果不相关或 AI 明确拒绝，判 false。
+
+{pairs}
+
+只输出合法 JSON，格式如下，不要输出任何其他内容：
+{{"verdicts": [{{"idx": 0, "same": true}}, {{"idx": 1, "same": false}}]}}
+""")
+
+
+def normalize_term(text: str) -> str:
+    """规范化服务名称：去括号注释、标点、空白，统一小写"""
+    if not text:
+        return ""
+    return _NOISE.sub("", _PAREN.sub("", str(text))).lower()
+
+
+def parse_service(ai_answer: str) -> Optional[str]:
+    """从专家的 JSON 回答里取 analysis_data.matched_service，取不到返回 None"""
+    start = ai_answer.find("{")
+    if start != -1:
+        try:
+            data, _ = json.JSONDecoder().raw_decode(ai_answer[start:])
+            service = data.get("analysis_data", {}).get("matched_service")
+            if service:
+                return str(service)
+        except (ValueError, AttributeError):
+            pass
+    return None
+
+
+def extract_service(ai_answer: str) -> str:
+    """专家回答通常是 JSON，优先取 analysis_data.matched_service，否则原样返回"""
+    return parse_service(ai_answer) or ai_answer
+
+
+class TaxonomyIndex:
+    """知识库服务索引：规范化名称 / 别名 → (大类, 标准服务名)"""
+
+    def __init__(self, taxonomy: List[dict]):
+        self.index: Dict[str, Tuple[str, str]] = {}
+        for category in taxonomy:
+            cat_name = category.get("name", "")
+            for service in category.get("services", []):
+                self.index[normalize_term(service)] = (cat_name, service)
+                # "灵活用工/兼职招聘" 的每个别名都能命中
+                for alias in re.split(r"[/／]", _PAREN.sub("", service)):
+                    key = normalize_term(alias)
+                    if len(key) >= 2:
+                        self.index.setdefault(key, (cat_name, service))
+        # 长别名优先，避免短词误命中
+        self._keys = sorted(self.index, key=len, reverse=True)
+
+    def resolve(self, text: str) -> Optional[Tuple[str, str]]:
+        key = normalize_term(text)
+        if not key:
+            return None
+        if key in self.index:
+            return self.index[key]
+        for alias in self._keys:
+            if alias in key:
+                return self.index[alias]
+        return None
+
+
+def local_verdict(ground_truth: str, ai_answer: str,
+                  index: Optional[TaxonomyIndex] = None) -> Optional[bool]:
+    """
+    本地快判：能确定就返回 True/False，拿不准返回 None 交给 LLM
+
+    - 规范化后相等 / 相似度 ≥ 阈值 → True
+    - 回答解析出了服务名，且与标准答案互相包含 / 解析到同一个标准服务 → True
+    - 两者解析到不同大类的标准服务 → False
+
+    回答没有解析出服务名（原文兜底）时不按包含关系判 True：
+    "这不属于劳务派遣" 包含 "劳务派遣"，但意思正相反，交给 LLM
+    """
+    service = parse_service(ai_answer)
+    answer = service or ai_answer
+    gt_norm, ans_norm = normalize_term(ground_truth), normalize_term(answer)
+    if not gt_norm or not ans_norm:
+        return None
+
+    if gt_norm == ans_norm:
+        return True
+    if service and (gt_norm in ans_norm or ans_norm in gt_norm):
+        return True
+    if SequenceMatcher(None, gt_norm, ans_norm).ratio() >= SIMILARITY_THRESHOLD:
+        return True
+
+    if index is not None:
+        gt_hit, ans_hit = index.resolve(ground_truth), index.resolve(answer)
+        if gt_hit and ans_hit:
+            if gt_hit[1] == ans_hit[1]:
+                return True if service else None
+            if gt_hit[0] != ans_hit[0]:
+                return False
+    return None
+
+
+# 判卷 LLM 偶尔把布尔值写成字符串 / 数字；认不出的一律当作漏判
+_TRUE_WORDS = {"true", "1", "yes", "y", "是", "相同", "一致"}
+_FALSE_WORDS = {"false", "0", "no", "n", "否", "不同", "不一致"}
+
+
+def _parse_same(value) -> Optional[bool]:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str):
+        word = value.strip().lower()
+        if word in _TRUE_WORDS:
+            return True
+        if word in _FALSE_WORDS:
+            return False
+    return None
+
+
+def _parse_verdicts(content: str) -> Dict[int, bool]:
+    start = content.find("{")
+    if start == -1:
+        return {}
+    try:
+        data, _ = json.JSONDecoder().raw_decode(content[start:])
+    except ValueError:
+        return {}
+    verdicts = {}
+    for item in data.get("verdicts", []):
+        try:
+            idx, same = int(item["idx"]), _parse_same(item["same"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if same is not None:
+            verdicts[idx] = same
+    return verdicts
+
+
+def judge_pairs(pairs: List[Tuple[str, str]], llm, index: Optional[TaxonomyIndex] = None,
+                batch_size: int = DEFAULT_BATCH_SIZE) -> List[Dict]:
+    """
+    判定一组 (标准答案, AI回答)
+
+    返回与输入等长的列表：{"passed": bool, "judged_by": "local" | "llm" | "llm_missing"}
+    判卷 LLM 漏判或调用失败（限流、超时等）的组记为 llm_missing，保守判 REJECT 交给人工，
+    一批出错不影响其他批次
+    """
+    results: List[Optional[Dict]] = [None] * len(pairs)
+    pending: List[int] = []
+
+    for i, (ground_truth, ai_answer) in enumerate(pairs):
+        verdict = local_verdict(ground_truth, ai_answer, index)
+        if verdict is None:
+            pending.append(i)
+        else:
+            results[i] = {"passed": verdict, "judged_by": "local"}
+
+    print(f"   ⚖️ 本地快判 {len(pairs) - len(pending)} 组，交给 LLM {len(pending)} 组")
+
+    chain = judge_batch_prompt | llm
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        lines = []
+        for local_idx, i in enumerate(batch):
+            ground_truth, ai_answer = pairs[i]
+            lines.append(f"[{local_idx}] 标准答案: {ground_truth}\n    AI回答: {extract_service(ai_answer)[:300]}")
+        try:
+            verdicts = _parse_verdicts(chain.invoke({"pairs": "\n".join(lines)}).content)
+        except Exception as e:
+            print(f"   ⚠️ 判卷 LLM 调用失败（{len(batch)} 组记为 llm_missing）: {e}")
+            verdicts = {}
+
+        for local_idx, i in enumerate(batch):
+            if local_idx in verdicts:
+                results[i] = {"passed": verdicts[local_idx], "judged_by": "llm"}
+            else:
+                # 判卷员漏判：保守判 REJECT，交给人工
+                results[i] = {"passed": False, "judged_by": "llm_missing"}
+
+    return results
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# 与 ingest.py 一致：从仓库根目录按 etl_factory.xxx 导入
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
@@ -0,0 +1,7 @@
+from etl_factory.judge import _parse_verdicts
+
+
+def test_verdict_strings_are_parsed_strictly():
+    content = ('{"verdicts": [{"idx": 0, "same": "false"}, {"idx": 1, "same": "是"}, {"idx": 2, "same": true}, '
+               '{"idx": 3, "same": "否"}, {"idx": 4, "same": 0}, {"idx": 5, "same": "maybe"}, {"idx": 6, "same": null}]}')
+    assert _parse_verdicts(content) == {0: False, 1: True, 2: True, 3: False, 4: False}
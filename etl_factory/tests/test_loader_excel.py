@@ -0,0 +1,21 @@
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+from etl_factory.adapters.loader_excel import _resolve_columns, load_excel  # noqa: E402
+
+
+def test_resolve_columns_returns_original_labels():
+    resolved = _resolve_columns([" 问题 ", "回答\t", 3], {"question": "问题", "answer": ("answer", "回答")})
+    assert resolved == {"question": " 问题 ", "answer": "回答\t"}
+
+
+def test_resolve_columns_reports_missing_column():
+    with pytest.raises(ValueError):
+        _resolve_columns(["问题"], {"question": "问题", "answer": "回答"})
+
+
+def test_load_csv_with_padded_headers(tmp_path):
+    path = tmp_path / "faq.csv"
+    pd.DataFrame({" 问题 ": ["怎么转社保", "怎么转社保"], "回答 ": ["先办停保", "先办停保"]}).to_csv(path, index=False)
+    assert load_excel(path) == ["客户咨询：怎么转社保\n专家回复：先办停保"]
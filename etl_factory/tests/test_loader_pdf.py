@@ -0,0 +1,13 @@
+import pytest
+
+pytest.importorskip("pdfplumber")
+
+from etl_factory.adapters.loader_pdf import _iter_units  # noqa: E402
+
+
+def test_sentence_split_keeps_spacing_between_english_sentences():
+    paragraph = "Hello world. This is English. 中文第一句。中文第二句！" * 3
+    units = list(_iter_units(paragraph, chunk_size=40))
+    assert len(units) > 2
+    assert "".join(units).strip() == paragraph
+    assert all(len(unit) <= 40 for unit in units)
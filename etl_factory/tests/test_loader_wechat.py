@@ -0,0 +1,50 @@
+from etl_factory.adapters.loader_wechat import iter_chat_cases, iter_messages
+
+
+def _messages(text):
+    return list(iter_messages(text.splitlines()))
+
+
+def test_colon_ending_content_line_is_not_a_speaker():
+    msgs = _messages("陈主管：\n我们的流程如下：\n先提申请，再走审批。\n\n李工：\n好的")
+    assert [m["speaker"] for m in msgs] == ["陈主管", "李工"]
+    assert msgs[0]["text"] == "我们的流程如下：\n先提申请，再走审批。"
+
+
+def test_speaker_line_after_date_and_meta_lines():
+    msgs = _messages("时间：2026-01-26\n参与人：陈主管，李工\n陈主管：\n空调坏了\n\n李工：\n马上来")
+    assert [(m["speaker"], m["text"]) for m in msgs] == [("陈主管", "空调坏了"), ("李工", "马上来")]
+    assert msgs[0]["timestamp"].isoformat() == "2026-01-26T00:00:00"
+
+
+def test_content_ending_in_datetime_is_not_a_header():
+    msgs = _messages("张三 2026-01-26 10:00:00\n会议定在 2026-01-27 10:00\n请准时参加\n李四 2026-01-26 10:01:00\n收到")
+    assert [m["speaker"] for m in msgs] == ["张三", "李四"]
+    assert msgs[0]["text"] == "会议定在 2026-01-27 10:00\n请准时参加"
+
+
+def test_export_header_and_bracket_lines():
+    msgs = _messages("[2026-01-26 10:00:00] 张三: 你好\n李四 2026-01-26 10:01:00\n在的")
+    assert [(m["speaker"], m["text"]) for m in msgs] == [("张三", "你好"), ("李四", "在的")]
+
+
+def test_oversized_single_speaker_window_is_split_not_dropped():
+    lines = ["[2026-01-26 10:00:00] 张三: " + "长" * 50] + ["续" * 50] * 9  # 一条 500 字的独白
+    cases = list(iter_chat_cases(lines, max_chars=200))
+    text = "".join(t["text"].replace("\n", "") for c in cases for t in c["turns"])
+    assert len(cases) > 1
+    assert all(len(c["turns"][0]["text"]) <= 200 for c in cases)
+    assert text == "长" * 50 + "续" * 450
+
+
+def test_single_line_longer_than_max_chars_is_hard_split():
+    cases = list(iter_chat_cases(["[2026-01-26 10:00:00] 张三: " + "字" * 450], max_chars=200))
+    assert [len(c["turns"][0]["text"]) for c in cases] == [200, 200, 50]
+
+
+def test_short_window_split_by_time_gap_is_dropped():
+    lines = ["[2026-01-26 10:00:00] 张三: 收到",
+             "[2026-01-26 12:00:00] 李四: 空调坏了", "[2026-01-26 12:01:00] 王五: 马上来"]
+    cases = list(iter_chat_cases(lines))
+    assert len(cases) == 1
+    assert cases[0]["speakers"] == ["李四", "王五"]
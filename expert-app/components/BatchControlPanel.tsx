@@ -16,6 +16,14 @@ interface BatchStatus {
     recent_errors: Array<{ id: string; error: string }>;
 }
 
+// /ws/events 推送帧：{"events": [{topic, domain, ts, data}]}
+interface PushEvent {
+    topic: string;
+    domain: string | null;
+    ts: number;
+    data: any;
+}
+
 export const BatchControlPanel: React.FC = () => {
     const [status, setStatus] = useState<BatchStatus | null>(null);
     const [batchSize, setBatchSize] = useState(5);
@@ -26,19 +34,49 @@ export const BatchControlPanel: React.FC = () => {
 
     const fetchStatus = useCallback(async () => {
         try {
-            const res = await fetch(`${API_BASE}/api/batch/status`);
+            const res = await fetch(`${API_BASE}/api/batch/status?domain=${domain}`);
             const data = await res.json();
             setStatus(data);
         } catch (err) {
             console.error('Failed to fetch batch status', err);
         }
-    }, [API_BASE]);
+    }, [API_BASE, domain]);
 
+    // 状态由 /ws/events 推送（batch.status 快照）；WebSocket 断开期间退回 2 秒轮询，5 秒后重连
     useEffect(() => {
         fetchStatus();
-        const interval = setInterval(fetchStatus, 2000);
-        return () => clearInterval(interval);
-    }, [fetchStatus]);
+        let ws: WebSocket | null = null;
+        let poll: ReturnType<typeof setInterval> | null = null;
+        let retry: ReturnType<typeof setTimeout> | null = null;
+        let closed = false;
+
+        const stopPolling = () => {
+            if (poll) clearInterval(poll);
+            poll = null;
+        };
+        const connect = () => {
+            ws = new WebSocket(`${API_BASE.replace(/^http/, 'ws')}/ws/events?topics=batch&domain=${domain}`);
+            ws.onopen = stopPolling;
+            ws.onmessage = (msg) => {
+                const { events } = JSON.parse(msg.data) as { events: PushEvent[] };
+                const latest = events.filter(e => e.topic === 'batch.status' && e.domain === domain).pop();
+                if (latest) setStatus(latest.data as BatchStatus);
+            };
+            ws.onclose = () => {
+                if (closed) return;
+                if (!poll) poll = setInterval(fetchStatus, 2000);
+                retry = setTimeout(connect, 5000);
+            };
+        };
+        connect();
+
+        return () => {
+            closed = true;
+            ws?.close();
+            stopPolling();
+            if (retry) clearTimeout(retry);
+        };
+    }, [API_BASE, domain, fetchStatus]);
 
     const handleStart = async () => {
         setLoading(true);
@@ -61,18 +99,18 @@ export const BatchControlPanel: React.FC = () => {
     };
 
     const handlePause = async () => {
-        await fetch(`${API_BASE}/api/batch/pause`, { method: 'POST' });
+        await fetch(`${API_BASE}/api/batch/pause?domain=${domain}`, { method: 'POST' });
         fetchStatus();
     };
 
     const handleResume = async () => {
-        await fetch(`${API_BASE}/api/batch/resume`, { method: 'POST' });
+        await fetch(`${API_BASE}/api/batch/resume?domain=${domain}`, { method: 'POST' });
         fetchStatus();
     };
 
     const handleCancel = async () => {
         if (!confirm('确定要取消当前批量任务吗？')) return;
-        await fetch(`${API_BASE}/api/batch/cancel`, { method: 'POST' });
+        await fetch(`${API_BASE}/api/batch/cancel?domain=${domain}`, { method: 'POST' });
         fetchStatus();
     };
 
@@ -30,10 +30,18 @@ interface TraceRecord {
   diagnosis_trace?: any[];
 }
 
+// /api/taxonomy 精简视图：只有名称和计数，记录正文走 /api/taxonomy/records
 interface TaxonomyCategory {
   name: string;
   services: string[];
-  trace_records?: { [key: string]: TraceRecord[] };
+  record_count?: number;
+  trace_counts?: { [key: string]: number };
+}
+
+interface TraceRecordPage {
+  service: string;
+  total: number;
+  records: TraceRecord[];
 }
 
 interface TaxonomyData {
@@ -357,9 +365,7 @@ const KnowledgeGalaxy = () => {
         const catNodeX = catIndex * 280;
         const catNodeY = 150;
 
-        const catRecordCount = category.trace_records
-          ? Object.values(category.trace_records).reduce((sum, arr) => sum + arr.length, 0)
-          : 0;
+        const catRecordCount = category.record_count || 0;
 
         newNodes.push({
           id: catId,
@@ -387,8 +393,8 @@ const KnowledgeGalaxy = () => {
         category.services.forEach((service, svcIndex) => {
           const svcId = `svc-${catIndex}-${svcIndex}`;
 
-          const hasTraceRecord = category.trace_records &&
-            Object.keys(category.trace_records).some(key =>
+          const hasTraceRecord = category.trace_counts &&
+            Object.keys(category.trace_counts).some(key =>
               key.includes(service) || service.includes(key)
             );
 
@@ -452,37 +458,39 @@ const KnowledgeGalaxy = () => {
   }, [fetchAllData, fetchCoverage]);
 
   // 点击事件
-  const onNodeClick = useCallback((event: any, node: Node) => {
+  const onNodeClick = useCallback(async (event: any, node: Node) => {
     setSelectedNode(node);
+    setLinkedLog(undefined);
 
     const serviceName = node.data.label;
     let matchedRecord: LogItem | undefined;
 
-    for (const cat of taxonomyCache) {
-      if (cat.trace_records) {
-        for (const [key, records] of Object.entries(cat.trace_records)) {
-          if (key.includes(serviceName) || serviceName.includes(key)) {
-            if (records.length > 0) {
-              // 获取最新的记录
-              const r = records[records.length - 1];
-              matchedRecord = {
-                id: r.id,
-                timestamp: r.timestamp,
-                query: r.query,
-                ai_prediction: r.ai_prediction,
-                confidence: r.confidence,
-                persona: r.persona,
-                tone: r.tone,
-                // 🆕 V6.0 新增：读取对话路径
-                dialogue_path: r.dialogue_path,
-                ai_reasoning: r.diagnosis_trace?.[0]?.diagnosis || `基于「${r.ai_prediction}」进行分类匹配`,
-              };
-              break;
-            }
-          }
+    // 追踪记录不随分类树下发，点击服务节点时按需取最新一条
+    const hasRecords = taxonomyCache.some(cat =>
+      Object.keys(cat.trace_counts || {}).some(key => key && (key.includes(serviceName) || serviceName.includes(key)))
+    );
+    if (hasRecords) {
+      try {
+        const res = await fetch(`${API_BASE}/api/taxonomy/records?service=${encodeURIComponent(serviceName)}&limit=1`);
+        const page: TraceRecordPage = await res.json();
+        const r = page.records?.[0];
+        if (r) {
+          matchedRecord = {
+            id: r.id,
+            timestamp: r.timestamp,
+            query: r.query,
+            ai_prediction: r.ai_prediction,
+            confidence: r.confidence,
+            persona: r.persona,
+            tone: r.tone,
+            // 🆕 V6.0 新增：读取对话路径
+            dialogue_path: r.dialogue_path,
+            ai_reasoning: r.diagnosis_trace?.[0]?.diagnosis || `基于「${r.ai_prediction}」进行分类匹配`,
+          };
         }
+      } catch (err) {
+        console.error("Failed to load trace records", err);
       }
-      if (matchedRecord) break;
     }
 
     if (!matchedRecord) {
@@ -490,7 +498,7 @@ const KnowledgeGalaxy = () => {
     }
 
     setLinkedLog(matchedRecord);
-  }, [logsCache, taxonomyCache]);
+  }, [logsCache, taxonomyCache, API_BASE]);
 
   return (
     <div style={{ height: '100%', width: '100%', background: '#020617' }} className="relative group">
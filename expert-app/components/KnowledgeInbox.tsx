@@ -1,4 +1,4 @@
-import React, { useEffect, useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import { CheckCircle, AlertCircle, RefreshCw, Database, Clock, Filter, X, User, Bot, MessageSquare, ChevronDown, ChevronUp } from 'lucide-react';
 
 interface DialogueStep {
@@ -26,6 +26,30 @@ interface LogItem {
   key_questions?: string[];
 }
 
+// 收件箱增量同步响应（/api/etl/inbox/changes）
+interface InboxChanges {
+  epoch: string;
+  seq: number;
+  full: boolean;
+  upserts: LogItem[];
+  removed: string[];
+  etag: string;
+}
+
+// 把增量合并进本地列表：full 时整体替换，否则删墓碑、按 id 原地覆盖，新增的插到最前面（与后端收件箱顺序一致）
+const applyChanges = (prev: LogItem[], changes: InboxChanges): LogItem[] => {
+  if (changes.full) return changes.upserts;
+  if (changes.upserts.length === 0 && changes.removed.length === 0) return prev;
+  const removed = new Set(changes.removed);
+  const upserts = new Map(changes.upserts.map(l => [l.id, l]));
+  const kept = prev
+    .filter(l => !removed.has(l.id))
+    .map(l => upserts.get(l.id) ?? l);
+  const known = new Set(kept.map(l => l.id));
+  const added = changes.upserts.filter(l => !known.has(l.id));
+  return [...added, ...kept];
+};
+
 // --- 对话详情弹窗组件 ---
 const DialogueModal = ({ log, onClose }: { log: LogItem; onClose: () => void }) => {
   if (!log) return null;
@@ -127,13 +151,22 @@ export const KnowledgeInbox: React.FC = () => {
 
   const API_BASE = process.env.NEXT_PUBLIC_API_URL || "http://127.0.0.1:8000";
 
+  // 增量同步游标：上次响应的 epoch / seq / etag
+  const cursor = useRef<{ epoch: string; seq: number; etag: string } | null>(null);
+
   const fetchLogs = async () => {
     setLoading(true);
     try {
-      const res = await fetch(`${API_BASE}/api/etl/inbox`);
-      const data = await res.json();
-      if (Array.isArray(data)) {
-        setLogs(data);
+      const c = cursor.current;
+      const res = await fetch(
+        c ? `${API_BASE}/api/etl/inbox/changes?since=${c.seq}&epoch=${c.epoch}` : `${API_BASE}/api/etl/inbox/changes`,
+        { headers: c ? { 'If-None-Match': c.etag } : {} }
+      );
+      if (res.status === 304) return;  // 没有新变化
+      const data: InboxChanges = await res.json();
+      if (data && Array.isArray(data.upserts)) {
+        cursor.current = { epoch: data.epoch, seq: data.seq, etag: data.etag };
+        setLogs(prev => applyChanges(prev, data));
       }
     } catch (err) {
       console.error("Failed to fetch logs", err);
@@ -2,10 +2,14 @@
 🤖 保险密心 - 批量 AI 互博运行器
 =================================
 自动化批量生成保险诊断对话样本
+
+暂停 / 取消在每次 LLM 调用处生效：取消时正在等待的请求立即放弃（结果丢弃，不再发起新请求），
+已完成的对话轮次以 status=interrupted 写入收件箱，不会丢失
 """
 
 import json
 import asyncio
+import threading
 import uuid
 from datetime import datetime
 from pathlib import Path
@@ -17,6 +21,13 @@ ROOT_DIR = Path(__file__).resolve().parent
 ETL_DIR = ROOT_DIR.parent / "etl_factory"
 INBOX_PATH = ETL_DIR / "processing_log.json"
 
+# LLM 请求在这里执行，调用方可以随时放弃等待
+LLM_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="insurance-llm")
+
+
+class SimulationCancelled(Exception):
+    """批量任务被取消，当前仿真中断"""
+
 
 class InsuranceBatchRunner:
     """保险领域批量仿真运行器"""
@@ -26,6 +37,7 @@ class InsuranceBatchRunner:
     _paused = False
     _cancelled = False
     _progress = {"completed": 0, "total": 0, "current": None}
+    _cancel_event = threading.Event()
     
     def __new__(cls):
         if cls._instance is None:
@@ -40,6 +52,7 @@ class InsuranceBatchRunner:
         self._running = True
         self._cancelled = False
         self._paused = False
+        self._cancel_event.clear()
         self._progress = {"completed": 0, "total": count, "current": None}
         
         # 在后台线程运行
@@ -51,28 +64,17 @@ class InsuranceBatchRunner:
     def _run_batch(self, count: int):
         """执行批量仿真"""
         try:
-            import os
             from dotenv import load_dotenv
             from simulation_engine.domain_manager import DomainManager
-            from simulation_engine.prompts import expert_prompt, novice_prompt, opening_prompt
-            from langchain_openai import ChatOpenAI
-            from langchain_core.messages import HumanMessage
+            from simulation_engine.graph import get_llm
             
             load_dotenv()
             
             dm = DomainManager("insurance")
             dm.reset_used_scenarios()
             
-            # 智谱 API 配置
-            api_key = os.getenv("OPENAI_API_KEY")
-            api_base = os.getenv("OPENAI_API_BASE", "https://open.bigmodel.cn/api/paas/v4/")
-            llm = ChatOpenAI(
-                model="glm-4",
-                temperature=0.7,
-                max_tokens=2000,
-                openai_api_key=api_key,
-                openai_api_base=api_base
-            )
+            # 智谱 API（共享 LLM 与连接池）
+            llm = get_llm("glm-4")
             
             for i in range(count):
                 if self._cancelled:
@@ -90,8 +92,12 @@ class InsuranceBatchRunner:
                     "persona": mission.get("persona", "企业管理者")
                 }
                 
-                # 执行仿真
+                # 执行仿真（被取消时返回已完成的部分对话）
                 result = self._run_single_simulation(llm, dm, mission)
+                if self._cancelled:
+                    if result:
+                        self._save_result(result, mission, status="interrupted")
+                    break
                 
                 if result:
                     self._save_result(result, mission)
@@ -107,13 +113,27 @@ class InsuranceBatchRunner:
             self._running = False
             self._progress["current"] = None
     
+    def _invoke(self, llm, messages):
+        """可暂停 / 取消的 llm.invoke：暂停时在发起请求前等待，取消时立即放弃正在等待的请求"""
+        import time
+        while self._paused and not self._cancelled:
+            time.sleep(0.5)
+        if self._cancelled:
+            raise SimulationCancelled()
+        future = LLM_EXECUTOR.submit(llm.invoke, messages)
+        while not future.done():
+            if self._cancel_event.wait(0.2):
+                future.cancel()
+                raise SimulationCancelled()
+        return future.result()
+    
     def _run_single_simulation(self, llm, dm, mission) -> Optional[dict]:
         """运行单次仿真"""
+        messages = []
         try:
             from simulation_engine.prompts import expert_prompt, novice_prompt, opening_prompt
             from langchain_core.messages import HumanMessage
             
-            messages = []
             taxonomy_context = dm.get_expert_context()
             
             # 生成开场白
@@ -124,7 +144,7 @@ class InsuranceBatchRunner:
                 persona_tone=mission.get("tone", "迷茫")
             )
             
-            response = llm.invoke([HumanMessage(content=prompt)])
+            response = self._invoke(llm, [HumanMessage(content=prompt)])
             opening = response.content.strip()
             
             messages.append({
@@ -147,7 +167,7 @@ class InsuranceBatchRunner:
                     messages=messages_text
                 )
                 
-                response = llm.invoke([HumanMessage(content=prompt)])
+                response = self._invoke(llm, [HumanMessage(content=prompt)])
                 
                 try:
                     content = response.content.strip()
@@ -194,7 +214,7 @@ class InsuranceBatchRunner:
                     messages=messages_text
                 )
                 
-                response = llm.invoke([HumanMessage(content=prompt)])
+                response = self._invoke(llm, [HumanMessage(content=prompt)])
                 
                 try:
                     content = response.content.strip()
@@ -217,11 +237,19 @@ class InsuranceBatchRunner:
                 "final_result": final_result or {"ai_prediction": "未完成", "confidence": 0, "total_turns": len(messages)}
             }
             
+        except SimulationCancelled:
+            print(f"🛑 仿真已中断（已完成 {len(messages)} 步）")
+            if not messages:
+                return None
+            return {
+                "messages": messages,
+                "final_result": {"ai_prediction": "已中断", "confidence": 0, "total_turns": len(messages)}
+            }
         except Exception as e:
             print(f"❌ 单次仿真失败: {e}")
             return None
     
-    def _save_result(self, result: dict, mission: dict):
+    def _save_result(self, result: dict, mission: dict, status: str = "pending"):
         """保存结果到 ETL 收件箱"""
         try:
             ETL_DIR.mkdir(parents=True, exist_ok=True)
@@ -254,9 +282,9 @@ class InsuranceBatchRunner:
                 "tone": mission.get("tone", "迷茫"),
                 "dialogue_path": result["messages"],
                 "total_turns": final.get("total_turns", len(result["messages"])),
-                "diagnosis_correct": pred_val in gt_val or gt_val in pred_val,
+                "diagnosis_correct": status == "pending" and (pred_val in gt_val or gt_val in pred_val),
                 "source": "batch_insurance_v1",
-                "status": "pending"
+                "status": status
             }
             
             inbox.append(record)
@@ -282,6 +310,7 @@ class InsuranceBatchRunner:
     def cancel(self):
         """取消批量任务"""
         self._cancelled = True
+        self._cancel_event.set()  # 放弃正在等待的 LLM 请求
         return {"status": "cancelled"}
     
     def get_status(self) -> dict:
@@ -8,7 +8,6 @@
 """
 
 import json
-import os
 import uuid
 import random
 from fastapi import FastAPI, HTTPException, Request
@@ -123,25 +122,16 @@ async def next_step():
         raise HTTPException(status_code=400, detail="请先调用 /api/start 初始化仿真")
     
     try:
-        from simulation_engine.graph import create_insurance_simulation_graph
+        from simulation_engine.graph import get_llm
         from simulation_engine.prompts import expert_prompt, novice_prompt, opening_prompt
-        from langchain_openai import ChatOpenAI
         from langchain_core.messages import HumanMessage
         
         state = simulation_state["state"]
         mission = state["mission"]
         step = simulation_state["step_count"]
         
-        # 初始化 LLM (智谱 glm-4)
-        api_key = os.getenv("OPENAI_API_KEY")
-        api_base = os.getenv("OPENAI_API_BASE", "https://open.bigmodel.cn/api/paas/v4/")
-        llm = ChatOpenAI(
-            model="glm-4",
-            temperature=0.7,
-            max_tokens=2000,
-            openai_api_key=api_key,
-            openai_api_base=api_base
-        )
+        # LLM (智谱 glm-4)，进程内复用同一个客户端和连接池
+        llm = get_llm("glm-4")
         
         # 步骤: 开场白 → 顾问1 → 客户1 → 顾问2 → ...
         if step == 0:
@@ -567,6 +557,13 @@ async def health_check():
     }
 
 
+@app.on_event("shutdown")
+async def close_llm_http_pool():
+    """关闭共享的 LLM HTTP 连接池"""
+    from simulation_engine.http_pool import aclose_clients
+    await aclose_clients()
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
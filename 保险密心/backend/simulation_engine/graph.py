@@ -6,6 +6,7 @@
 
 import json
 import os
+from functools import lru_cache
 from typing import TypedDict, List, Optional, Annotated
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, AIMessage
@@ -14,6 +15,7 @@ from dotenv import load_dotenv
 
 from .prompts import expert_prompt, novice_prompt, opening_prompt
 from .domain_manager import DomainManager
+from .http_pool import openai_client_kwargs
 
 # 加载环境变量
 load_dotenv()
@@ -30,20 +32,29 @@ class SimulationState(TypedDict):
     status: str
 
 
-def create_insurance_simulation_graph(model_name: str = "glm-4"):
-    """创建保险领域仿真图"""
-    
-    # 初始化 LLM (智谱 API)
+@lru_cache(maxsize=None)
+def get_llm(model_name: str = "glm-4") -> ChatOpenAI:
+    """每个模型只创建一次 LLM，所有调用共享 keep-alive 连接池"""
     api_key = os.getenv("OPENAI_API_KEY")
     api_base = os.getenv("OPENAI_API_BASE", "https://open.bigmodel.cn/api/paas/v4/")
     
-    llm = ChatOpenAI(
+    return ChatOpenAI(
         model=model_name,
         temperature=0.7,
         max_tokens=2000,
         openai_api_key=api_key,
-        openai_api_base=api_base
+        openai_api_base=api_base,
+        # 单次请求超时（秒），卡住的连接不会拖住整个批量任务
+        timeout=float(os.getenv("LLM_CALL_TIMEOUT", "60")),
+        **openai_client_kwargs()
     )
+
+
+def create_insurance_simulation_graph(model_name: str = "glm-4"):
+    """创建保险领域仿真图"""
+    
+    # 初始化 LLM (智谱 API，进程内复用)
+    llm = get_llm(model_name)
     
     def initialize_simulation(state: SimulationState) -> SimulationState:
         """初始化仿真 - 生成企业客户的秘密任务"""
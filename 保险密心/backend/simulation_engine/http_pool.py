@@ -0,0 +1,19 @@
+"""
+🔌 HTTP Pool - 复用统一后端的 LLM 连接池
+=========================================
+实现见根目录 backend/simulation_engine/http_pool.py（环境变量同样在那里说明），
+这里只负责把仓库根目录加入 sys.path 并转出接口，不再维护一份副本。
+"""
+
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parents[3]
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+from backend.simulation_engine.http_pool import (  # noqa: E402
+    aclose_clients, gemini_transport, get_async_client, get_sync_client, openai_client_kwargs
+)
+
+__all__ = ["aclose_clients", "gemini_transport", "get_async_client", "get_sync_client", "openai_client_kwargs"]
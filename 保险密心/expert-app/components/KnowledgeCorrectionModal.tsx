@@ -31,7 +31,7 @@ export const KnowledgeCorrectionModal: React.FC<ModalProps> = ({
 
   // 拉取数据
   const fetchCategories = () => {
-    fetch("http://127.0.0.1:8001/api/taxonomy")
+    fetch(`${process.env.NEXT_PUBLIC_API_URL || "http://127.0.0.1:8000/insurance"}/api/taxonomy`)
       .then(res => res.json())
       .then(data => {
         if (data.taxonomy) {
@@ -59,7 +59,7 @@ export const KnowledgeCorrectionModal: React.FC<ModalProps> = ({
     if (!selectedCategory || !expertTerm) return;
 
     try {
-      const res = await fetch("http://127.0.0.1:8001/api/taxonomy/add", {
+      const res = await fetch(`${process.env.NEXT_PUBLIC_API_URL || "http://127.0.0.1:8000/insurance"}/api/taxonomy/add`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({ category: selectedCategory, service: expertTerm })
@@ -91,7 +91,7 @@ export const KnowledgeCorrectionModal: React.FC<ModalProps> = ({
     if (!confirm(`⚠️ 危险操作\n确定要删除分类“${name}”吗？\n该分类下的所有服务都将丢失！`)) return;
     
     try {
-      await fetch("http://127.0.0.1:8001/api/taxonomy/category", {
+      await fetch(`${process.env.NEXT_PUBLIC_API_URL || "http://127.0.0.1:8000/insurance"}/api/taxonomy/category`, {
         method: "DELETE",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({ category_name: name })
@@ -107,7 +107,7 @@ export const KnowledgeCorrectionModal: React.FC<ModalProps> = ({
       return;
     }
     try {
-      const res = await fetch("http://127.0.0.1:8001/api/taxonomy/category", {
+      const res = await fetch(`${process.env.NEXT_PUBLIC_API_URL || "http://127.0.0.1:8000/insurance"}/api/taxonomy/category`, {
         method: "PUT",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({ old_name: oldName, new_name: editInputValue })
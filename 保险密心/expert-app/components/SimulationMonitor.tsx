@@ -43,7 +43,7 @@ const SimulationMonitor = () => {
     setIsCompleted(false); // 👈 重置完成状态
 
     try {
-      const res = await fetch(`${process.env.NEXT_PUBLIC_API_URL || "http://127.0.0.1:8001"}/api/start`, {
+      const res = await fetch(`${process.env.NEXT_PUBLIC_API_URL || "http://127.0.0.1:8000/insurance"}/api/start`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({ domain: "insurance" })
@@ -77,7 +77,7 @@ const SimulationMonitor = () => {
 
     setLoading(true);
     try {
-      const res = await fetch(`${process.env.NEXT_PUBLIC_API_URL || "http://127.0.0.1:8001"}/api/next`, {
+      const res = await fetch(`${process.env.NEXT_PUBLIC_API_URL || "http://127.0.0.1:8000/insurance"}/api/next`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
       });